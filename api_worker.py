@@ -0,0 +1,231 @@
+"""HTTP API worker for split mode (see control_process.py).
+
+Serves the same endpoints as backend.py without touching the hardware, so
+any number of them can run side by side:
+
+    uvicorn api_worker:app --workers 4 --port 8000
+
+/status is read straight from the shared status segment, with the same
+ETag as single-process mode. /status/stream is fed by a task that checks
+the segment for a new version every STATUS_POLL_INTERVAL seconds. Event ids
+are the control process's boot id and sequence number, so a client can
+reconnect to any worker, and gets a snapshot after the control process
+restarts. Every other endpoint is forwarded to the control process as a
+command. While the control process is not running, requests get 503.
+"""
+
+import asyncio
+import json
+import os
+from typing import Optional
+
+from fastapi import Body, FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+import async_logging
+import metrics
+from async_logging import get_logger
+from command_channel import CommandError, send_command
+from metrics import MetricsMiddleware
+from shared_status import SharedStatusReader
+from status_stream import StatusStream, etag_matches, status_events
+
+# Log file shared by all workers (each record is a single appended line)
+API_WORKER_LOG_FILE = "api_worker.log"
+
+# Seconds between checks of the shared segment for /status/stream clients...
+STATUS_POLL_INTERVAL = 0.05
+# ...and for a restarted control process having replaced the segment
+STATUS_REATTACH_INTERVAL = 1.0
+
+# Seconds between keep-alive comments on an idle status stream
+STATUS_STREAM_KEEPALIVE = 15
+
+app = FastAPI()
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["http://localhost:3000"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# HTTP handler latency of this worker; the control process's own histogram
+# sees no requests in split mode. /metrics appends it to the control
+# process's metrics, labelled with the worker's pid.
+http_latency = metrics.REGISTRY.histogram(
+    "api_worker_http_request_duration_seconds", "Time until an API worker's HTTP handler starts its response.",
+    ["worker", "method", "route", "status"])
+
+app.add_middleware(MetricsMiddleware, histogram=http_latency, labels=(str(os.getpid()),))
+
+async_logging.setup_logging(filename=API_WORKER_LOG_FILE)
+api_log = get_logger("api")
+
+status_reader = None
+status_stream = StatusStream()
+
+
+def control_unavailable(reason):
+    api_log.error(reason)
+    return JSONResponse(status_code=503, content={"error": "Control process is not running."})
+
+
+def reader():
+    """The shared status segment, attached on first use (the control process may start later)."""
+    global status_reader
+    if status_reader is None:
+        status_reader = SharedStatusReader()
+    return status_reader
+
+
+async def follow_status():
+    """Republish every new status version from the shared segment to local stream clients.
+
+    Also drops the attached segment once a restarted control process has
+    replaced it, so the next read attaches to the new one.
+    """
+    global status_reader
+    loop = asyncio.get_running_loop()
+    seen = None
+    reattach_check = loop.time() + STATUS_REATTACH_INTERVAL
+    while True:
+        try:
+            if status_reader is not None and loop.time() >= reattach_check:
+                reattach_check = loop.time() + STATUS_REATTACH_INTERVAL
+                if status_reader.stale():
+                    status_reader.close()
+                    status_reader, seen = None, None
+            segment = reader()
+            if segment.version() != seen:
+                boot_id, seen, body = segment.read()
+                if seen:
+                    status_stream.publish(json.loads(body), seq=seen, boot=format(boot_id, "x"))
+        except (FileNotFoundError, TimeoutError):
+            pass
+        await asyncio.sleep(STATUS_POLL_INTERVAL)
+
+
+@app.on_event("startup")
+async def startup_event():
+    app.state.follower = asyncio.create_task(follow_status())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.follower.cancel()
+    if status_reader is not None:
+        status_reader.close()
+    async_logging.stop_logging()
+
+
+def forward(command, **args):
+    """Run command in the control process and relay its response."""
+    try:
+        status, media_type, body = send_command(command, **args)
+    except CommandError as e:
+        return control_unavailable(str(e))
+    return Response(content=body, status_code=status, media_type=media_type)
+
+
+@app.get("/status")
+async def get_status(request: Request):
+    """The last published status. Conditional requests for an unchanged status get 304."""
+    try:
+        boot_id, version, body = reader().read()
+    except (FileNotFoundError, TimeoutError) as e:
+        return control_unavailable(f"Status segment unavailable: {e}")
+    headers = {"ETag": f'"{boot_id:x}-{version}"', "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/status/stream")
+async def stream_status(request: Request, since: Optional[str] = None):
+    """Server-sent events: a snapshot, then a delta per state change."""
+    resume_from = request.headers.get("last-event-id", since)
+    return StreamingResponse(
+        status_events(status_stream, request, resume_from, STATUS_STREAM_KEEPALIVE),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/history")
+def get_history(signal: Optional[str] = None, start: Optional[float] = None, end: Optional[float] = None,
+                resolution: str = "auto"):
+    return forward("history", signal=signal, start=start, end=end, resolution=resolution)
+
+
+@app.get("/faults/history")
+def get_fault_history(fault: Optional[str] = None, start: Optional[float] = None, end: Optional[float] = None,
+                      limit: int = 100, before: Optional[int] = None):
+    return forward("fault_history", fault=fault, start=start, end=end, limit=limit, before=before)
+
+
+@app.post("/set_fault_mode")
+def set_fault_mode(request: dict = Body(...)):
+    return forward("set_fault_mode", body=request)
+
+
+@app.post("/set_led")
+def set_led(request: dict = Body(...)):
+    return forward("set_led", body=request)
+
+
+@app.post("/leds")
+def set_leds(request: dict = Body(...)):
+    return forward("set_leds", body=request)
+
+
+@app.get("/scenes")
+def get_scenes():
+    return forward("scenes")
+
+
+@app.put("/scenes/{name}")
+def put_scene(name: str, request: dict = Body(...)):
+    return forward("put_scene", body=request, name=name)
+
+
+@app.delete("/scenes/{name}")
+def delete_scene(name: str):
+    return forward("delete_scene", name=name)
+
+
+@app.post("/scenes/{name}/apply")
+def apply_scene(name: str):
+    return forward("apply_scene", name=name)
+
+
+@app.get("/feedback")
+def get_feedback():
+    return forward("feedback")
+
+
+@app.get("/log_levels")
+def get_log_levels():
+    return forward("log_levels")
+
+
+@app.post("/log_levels")
+def set_log_level(request: dict = Body(...)):
+    return forward("set_log_level", body=request)
+
+
+@app.get("/metrics")
+def get_metrics():
+    """The control process's metrics followed by this worker's."""
+    response = forward("metrics")
+    if response.status_code != 200:
+        return response
+    return Response(content=response.body + metrics.REGISTRY.render().encode(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/")
+def read_root():
+    return {"message": "Backend server is running."}
@@ -0,0 +1,138 @@
+"""Queue-backed logging for the street light backend.
+
+Log calls made from the control loop, the fade scheduler and the API only
+append the record to an in-memory queue; a QueueListener thread formats the
+records and writes them to backend.log (and the console). Disk stalls on the
+Pi's SD card therefore never hold up a control loop iteration.
+
+Every subsystem logs through its own "streetlight.<subsystem>" logger so its
+level can be changed at runtime (see set_level() and the /log_levels
+endpoint) without touching the others.
+"""
+
+import logging
+import logging.handlers
+import queue
+
+LOGGER_PREFIX = "streetlight"
+
+# Subsystems with their own logger and adjustable level
+LOG_SUBSYSTEMS = ("control", "sensors", "fade", "faults", "api", "hardware")
+
+DEFAULT_LOG_LEVEL = logging.INFO
+LOG_FILE = "backend.log"
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s%(fields_text)s'
+
+# Records queued beyond this are dropped rather than blocking the caller
+LOG_QUEUE_SIZE = 10000
+
+_listener = None
+_handler = None
+
+
+def get_logger(subsystem):
+    return logging.getLogger(f"{LOGGER_PREFIX}.{subsystem}")
+
+
+def fields(**values):
+    """Structured key/value data for a record: log.info(msg, extra=fields(led="LED2"))."""
+    return {"fields": values}
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formatter that appends a record's fields as key=value pairs."""
+
+    def format(self, record):
+        record_fields = getattr(record, "fields", None)
+        if record_fields:
+            record.fields_text = " [" + " ".join(f"{key}={value}" for key, value in record_fields.items()) + "]"
+        else:
+            record.fields_text = ""
+        return super().format(record)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks and leaves formatting to the listener."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The listener runs in this process, so the record can be handed over
+        # as-is; message formatting happens on the writer thread instead.
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BlockingStopListener(logging.handlers.QueueListener):
+    """QueueListener whose stop() waits for room instead of failing on a full queue."""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+def setup_logging(filename=LOG_FILE, level=DEFAULT_LOG_LEVEL, console=True):
+    """Route every subsystem logger through the queue and start the writer thread."""
+    global _listener, _handler
+    if _listener is not None:
+        return _listener
+
+    formatter = StructuredFormatter(LOG_FORMAT)
+    writers = []
+    file_handler = logging.FileHandler(filename, mode='a')
+    file_handler.setFormatter(formatter)
+    writers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        writers.append(console_handler)
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _handler = DroppingQueueHandler(log_queue)
+    parent = logging.getLogger(LOGGER_PREFIX)
+    parent.addHandler(_handler)
+    parent.propagate = False
+    for subsystem in LOG_SUBSYSTEMS:
+        get_logger(subsystem).setLevel(level)
+
+    _listener = BlockingStopListener(log_queue, *writers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Flush queued records to disk and stop the writer thread."""
+    global _listener, _handler
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    logging.getLogger(LOGGER_PREFIX).removeHandler(_handler)
+    _listener = None
+    _handler = None
+
+
+def dropped_records():
+    return _handler.dropped if _handler is not None else 0
+
+
+def get_levels():
+    return {subsystem: logging.getLevelName(get_logger(subsystem).getEffectiveLevel())
+            for subsystem in LOG_SUBSYSTEMS}
+
+
+def set_level(subsystem, level):
+    """Change one subsystem's level. Raises ValueError for unknown names."""
+    if subsystem not in LOG_SUBSYSTEMS:
+        raise ValueError(f"Unknown log subsystem: {subsystem}")
+    numeric = logging.getLevelName(str(level).upper())
+    if not isinstance(numeric, int):
+        raise ValueError(f"Unknown log level: {level}")
+    get_logger(subsystem).setLevel(numeric)
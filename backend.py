@@ -1,12 +1,38 @@
-from fastapi import FastAPI, Body
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Body, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import RPi.GPIO as GPIO
-import smbus2 as smbus
+from pydantic import BaseModel, Field, ValidationError
 import time
+import math
+import os
+import queue
+import concurrent.futures
+import random
 import threading
-import logging
+from types import MappingProxyType
+from typing import List, Mapping, NamedTuple, Optional
+
+import async_logging
+from async_logging import fields, get_logger
+from dimming import (DAY, HIGH_LIGHT_THRESHOLD, LIGHT_HYSTERESIS, MODERATE, NIGHT, classify_light,
+                     interrupt_band, map_clear_to_duty_cycle)
+from fade_curves import CIE1931
+from fade_engine import FadeEngine
+from feedback import FEEDBACK_FAULT_BITS, RECOVERED, FeedbackMonitor
+from fault_rules import (FAULT_RULES, NORMAL_MODE, STUCK_CLEAR_VALUE, TCS_I2C_ERROR, TCS_OK, TCS_STUCK,
+                         compile_fault_rules)
+from fault_store import FaultEventStore
+from fleet import FAULT_LED_FAILURE, FleetState
+from hardware import (HARDWARE_BACKEND, PWM_BACKEND, SimulatedTCS34725, load_hardware, load_level_reader,
+                      load_pwm_backend)
+from history import History
+from light_filter import EwmaFilter, FilterChain, MedianFilter
+import metrics
+from metrics import InstrumentedGPIO, MetricsMiddleware
+from scenes import SceneStore
+from sensor_trace import (SENSOR_TRACE_FILE, TRACE_IR, TRACE_LED2, TRACE_PIR, TRACE_SENSOR_READ, TRACE_SKIPPED,
+                          TraceRecorder)
+from status_stream import StatusStream, etag_matches, status_events
 
 app = FastAPI()
 
@@ -19,24 +45,111 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    filename='backend.log',
-    filemode='a'
-)
+# Metrics exported on /metrics. Latencies are in seconds.
+loop_duration = metrics.REGISTRY.histogram(
+    "loop_duration_seconds", "Time spent in one sensor monitoring loop iteration, excluding the wait.")
+loop_wakeups = metrics.REGISTRY.counter(
+    "loop_wakeups", "Times the monitoring loop woke, by cause (event or deadline).", ["cause"])
+i2c_latency = metrics.REGISTRY.histogram(
+    "i2c_read_duration_seconds", "Latency of TCS34725 RGBC block reads.")
+i2c_errors = metrics.REGISTRY.counter(
+    "i2c_read_errors", "TCS34725 reads that raised an error.")
+gpio_calls = metrics.REGISTRY.counter(
+    "gpio_calls", "GPIO input, output and PWM duty cycle calls.", ["operation"])
+fade_active = metrics.REGISTRY.gauge(
+    "fade_active_channels", "Channels the fade scheduler is currently moving towards a target.")
+pwm_writes_suppressed = metrics.REGISTRY.gauge(
+    "pwm_writes_suppressed", "PWM duty cycle writes dropped because they repeated the last value.")
+soft_pwm_lateness = metrics.REGISTRY.gauge(
+    "soft_pwm_edge_lateness_p99_seconds",
+    "99th percentile delay of soft PWM engine pin writes past their deadline (0 without the engine).")
+soft_pwm_overruns = metrics.REGISTRY.gauge(
+    "soft_pwm_overruns", "Periods the soft PWM engine skipped after falling a full period behind.")
+feedback_faults = metrics.REGISTRY.counter(
+    "feedback_faults", "Channels flagged faulty by closed-loop feedback detection.", ["channel"])
+actuations_suppressed = metrics.REGISTRY.counter(
+    "actuations_suppressed", "Light class changes and duty retargets not acted on, by reason.", ["reason"])
+fault_transitions = metrics.REGISTRY.counter(
+    "fault_transitions", "Fault flags raised or cleared.", ["fault", "state"])
+http_latency = metrics.REGISTRY.histogram(
+    "http_request_duration_seconds", "Time until an HTTP handler starts its response.",
+    ["method", "route", "status"])
+log_records_dropped = metrics.REGISTRY.gauge(
+    "log_records_dropped", "Log records dropped because the logging queue was full.")
+fault_events_dropped = metrics.REGISTRY.gauge(
+    "fault_events_dropped", "Fault transitions dropped because the fault store queue was full.")
+
+app.add_middleware(MetricsMiddleware, histogram=http_latency)
+
+# Configure logging. Records are queued and written to backend.log by a
+# background thread, so logging never blocks the monitoring loop.
+async_logging.setup_logging()
+control_log = get_logger("control")
+sensor_log = get_logger("sensors")
+fault_log = get_logger("faults")
+api_log = get_logger("api")
+hardware_log = get_logger("hardware")
+
+# Kernel PWM channels (pwmchip, channel) by BCM pin, for STREETLIGHT_PWM=sysfs
+# or sysfs+engine.
+# Needs "dtoverlay=pwm-2chan,pin=18,func=2,pin2=13,func2=4" in config.txt;
+# pins without a channel stay on software PWM.
+SYSFS_PWM_CHANNELS = {
+    18: (0, 0),  # PIR LED, PWM0
+    13: (0, 1),  # LED3, PWM1
+}
+
+# GPIO and I2C drivers. Set STREETLIGHT_HARDWARE=sim to run against the
+# in-memory simulation instead of a Raspberry Pi.
+GPIO, bus = load_hardware(HARDWARE_BACKEND)
+# Reads every GPIO level in one go, for the feedback scan
+read_levels = load_level_reader(GPIO, HARDWARE_BACKEND)
+GPIO = load_pwm_backend(GPIO, PWM_BACKEND, SYSFS_PWM_CHANNELS)
+# Single-thread software PWM (STREETLIGHT_PWM=engine or sysfs+engine)
+soft_pwm_engine = getattr(GPIO, "engine", None)
+if soft_pwm_engine is not None:
+    soft_pwm_lateness.set_function(lambda: soft_pwm_engine.stats()["lateness_p99_us"] / 1e6)
+    soft_pwm_overruns.set_function(lambda: soft_pwm_engine.overruns)
+GPIO = InstrumentedGPIO(GPIO, gpio_calls)
 
 # I2C setup for TCS34725
-bus = smbus.SMBus(1)  # I2C bus (1 for Raspberry Pi)
 TCS34725_ADDRESS = 0x29
 COMMAND_BIT = 0x80
+COMMAND_AUTO_INCREMENT = 0x20  # Protocol type: read consecutive registers
 ENABLE_REGISTER = 0x00
 ENABLE_AEN = 0x02  # RGBC enable
 ENABLE_PON = 0x01  # Power on
 
-# Register addresses for color data
+# RGBC integration time. Each ATIME step below 0xFF adds one 2.4 ms cycle;
+# 0xFF is a single cycle (2.4 ms), 0x00 the maximum of 256 cycles (~700 ms).
+ATIME_REGISTER = 0x01
+TCS_ATIME = 0xFF
+TCS_INTEGRATION_TIME = 0.0024 * (256 - TCS_ATIME)
+
+# Ambient light interrupt. The sensor pulls INT low once the clear reading
+# stays outside [AILT, AIHT] for the persistence filter's number of cycles,
+# until the clear-interrupt special function is written.
+ENABLE_AIEN = 0x10  # Ambient light interrupt enable
+AILTL = 0x04  # AILTL, AILTH, AIHTL, AIHTH are consecutive registers
+PERS_REGISTER = 0x0C
+COMMAND_SPECIAL_FUNCTION = 0x60
+SF_CLEAR_INTERRUPT = 0x06
+TCS_APERS = 0x0F  # 60 consecutive out-of-band cycles (~144 ms at ATIME 0xFF)
+
+# Register addresses for color data (each channel is low byte, then high byte)
 CDATAL = 0x14  # Clear (ambient light) channel
+RDATAL = 0x16  # Red channel
+GDATAL = 0x18  # Green channel
+BDATAL = 0x1A  # Blue channel
+RGBC_BLOCK_LENGTH = 8  # CDATAL through BDATAH
+
+
+class ColorReading(NamedTuple):
+    """One RGBC sample from the TCS34725, all channels from the same integration cycle."""
+    clear: int
+    red: int
+    green: int
+    blue: int
 
 # Define pin numbers for PIR, IR sensor, and LEDs
 PIR_LED_PIN = 18    # LED for PIR sensor (GPIO 18, Physical Pin 12)
@@ -45,6 +158,10 @@ PIR_PIN = 17        # PIR sensor pin (GPIO 17, Physical Pin 11)
 IR_PIN = 27         # IR sensor pin (GPIO 27, Physical Pin 13)
 TCS_LED_PIN = 26    # TCS sensor-controlled LED (GPIO 26, Physical Pin 37)
 RED_LED_PIN = 12    # Red LED for fault indication (GPIO 12, Physical Pin 32)
+# TCS34725 INT, open drain (GPIO 4, Physical Pin 7 where it is wired). The
+# sensor is polled unless STREETLIGHT_TCS_INT_PIN names the pin, since poles
+# without the wire would otherwise only read ambient light on the watchdog.
+TCS_INT_PIN = int(os.environ["STREETLIGHT_TCS_INT_PIN"]) if os.environ.get("STREETLIGHT_TCS_INT_PIN") else None
 
 # Define pin numbers and physical pins for additional LEDs
 ADDITIONAL_LED_PINS = {
@@ -53,97 +170,217 @@ ADDITIONAL_LED_PINS = {
     "LED3": {"gpio": 13, "physical": 33},   # Additional LED 3 (GPIO 13, Physical Pin 33)
 }
 
-# Fault simulation options
-FAULT_MODES = {
-    '1': 'Normal Operation',
-    '2': 'Simulate PIR Sensor Failure',
-    '3': 'Simulate IR Sensor Failure',
-    '4': 'Simulate TCS Sensor Failure',
-    '5': 'Simulate I2C Communication Failure',
-    '6': 'Simulate GPIO Output Failure',
-    '7': 'Simulate Power Issues',
-    '8': 'Simulate Delayed Response',
-    '9': 'Simulate Sensor Cross-Talk',
-    '10': 'Simulate LED1 Failure',
-    '11': 'Simulate LED2 Failure',
-    '12': 'Simulate LED3 Failure',
-    # Add more fault modes as needed
-}
+# The simulated TCS34725 pulls TCS_INT_PIN like the real one; the fleet
+# simulator sets ambient light through it
+tcs_sim = None
+if HARDWARE_BACKEND == "sim" and TCS_INT_PIN is not None:
+    tcs_sim = SimulatedTCS34725(bus, GPIO, TCS_INT_PIN, TCS34725_ADDRESS)
+
+# Fault simulation options, compiled from the rule registry in fault_rules.py
+# once at start-up: per-mode rules, descriptions and locked channels
+FAULT_TABLES = compile_fault_rules(FAULT_RULES, ("PIR", "IR", "TCS", *ADDITIONAL_LED_PINS))
+FAULT_MODES = FAULT_TABLES.descriptions
 
 # Pydantic model for fault mode request
 class FaultModeRequest(BaseModel):
     mode: str
 
-# Shared variables and locks
-fault_mode = '1'  # Default to Normal Operation
-fault_mode_lock = threading.Lock()
+# Pydantic model for log level request
+class LogLevelRequest(BaseModel):
+    subsystem: str
+    level: str
+
+# Pydantic models for bulk LED commands and scenes. A null duty hands the
+# channel back to the control loop; a null fade_time uses its fade rate.
+class LedCommand(BaseModel):
+    channel: str
+    duty: Optional[float] = Field(..., ge=0, le=100)
+    fade_time: Optional[float] = Field(None, ge=0)
+
+class LedBatchRequest(BaseModel):
+    commands: List[LedCommand]
 
+# Control state. Only the monitoring loop thread writes fault_mode, faults,
+# the fleet's fault/override columns and the LED2 output; everyone else reads
+# the immutable control_state snapshot it publishes, or sends a command.
+fault_mode = NORMAL_MODE  # Default to Normal Operation
+
+# Clock the control logic reads; the fleet simulator substitutes a virtual one
+clock = time.time
+
+# Written by the PIR/IR edge callbacks (clock() of the latest detection)
 last_pir_detection_time = 0
 last_ir_detection_time = 0
 
-# Faults dictionary
-faults = {
-    "PIR_Sensor_Failure": False,
-    "IR_Sensor_Failure": False,
-    "TCS_Sensor_Failure": False,
-    "I2C_Communication_Failure": False,
-    "Sensor_CrossTalk": False,
-    "PIR_LED_Failure": False,
-    "IR_LED_Failure": False,
-    "TCS_LED_Failure": False,
-    "LED1_Failure": False,
-    "LED2_Failure": False,
-    "LED3_Failure": False,
-    "GPIO_Output_Failure": False,
-    "Power_Issues": False,
-    "Delayed_Response": False,
+# Most recent TCS34725 sample used by the monitoring loop
+last_color_reading = ColorReading(0, 0, 0, 0)
+
+# Clear readings are filtered before they are classified: a median of
+# LIGHT_MEDIAN_WINDOW readings drops spikes, then an EWMA smooths jitter
+LIGHT_MEDIAN_WINDOW = 3
+LIGHT_EWMA_ALPHA = 0.3
+light_filter = FilterChain(MedianFilter(LIGHT_MEDIAN_WINDOW), EwmaFilter(LIGHT_EWMA_ALPHA))
+filtered_clear = 0
+light_class = None  # NIGHT, MODERATE or DAY as of the last iteration
+
+# Moderate-light duty cycle changes smaller than this (in percent) are not
+# worth a fade
+DUTY_DEADBAND = 2.5
+
+# AILT/AIHT are set around the last reading; the INT edge callback sets the
+# pending flag (and wakes the loop) when ambient light leaves that band
+tcs_interrupt_armed = False
+tcs_interrupt_pending = False
+
+# Monitoring loop deadlines, all in clock() time. The loop sleeps until the
+# earliest of them unless a motion edge or command wakes it first.
+tcs_enabled_at = None       # Start of the TCS34725's first integration cycle
+next_sample_time = 0        # Next ambient light sample (or poll of the sensor inputs)
+tcs_watchdog_time = 0       # Next TCS34725 read while its interrupt is armed
+next_fade_tick = 0          # Next fade step while any channel is fading
+delayed_start_time = None   # Start of the current simulated delay
+last_iteration_time = 0     # When control_iteration() last ran
+
+# Set by the edge callbacks (and by submitted commands) to wake the
+# monitoring loop without waiting for its next poll
+loop_wakeup = threading.Event()
+
+# Per-channel state (duty cycle, fade target, fault bits, manual override),
+# one row per LED channel. The control loop leaves channels under manual
+# override (LED2 after /set_led, any channel after /leds or a scene) alone.
+LED_CHANNELS = ("PIR", "IR", "TCS", "LED1", "LED2", "LED3")
+fleet = FleetState(LED_CHANNELS)
+LED2_ROW = fleet.index("LED2")
+
+# Fault names reported for each channel's FAULT_LED_FAILURE bit
+CHANNEL_FAULT_KEYS = {
+    "PIR": "PIR_LED_Failure",
+    "IR": "IR_LED_Failure",
+    "TCS": "TCS_LED_Failure",
+    "LED1": "LED1_Failure",
+    "LED2": "LED2_Failure",
+    "LED3": "LED3_Failure",
 }
-faults_lock = threading.Lock()
 
-# Manual override flags
-manual_override = {
-    'LED2': False  # Only LED2 has manual override
-}
+# System-wide faults dictionary (channel faults live in fleet.faults), one
+# flag per system fault any rule can raise
+faults = dict.fromkeys(FAULT_TABLES.system_faults, False)
 
-# Dimming parameters
-DIM_STEP = 5        # Duty cycle increment/decrement step
-DIM_DELAY = 0.05    # Delay between dimming steps in seconds
-
-# Duty cycle trackers (excluding LED2 as it's not PWM controlled)
-current_duty = {
-    'PIR': 0,
-    'IR': 0,
-    'TCS': 0,
-    'LED1': 0,
-    'LED3': 0
-}
+# Persistent log of fault transitions served by /faults/history
+fault_store = FaultEventStore()
 
-# Fade control flags to prevent multiple fade threads (excluding LED2)
-fading = {
-    'PIR': False,
-    'IR': False,
-    'TCS': False,
-    'LED1': False,
-    'LED3': False
-}
+# Fault flags as of the last commit_state(), to detect transitions
+reported_faults = {}
 
-# LED2 Fault Flag
-led2_fault_flag = False
-led2_fault_lock = threading.Lock()
+# Largest page /faults/history returns
+FAULT_HISTORY_MAX_LIMIT = 1000
 
-# Light intensity thresholds
-LOW_LIGHT_THRESHOLD = 1000    # Threshold below which LED brightness is adjusted
-HIGH_LIGHT_THRESHOLD = 10000  # Threshold above which LED stays off
+# Dimming parameters
+DIM_DELAY = 0.05        # Delay between dimming steps in seconds
+FADE_DURATION = 1.0     # Seconds a full 0-100% fade takes
+FADE_CURVE = CIE1931    # Fades run evenly in perceived brightness
+FADE_DURATIONS = {}     # Per-channel overrides of FADE_DURATION, e.g. {"TCS": 2.0}
+FADE_LEVELS = 10        # PWM writes per full fade; steps in between are not written
+
+# Binary trace of the loop's sensor readings (STREETLIGHT_TRACE), opened at
+# start-up; see sensor_trace.py and benchmarks/bench_replay.py
+sensor_trace = None
+
+# Named sets of LED commands served by /scenes
+scene_store = SceneStore()
+
+# Bounded per-signal sensor/duty history served by /history
+history = History()
+
+# /status ETags and /status/stream event ids are "<boot id>-<status sequence
+# number>"; the boot id keeps a tag or event id from before a restart from
+# matching a new status with the same number
+STATUS_ETAG_BOOT_ID = format(time.time_ns(), "x")
+
+# Change feed for /status/stream; publish_status() pushes every state change
+status_stream = StatusStream(boot=STATUS_ETAG_BOOT_ID)
+
+# Seconds between keep-alive comments on an idle status stream
+STATUS_STREAM_KEEPALIVE = 15
+
+# Least seconds between the status publishes of a running fade; the tick
+# that ends the last fade always publishes
+STATUS_FADE_PUBLISH_INTERVAL = 0.25
+next_fade_publish = 0       # clock() time of the next fade-driven publish
+
+# Fade scheduler driving every PWM channel (all LEDs except LED2, which is
+# not PWM controlled). It owns the current duty cycle of each channel; the
+# monitoring loop calls its tick() on the fade step deadline.
+fade_engine = FadeEngine(interval=DIM_DELAY, duration=FADE_DURATION, curve=FADE_CURVE, fleet=fleet,
+                         on_change=lambda: publish_fade_status(), levels=FADE_LEVELS)
+fade_active.set_function(fade_engine.active_count)
+pwm_writes_suppressed.set_function(lambda: fade_engine.writes_suppressed)
+fault_events_dropped.set_function(lambda: fault_store.dropped)
+log_records_dropped.set_function(async_logging.dropped_records)
+
+# Closed-loop fault detection for every channel wired to a detection pin
+feedback_monitor = FeedbackMonitor(fleet)
 
 # Time to keep the LEDs on after detecting motion or object (in seconds)
 LED_ON_TIME = 10
 
-# State lock for thread safety
-state_lock = threading.Lock()
+# Debounce applied to the PIR/IR edge callbacks (in milliseconds)
+PIR_BOUNCE_TIME = 200
+IR_BOUNCE_TIME = 50
+
+# Seconds between ambient light samples (and flicker steps)...
+LOOP_INTERVAL = 1
+# ...stretched to this while nothing can change without an outside event:
+# fully dark or bright, no motion or object, nothing fading, normal mode
+SETTLED_SAMPLE_INTERVAL = 5
+
+# With the TCS34725 interrupt armed the sensor is only read when it fires,
+# and every TCS_WATCHDOG_INTERVAL seconds to notice a dead sensor
+TCS_WATCHDOG_INTERVAL = 60
+
+# Longest single wait of the monitoring loop, a guard against clock jumps
+MAX_LOOP_SLEEP = TCS_WATCHDOG_INTERVAL
+
+# Seconds the simulated delayed response holds the loop back
+DELAYED_RESPONSE_TIME = 5
+
+# Commands from the API handlers, applied by the monitoring loop in order.
+# Each entry is (function, args, future); the handler waits on the future.
+command_queue = queue.Queue()
+
+# Longest an API handler waits for the monitoring loop to apply its command
+COMMAND_TIMEOUT = 5
+
+
+class ControlState(NamedTuple):
+    """Snapshot of the control loop's state, replaced (never mutated) by commit_state()."""
+    fault_mode: str
+    faults: Mapping[str, bool]  # System and channel fault flags by report name
+    led2_state: bool            # LED2's detection pin reads HIGH
+
+
+# Latest snapshot; readers take the reference once and never need a lock
+control_state = ControlState(fault_mode, MappingProxyType({}), False)
 
 # Global variable to store additional PWM instances
 additional_pwms = {}
 
+def motion_callback(channel):
+    """GPIO edge callback for the PIR and IR sensors."""
+    global last_pir_detection_time, last_ir_detection_time
+    now = clock()
+    if channel == PIR_PIN:
+        last_pir_detection_time = now
+    elif channel == IR_PIN:
+        last_ir_detection_time = now
+    loop_wakeup.set()
+
+def tcs_interrupt_callback(channel):
+    """GPIO edge callback for the TCS34725's INT pin."""
+    global tcs_interrupt_pending
+    tcs_interrupt_pending = True
+    loop_wakeup.set()
+
 def initialize_gpio():
     global PIR_PWM, IR_PWM, TCS_PWM, additional_pwms
     GPIO.setwarnings(False)
@@ -153,6 +390,17 @@ def initialize_gpio():
     GPIO.setup(PIR_PIN, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
     GPIO.setup(IR_PIN, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
 
+    # Wake the monitoring loop on motion instead of waiting for its next poll.
+    # The PIR output goes HIGH on motion; the IR sensor pulls LOW on an object.
+    GPIO.add_event_detect(PIR_PIN, GPIO.RISING, callback=motion_callback, bouncetime=PIR_BOUNCE_TIME)
+    GPIO.add_event_detect(IR_PIN, GPIO.FALLING, callback=motion_callback, bouncetime=IR_BOUNCE_TIME)
+
+    # The TCS34725's INT output is open drain and pulls LOW when ambient
+    # light leaves the band armed by arm_tcs_interrupt()
+    if TCS_INT_PIN is not None:
+        GPIO.setup(TCS_INT_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        GPIO.add_event_detect(TCS_INT_PIN, GPIO.FALLING, callback=tcs_interrupt_callback)
+
     # Set up LED output pins with initial LOW
     GPIO.setup(PIR_LED_PIN, GPIO.OUT, initial=GPIO.LOW)
     GPIO.setup(IR_LED_PIN, GPIO.OUT, initial=GPIO.LOW)
@@ -164,10 +412,14 @@ def initialize_gpio():
         # Set up power pin
         gpio_pin = led_info["gpio"]
         GPIO.setup(gpio_pin, GPIO.OUT, initial=GPIO.LOW)
-        # Set up detection pin if it exists
+        # Set up detection pin if it exists and watch it for feedback faults
         if "detection_gpio" in led_info:
             detection_pin = led_info["detection_gpio"]
             GPIO.setup(detection_pin, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
+            feedback_monitor.add(led_name, detection_pin)
+            if HARDWARE_BACKEND == "sim":
+                # Simulated LEDs work: the detection pin follows the output
+                GPIO.connect(gpio_pin, detection_pin)
 
     # Set up PWM for PIR and IR LEDs
     PIR_PWM = GPIO.PWM(PIR_LED_PIN, 1000)  # 1000 Hz frequency
@@ -190,374 +442,504 @@ def initialize_gpio():
             pwm_instance.start(0)
             additional_pwms[name] = pwm_instance
 
-    logging.info("GPIO and PWM initialized successfully.")
+    # Hand every PWM channel to the fade scheduler
+    fade_engine.add_channel('PIR', PIR_PWM, FADE_DURATIONS.get('PIR'))
+    fade_engine.add_channel('IR', IR_PWM, FADE_DURATIONS.get('IR'))
+    fade_engine.add_channel('TCS', TCS_PWM, FADE_DURATIONS.get('TCS'))
+    for name, pwm_instance in additional_pwms.items():
+        fade_engine.add_channel(name, pwm_instance, FADE_DURATIONS.get(name))
+
+    hardware_log.info("GPIO and PWM initialized successfully.")
 
 def initialize_tcs34725():
-    with fault_mode_lock:
-        current_mode = fault_mode
-    if current_mode == '4':
-        logging.warning("Simulating TCS sensor failure. Skipping initialization.")
-        print("Simulating TCS sensor failure. Skipping initialization.")
+    if FAULT_TABLES.rules[fault_mode].tcs == TCS_STUCK:
+        sensor_log.warning("Simulating TCS sensor failure. Skipping initialization.")
         return
     try:
         # Power on the TCS34725
         bus.write_byte_data(TCS34725_ADDRESS, COMMAND_BIT | ENABLE_REGISTER, ENABLE_PON)
         time.sleep(0.003)  # Wait for 3ms
         
-        # Enable the RGBC function
-        bus.write_byte_data(TCS34725_ADDRESS, COMMAND_BIT | ENABLE_REGISTER, ENABLE_PON | ENABLE_AEN)
+        # Enable the RGBC function, and the ambient light interrupt if INT is wired
+        enable = ENABLE_PON | ENABLE_AEN
+        if TCS_INT_PIN is not None:
+            enable |= ENABLE_AIEN
+        bus.write_byte_data(TCS34725_ADDRESS, COMMAND_BIT | ENABLE_REGISTER, enable)
         time.sleep(0.100)  # Wait for 100ms for integration
+        global tcs_enabled_at
+        tcs_enabled_at = clock()
         
-        # Set Integration Time (ATIME) - Longer integration time for higher sensitivity
-        ATIME_REGISTER = 0x01
-        ATIME = 0xFF  # Maximum integration time (~700ms)
-        bus.write_byte_data(TCS34725_ADDRESS, COMMAND_BIT | ATIME_REGISTER, ATIME)
+        # Set Integration Time (ATIME)
+        bus.write_byte_data(TCS34725_ADDRESS, COMMAND_BIT | ATIME_REGISTER, TCS_ATIME)
         
         # Set Gain (CONTROL) - Higher gain for increased sensitivity
         CONTROL_REGISTER = 0x0F
         CONTROL = 0x03  # 60x gain
         bus.write_byte_data(TCS34725_ADDRESS, COMMAND_BIT | CONTROL_REGISTER, CONTROL)
+
+        # Set the interrupt persistence filter, so brief flashes (headlights)
+        # do not count as a change of ambient light
+        bus.write_byte_data(TCS34725_ADDRESS, COMMAND_BIT | PERS_REGISTER, TCS_APERS)
         
-        logging.info("TCS34725 color sensor initialized with higher sensitivity settings.")
-        print("TCS34725 color sensor initialized with higher sensitivity settings.")
+        sensor_log.info("TCS34725 color sensor initialized with higher sensitivity settings.")
     except Exception as e:
-        logging.error(f"Error initializing TCS34725: {e}")
-        print(f"Error initializing TCS34725: {e}")
-        with faults_lock:
-            faults["TCS_Sensor_Failure"] = True
-            faults["I2C_Communication_Failure"] = True
-
-def read_clear_data():
-    with fault_mode_lock:
-        current_mode = fault_mode
-    if current_mode == '4':
+        sensor_log.error(f"Error initializing TCS34725: {e}", extra=fields(error=type(e).__name__))
+        faults["TCS_Sensor_Failure"] = True
+        faults["I2C_Communication_Failure"] = True
+
+def read_color_data():
+    """Read all four TCS34725 channels in one auto-increment block read."""
+    tcs = FAULT_TABLES.rules[fault_mode].tcs
+    if tcs == TCS_STUCK:
         # Simulating TCS sensor failure
-        logging.warning("Simulating TCS sensor failure. Returning fixed clear value.")
-        return 5000  # Fixed value to simulate sensor failure
-    if current_mode == '5':
+        sensor_log.warning("Simulating TCS sensor failure. Returning fixed clear value.")
+        return ColorReading(STUCK_CLEAR_VALUE, 0, 0, 0)  # Fixed value to simulate sensor failure
+    if tcs == TCS_I2C_ERROR:
         # Simulating I2C communication failure
-        logging.error("Simulating I2C communication failure.")
+        sensor_log.error("Simulating I2C communication failure.")
         raise IOError("I2C communication error")
     try:
-        # TCS34725 returns low byte first
-        clear_low = bus.read_byte_data(TCS34725_ADDRESS, COMMAND_BIT | CDATAL)
-        clear_high = bus.read_byte_data(TCS34725_ADDRESS, COMMAND_BIT | (CDATAL + 1))
-        clear = (clear_high << 8) | clear_low
-        with faults_lock:
-            faults["TCS_Sensor_Failure"] = False
-            faults["I2C_Communication_Failure"] = False
-        logging.debug(f"Clear value read from TCS34725: {clear}")
-        return clear
+        # TCS34725 returns low byte first; auto-increment walks C, R, G, B
+        with i2c_latency.time():
+            data = bus.read_i2c_block_data(
+                TCS34725_ADDRESS, COMMAND_BIT | COMMAND_AUTO_INCREMENT | CDATAL, RGBC_BLOCK_LENGTH
+            )
+        reading = ColorReading(
+            clear=data[0] | (data[1] << 8),
+            red=data[2] | (data[3] << 8),
+            green=data[4] | (data[5] << 8),
+            blue=data[6] | (data[7] << 8),
+        )
+        faults["TCS_Sensor_Failure"] = False
+        faults["I2C_Communication_Failure"] = False
+        sensor_log.debug("RGBC values read from TCS34725: %s", reading)
+        return reading
     except Exception as e:
-        logging.error(f"Error reading TCS34725 data: {e}")
-        print(f"Error reading TCS34725 data: {e}")
-        with faults_lock:
-            faults["TCS_Sensor_Failure"] = True
-            faults["I2C_Communication_Failure"] = True
-        return HIGH_LIGHT_THRESHOLD  # Assume it's bright to turn off LEDs
-
-def map_clear_to_duty_cycle(clear_value, clear_min=LOW_LIGHT_THRESHOLD, clear_max=HIGH_LIGHT_THRESHOLD):
-    """Map the clear sensor value to a PWM duty cycle percentage."""
-    clear_value = max(clear_min, min(clear_value, clear_max))
-    duty_cycle = (clear_max - clear_value) * 100 / (clear_max - clear_min)
-    duty_cycle = max(0, min(100, duty_cycle))  # Ensure duty cycle is within [0, 100]
-    logging.debug(f"Mapped clear value {clear_value} to duty cycle {duty_cycle}%")
-    return duty_cycle
-
-def fade_out(pwm_instance, led_name):
-    """Gradually decrease duty cycle to 0."""
-    global current_duty, fading
-    with faults_lock:
-        if faults.get(f"{led_name}_Failure", False):
-            logging.error(f"Cannot fade out {led_name} LED due to a detected fault.")
-            return
-    if fading.get(led_name, False):
-        return  # Prevent multiple fade_out threads
-    fading[led_name] = True
-    logging.debug(f"Starting fade out for {led_name}")
-    while current_duty.get(led_name, 0) > 0:
-        current_duty[led_name] = max(current_duty.get(led_name, 0) - DIM_STEP, 0)
-        pwm_instance.ChangeDutyCycle(current_duty[led_name])
-        time.sleep(DIM_DELAY)
-    fading[led_name] = False
-    logging.debug(f"{led_name} faded out to 0% duty cycle.")
-
-def fade_in(pwm_instance, led_name, target_dc=100):
-    """Gradually increase duty cycle to target_dc."""
-    global current_duty, fading
-    with faults_lock:
-        if faults.get(f"{led_name}_Failure", False):
-            logging.error(f"Cannot fade in {led_name} LED due to a detected fault.")
-            return
-    if fading.get(led_name, False):
-        return  # Prevent multiple fade_in threads
-    fading[led_name] = True
-    logging.debug(f"Starting fade in for {led_name} to {target_dc}% duty cycle.")
-    while current_duty.get(led_name, 0) < target_dc:
-        current_duty[led_name] = min(current_duty.get(led_name, 0) + DIM_STEP, target_dc)
-        pwm_instance.ChangeDutyCycle(current_duty[led_name])
-        time.sleep(DIM_DELAY)
-    fading[led_name] = False
-    logging.debug(f"{led_name} faded in to {target_dc}% duty cycle.")
-
-def fade_to_duty_cycle(pwm_instance, led_name, target_dc):
-    """Fade to a specific duty cycle smoothly."""
-    global current_duty, fading
-    with faults_lock:
-        if faults.get(f"{led_name}_Failure", False):
-            logging.error(f"Cannot change duty cycle of {led_name} LED due to a detected fault.")
-            return
-    if fading.get(led_name, False):
-        return  # Prevent multiple fade threads
-    fading[led_name] = True
-    logging.debug(f"Starting fade to {target_dc}% duty cycle for {led_name}")
-    # Fade in or out based on target
-    if target_dc > current_duty.get(led_name, 0):
-        while current_duty.get(led_name, 0) < target_dc:
-            current_duty[led_name] = min(current_duty.get(led_name, 0) + DIM_STEP, target_dc)
-            pwm_instance.ChangeDutyCycle(current_duty[led_name])
-            time.sleep(DIM_DELAY)
-    elif target_dc < current_duty.get(led_name, 0):
-        while current_duty.get(led_name, 0) > target_dc:
-            current_duty[led_name] = max(current_duty.get(led_name, 0) - DIM_STEP, target_dc)
-            pwm_instance.ChangeDutyCycle(current_duty[led_name])
-            time.sleep(DIM_DELAY)
-    fading[led_name] = False
-    logging.debug(f"{led_name} duty cycle set to {target_dc}%.")
+        i2c_errors.inc()
+        sensor_log.error(f"Error reading TCS34725 data: {e}", extra=fields(error=type(e).__name__))
+        faults["TCS_Sensor_Failure"] = True
+        faults["I2C_Communication_Failure"] = True
+        return ColorReading(HIGH_LIGHT_THRESHOLD, 0, 0, 0)  # Assume it's bright to turn off LEDs
+
+def arm_tcs_interrupt(clear, light):
+    """Set the TCS34725's AILT/AIHT around clear and clear its pending interrupt."""
+    global tcs_interrupt_armed
+    low, high = interrupt_band(clear, light, hysteresis=LIGHT_HYSTERESIS)
+    try:
+        bus.write_i2c_block_data(TCS34725_ADDRESS, COMMAND_BIT | COMMAND_AUTO_INCREMENT | AILTL,
+                                 [low & 0xFF, low >> 8, high & 0xFF, high >> 8])
+        bus.write_byte(TCS34725_ADDRESS, COMMAND_BIT | COMMAND_SPECIAL_FUNCTION | SF_CLEAR_INTERRUPT)
+    except Exception as e:
+        i2c_errors.inc()
+        sensor_log.error(f"Error arming the TCS34725 interrupt: {e}", extra=fields(error=type(e).__name__))
+        tcs_interrupt_armed = False
+        return
+    tcs_interrupt_armed = True
+    sensor_log.debug("TCS34725 interrupt armed for clear values %s-%s.", low, high)
 
-def handle_individual_led_faults(led_faults):
-    """Handles faults for individual additional LEDs."""
-    for led_name, is_faulty in led_faults.items():
-        if is_faulty:
-            if led_name in additional_pwms and current_duty[led_name] != 0:
-                fade_out(additional_pwms[led_name], led_name)
-            # Ensure the LED is off
-            if led_name in additional_pwms:
-                additional_pwms[led_name].ChangeDutyCycle(0)
-                current_duty[led_name] = 0
-            logging.error(f"{led_name} LED has a fault and has been turned off.")
+def read_clear_data():
+    """Return just the clear (ambient light) channel."""
+    return read_color_data().clear
 
-def sensor_monitoring_loop():
-    global last_pir_detection_time, last_ir_detection_time, led2_fault_flag
-    # Initialize duty_cycle attributes
-    for key in current_duty.keys():
-        current_duty[key] = 0
+def led_has_fault(led_name):
+    return fleet.has_fault(fleet.index(led_name), FAULT_LED_FAILURE)
 
-    # Initialize previous LED2 state
-    previous_led2_state = False
+def led_overridden(led_name):
+    return bool(fleet.override[fleet.index(led_name)])
 
-    while True:
-        # Sensor readings
-        with fault_mode_lock:
-            current_mode = fault_mode
+def fade_out(led_name):
+    """Gradually decrease duty cycle to 0, unless the LED is under manual override."""
+    if led_has_fault(led_name):
+        fault_log.error(f"Cannot fade out {led_name} LED due to a detected fault.")
+        return
+    if led_overridden(led_name):
+        return
+    fade_engine.fade_to(led_name, 0)
 
-        # Determine if any faults are active
-        faults_active = current_mode != '1'  # '1' is Normal Operation
+def fade_in(led_name, target_dc=100):
+    """Gradually increase duty cycle to target_dc, unless the LED is under manual override."""
+    if led_has_fault(led_name):
+        fault_log.error(f"Cannot fade in {led_name} LED due to a detected fault.")
+        return
+    if led_overridden(led_name):
+        return
+    fade_engine.fade_to(led_name, target_dc)
 
-        # Control the red LED based on fault status
-        if faults_active:
-            GPIO.output(RED_LED_PIN, GPIO.HIGH)
+def fade_to_duty_cycle(led_name, target_dc, manual=False):
+    """Fade to a specific duty cycle smoothly.
+
+    The control loop's fades (manual=False) skip LEDs under manual override,
+    and LEDs already lit within DUTY_DEADBAND of target_dc. Manual ones always
+    go to target_dc.
+    """
+    if led_has_fault(led_name):
+        fault_log.error(f"Cannot change duty cycle of {led_name} LED due to a detected fault.")
+        return
+    if not manual and led_overridden(led_name):
+        return
+    current = fade_engine.target(led_name)
+    if not manual and current and target_dc and abs(target_dc - current) < DUTY_DEADBAND:
+        if target_dc != current:
+            actuations_suppressed.labels("deadband").inc()
+        return
+    fade_engine.fade_to(led_name, target_dc)
+
+def handle_individual_led_faults(led_faults):
+    """Handles faults for individual additional LEDs."""
+    for led_name, is_faulty in led_faults.items():
+        if is_faulty:
+            # Ensure the LED is off
+            if fade_engine.has_channel(led_name):
+                fade_engine.set_duty(led_name, 0)
+            fault_log.error(f"{led_name} LED has a fault and has been turned off.")
+
+def drive_led2(on):
+    """Switch LED2 (plain GPIO, not PWM) and record the drive level for feedback checks."""
+    GPIO.output(ADDITIONAL_LED_PINS["LED2"]["gpio"], GPIO.HIGH if on else GPIO.LOW)
+    duty = 100 if on else 0
+    if fleet.duty[LED2_ROW] != duty:
+        fleet.duty[LED2_ROW] = duty
+        fleet.changed_at[LED2_ROW] = time.monotonic()
+
+def check_feedback():
+    """Compare every detection pin with its channel's drive, reading all pins at once."""
+    if not len(feedback_monitor):
+        return
+    levels = read_levels(feedback_monitor.pins)
+    gpio_calls.labels("read_levels").inc()
+    for name, stuck in feedback_monitor.scan(levels):
+        if stuck == RECOVERED:
+            # As the baseline did for LED2: the control loop takes the channel back
+            fleet.override[fleet.index(name)] = 0
+            fault_log.info(f"Actual Fault Resolved: {name} is responding correctly.", extra=fields(led=name))
+            continue
+        feedback_faults.labels(name).inc()
+        fault_log.error(f"Actual Fault Detected: {name} is not responding as expected.",
+                        extra=fields(led=name, duty=fleet.duty[fleet.index(name)], detection=stuck))
+
+def record_history(now, pir_detected, ir_detected):
+    samples = {
+        "clear": last_color_reading.clear,
+        "clear.filtered": filtered_clear,
+        "red": last_color_reading.red,
+        "green": last_color_reading.green,
+        "blue": last_color_reading.blue,
+        "pir": 1 if pir_detected else 0,
+        "ir": 0 if ir_detected else 1,  # 1 while the IR sensor sees an object
+        "LED2": 1 if GPIO.input(ADDITIONAL_LED_PINS["LED2"]["gpio"]) else 0,
+    }
+    # Only the pole's own PWM channels: a ring per luminaire added to the
+    # fleet would cost ~200 KB each
+    for led_name in LED_CHANNELS:
+        if fade_engine.has_channel(led_name):
+            samples[f"duty.{led_name}"] = fleet.duty[fleet.index(led_name)]
+    history.record(now, samples)
+
+def control_iteration():
+    """One pass of the monitoring loop: read the sensors, drive the LEDs, check for faults.
+
+    Returns False when the iteration was skipped (simulated delayed response).
+    """
+    global last_color_reading, next_sample_time, delayed_start_time, last_iteration_time
+    global tcs_interrupt_armed, tcs_interrupt_pending, tcs_watchdog_time, filtered_clear, light_class
+    apply_pending_commands()
+    now = clock()
+    last_iteration_time = now
+
+    # Sensor readings
+    current_mode = fault_mode
+    rule = FAULT_TABLES.rules[current_mode]
+
+    # Determine if any faults are active
+    faults_active = current_mode != NORMAL_MODE
+
+    # Control the red LED based on fault status
+    if faults_active:
+        GPIO.output(RED_LED_PIN, GPIO.HIGH)
+    else:
+        GPIO.output(RED_LED_PIN, GPIO.LOW)
+
+    # Simulate delayed response
+    if rule.delayed:
+        if delayed_start_time is None:
+            delayed_start_time = now
+            # Notify once when entering delayed mode
+            fault_log.info(f"Delayed response mode active. System will respond after {DELAYED_RESPONSE_TIME} seconds.",
+                           extra=fields(mode=current_mode))
+        elif now - delayed_start_time < DELAYED_RESPONSE_TIME:
+            record_trace(now, TRACE_SKIPPED)
+            return False  # Skip this loop iteration
         else:
-            GPIO.output(RED_LED_PIN, GPIO.LOW)
-
-        # Simulate delayed response
-        if current_mode == '8':
-            delayed_start_time = getattr(sensor_monitoring_loop, 'delayed_start_time', None)
-            if delayed_start_time is None:
-                sensor_monitoring_loop.delayed_start_time = time.time()
-                # Notify once when entering delayed mode
-                logging.info("Delayed response mode active. System will respond after 5 seconds.")
-                print("Delayed response mode active. System will respond after 5 seconds.")
-            elif time.time() - sensor_monitoring_loop.delayed_start_time < 5:
-                time.sleep(0.5)
-                continue  # Skip this loop iteration
-            else:
-                sensor_monitoring_loop.delayed_start_time = None  # Reset for next delay
-                logging.info("Delayed response mode deactivated.")
-                print("Delayed response mode deactivated.")
-
-        # Simulate sensor cross-talk
-        if current_mode == '9':
-            pir_detected = True  # Simulate PIR detection affecting IR sensor logic
-            ir_detected = True
-            logging.warning("Simulating sensor cross-talk. Both PIR and IR sensors detected activity.")
-            print("Simulating sensor cross-talk. Both PIR and IR sensors detected activity.")
+            delayed_start_time = None  # Reset for next delay
+            fault_log.info("Delayed response mode deactivated.", extra=fields(mode=current_mode))
+    else:
+        delayed_start_time = None
+
+    # Announce the simulated fault (cross-talk, LED or GPIO output failure)
+    if rule.tick_log is not None:
+        level, message = rule.tick_log
+        if rule.failed_channel is not None:
+            fault_log.log(level, message, extra=fields(mode=current_mode, led=rule.failed_channel))
         else:
-            # Read PIR sensor
-            if current_mode == '2':
-                pir_detected = False  # Simulate PIR sensor failure (always False)
-            else:
-                pir_detected = GPIO.input(PIR_PIN)
+            fault_log.log(level, message, extra=fields(mode=current_mode))
+
+    # Read PIR sensor unless the rule forces it. A detection latched by the
+    # edge callback keeps counting for LED_ON_TIME, so pulses shorter than a
+    # tick still count.
+    pir_level = ir_level = 0
+    if rule.pir is not None:
+        pir_detected = rule.pir
+    else:
+        pir_level = GPIO.input(PIR_PIN)
+        pir_detected = pir_level or now - last_pir_detection_time < LED_ON_TIME
 
-            # Read IR sensor
-            if current_mode == '3':
-                ir_detected = True  # Simulate IR sensor failure (stuck at HIGH)
-            else:
-                ir_detected = GPIO.input(IR_PIN)
-
-        # Simulate individual LED failures
-        led_faults = {
-            'LED1': False,
-            'LED2': False,
-            'LED3': False
-        }
-        if current_mode in ['10', '11', '12']:
-            faulty_led = FAULT_MODES[current_mode].split()[1]  # e.g., 'LED1' from 'Simulate LED1 Failure'
-            led_faults[faulty_led] = True
-            logging.error(f"Simulating fault in {faulty_led}. It will not light up.")
-            print(f"Simulating fault in {faulty_led}. It will not light up.")
-
-        # Simulate GPIO output failure
-        gpio_output_enabled = True
-        if current_mode == '6':
-            gpio_output_enabled = False
-            logging.error("Simulating GPIO output failure. LEDs will not update.")
-            print("Simulating GPIO output failure. LEDs will not update.")
-
-        # Handle individual LED faults
-        handle_individual_led_faults(led_faults)
-
-        # Simulate power issues (flickering LEDs)
-        if current_mode == '7':
+    # Read IR sensor (LOW means an object is present) unless the rule forces it
+    if rule.ir is not None:
+        ir_detected = rule.ir
+    else:
+        ir_level = GPIO.input(IR_PIN)
+        ir_detected = ir_level and now - last_ir_detection_time >= LED_ON_TIME
+
+    # Simulate individual LED failures
+    led_faults = dict.fromkeys(ADDITIONAL_LED_PINS, False)
+    led_faults.update(dict.fromkeys(additional_pwms, False))
+    if rule.failed_channel is not None:
+        led_faults[rule.failed_channel] = True
+
+    # Simulate GPIO output failure
+    gpio_output_enabled = rule.outputs_enabled
+
+    # Handle individual LED faults
+    handle_individual_led_faults(led_faults)
+
+    # The sensors are polled (and the flicker stepped) on the sample
+    # deadline. Ambient light is read then too, unless the TCS34725's
+    # interrupt is armed: that reads it only when the interrupt fires or the
+    # watchdog is due. Other iterations reuse the last reading.
+    if rule.tcs != TCS_OK:
+        tcs_interrupt_armed = False
+    sample_due = now >= next_sample_time
+    read_due = tcs_interrupt_pending or (sample_due and (not tcs_interrupt_armed or now >= tcs_watchdog_time))
+    tcs_interrupt_pending = False
+
+    # Simulate power issues (flickering LEDs)
+    if rule.flicker:
+        if sample_due:
             # Simulate power issues by randomly turning LEDs on and off
             flicker_duty_cycle = random.choice([0, 50, 100])
             if gpio_output_enabled:
-                TCS_PWM.ChangeDutyCycle(flicker_duty_cycle)
-                current_duty['TCS'] = flicker_duty_cycle
-                for led_name, pwm_instance in additional_pwms.items():
-                    if led_name != "LED2" and not led_faults[led_name]:
-                        pwm_instance.ChangeDutyCycle(flicker_duty_cycle)
-                        current_duty[led_name] = flicker_duty_cycle
-            logging.warning("Simulating power issues. LEDs are flickering.")
-            print("Simulating power issues. LEDs are flickering.")
+                fade_engine.set_duty('TCS', flicker_duty_cycle)
+                for led_name in additional_pwms:
+                    if not led_faults[led_name]:
+                        fade_engine.set_duty(led_name, flicker_duty_cycle)
+            fault_log.warning("Simulating power issues. LEDs are flickering.", extra=fields(mode=current_mode, duty=flicker_duty_cycle))
+            next_sample_time = now + LOOP_INTERVAL
         else:
-            # Normal light adjustment logic
+            next_sample_time = min(next_sample_time, now + LOOP_INTERVAL)
+    else:
+        # Normal light adjustment logic
+        if read_due:
             try:
-                clear = read_clear_data()
+                color = read_color_data()
             except IOError as e:
-                logging.error(f"Error reading from TCS34725 sensor: {e}")
-                clear = HIGH_LIGHT_THRESHOLD  # Assume it's bright to turn off LEDs
-
-            if current_mode == '7':
-                # Power issues already handled above
-                pass
+                sensor_log.error(f"Error reading from TCS34725 sensor: {e}")
+                color = ColorReading(HIGH_LIGHT_THRESHOLD, 0, 0, 0)  # Assume it's bright to turn off LEDs
+            last_color_reading = color
+            sensor_ok = rule.tcs == TCS_OK and not faults["TCS_Sensor_Failure"]
+            if sensor_ok:
+                filtered_clear = light_filter.update(color.clear)
+            else:
+                # Fail-safe and simulated readings are acted on as they are
+                light_filter.reset()
+                filtered_clear = color.clear
+        clear = filtered_clear
+
+        # Classify with hysteresis, counting the class changes that the
+        # filter or the hysteresis held back
+        light = classify_light(clear, previous=light_class, hysteresis=LIGHT_HYSTERESIS)
+        if read_due and light_class is not None:
+            if light == light_class and classify_light(color.clear, previous=light_class,
+                                                       hysteresis=LIGHT_HYSTERESIS) != light_class:
+                actuations_suppressed.labels("filter").inc()
+            elif light != classify_light(clear):
+                actuations_suppressed.labels("hysteresis").inc()
+        light_class = light
+        if read_due:
+            if TCS_INT_PIN is not None and sensor_ok:
+                arm_tcs_interrupt(clear, light)
+                tcs_watchdog_time = now + TCS_WATCHDOG_INTERVAL
             else:
-                # Adjust LED brightness and additional LEDs based on ambient light
-                if clear < LOW_LIGHT_THRESHOLD:
-                    # Night Mode
-                    if pir_detected or not ir_detected:
-                        # Turn on additional LEDs
-                        for led_name, pwm_instance in additional_pwms.items():
-                            if gpio_output_enabled and not led_faults[led_name] and current_duty[led_name] < 100 and not fading[led_name]:
-                                threading.Thread(target=fade_in, args=(pwm_instance, led_name, 100)).start()
-                        # Turn on LED2 if not in manual override and not faulty
-                        with faults_lock:
-                            if not manual_override['LED2'] and not faults.get("LED2_Failure", False):
-                                GPIO.output(ADDITIONAL_LED_PINS["LED2"]["gpio"], GPIO.HIGH)
-                    else:
-                        # Turn off additional LEDs
-                        for led_name, pwm_instance in additional_pwms.items():
-                            if gpio_output_enabled and current_duty[led_name] > 0 and not fading[led_name]:
-                                threading.Thread(target=fade_out, args=(pwm_instance, led_name)).start()
-                        # Turn off LED2 if not in manual override and not faulty
-                        with faults_lock:
-                            if not manual_override['LED2'] and not faults.get("LED2_Failure", False):
-                                GPIO.output(ADDITIONAL_LED_PINS["LED2"]["gpio"], GPIO.LOW)
-                    # Turn on TCS LED
-                    if gpio_output_enabled and current_duty['TCS'] < 100 and not fading['TCS']:
-                        threading.Thread(target=fade_in, args=(TCS_PWM, 'TCS', 100)).start()
-                elif clear > HIGH_LIGHT_THRESHOLD:
-                    # Day Mode
+                tcs_interrupt_armed = False
+
+        # Adjust LED brightness and additional LEDs based on ambient light
+        if light == NIGHT:
+            # Night Mode
+            if pir_detected or not ir_detected:
+                # Turn on additional LEDs
+                for led_name in additional_pwms:
+                    if gpio_output_enabled and not led_faults[led_name]:
+                        fade_in(led_name, 100)
+                # Turn on LED2 if not in manual override and not faulty
+                if not fleet.override[LED2_ROW] and not fleet.has_fault(LED2_ROW, FAULT_LED_FAILURE):
+                    drive_led2(True)
+            else:
+                # Turn off additional LEDs
+                for led_name in additional_pwms:
                     if gpio_output_enabled:
-                        # Turn off TCS LED
-                        if current_duty['TCS'] > 0 and not fading['TCS']:
-                            threading.Thread(target=fade_out, args=(TCS_PWM, 'TCS')).start()
-                        # Turn off additional LEDs
-                        for led_name, pwm_instance in additional_pwms.items():
-                            if gpio_output_enabled and current_duty[led_name] > 0 and not fading[led_name]:
-                                threading.Thread(target=fade_out, args=(pwm_instance, led_name)).start()
-                        # Turn off LED2 if not in manual override and not faulty
-                        with faults_lock:
-                            if not manual_override['LED2'] and not faults.get("LED2_Failure", False):
-                                GPIO.output(ADDITIONAL_LED_PINS["LED2"]["gpio"], GPIO.LOW)
-                else:
-                    # Moderate Light
-                    duty_cycle = map_clear_to_duty_cycle(clear)
-                    if pir_detected or not ir_detected:
-                        # Adjust additional LEDs to mapped duty cycle
-                        for led_name, pwm_instance in additional_pwms.items():
-                            if gpio_output_enabled and not led_faults[led_name] and current_duty[led_name] < duty_cycle and not fading[led_name]:
-                                threading.Thread(target=fade_in, args=(pwm_instance, led_name, duty_cycle)).start()
-                        # Turn on LED2 if not in manual override and not faulty
-                        with faults_lock:
-                            if not manual_override['LED2'] and not faults.get("LED2_Failure", False):
-                                GPIO.output(ADDITIONAL_LED_PINS["LED2"]["gpio"], GPIO.HIGH)
-                    else:
-                        # Turn off additional LEDs
-                        for led_name, pwm_instance in additional_pwms.items():
-                            if gpio_output_enabled and current_duty[led_name] > 0 and not fading[led_name]:
-                                threading.Thread(target=fade_out, args=(pwm_instance, led_name)).start()
-                        # Turn off LED2 if not in manual override and not faulty
-                        with faults_lock:
-                            if not manual_override['LED2'] and not faults.get("LED2_Failure", False):
-                                GPIO.output(ADDITIONAL_LED_PINS["LED2"]["gpio"], GPIO.LOW)
-                    # Adjust TCS LED to mapped duty cycle
+                        fade_out(led_name)
+                # Turn off LED2 if not in manual override and not faulty
+                if not fleet.override[LED2_ROW] and not fleet.has_fault(LED2_ROW, FAULT_LED_FAILURE):
+                    drive_led2(False)
+            # Turn on TCS LED
+            if gpio_output_enabled:
+                fade_in('TCS', 100)
+        elif light == DAY:
+            # Day Mode
+            if gpio_output_enabled:
+                # Turn off TCS LED
+                fade_out('TCS')
+                # Turn off additional LEDs
+                for led_name in additional_pwms:
+                    fade_out(led_name)
+                # Turn off LED2 if not in manual override and not faulty
+                if not fleet.override[LED2_ROW] and not fleet.has_fault(LED2_ROW, FAULT_LED_FAILURE):
+                    drive_led2(False)
+        else:
+            # Moderate Light
+            duty_cycle = map_clear_to_duty_cycle(clear)
+            if pir_detected or not ir_detected:
+                # Adjust additional LEDs to mapped duty cycle
+                for led_name in additional_pwms:
+                    if gpio_output_enabled and not led_faults[led_name]:
+                        fade_to_duty_cycle(led_name, duty_cycle)
+                # Turn on LED2 if not in manual override and not faulty
+                if not fleet.override[LED2_ROW] and not fleet.has_fault(LED2_ROW, FAULT_LED_FAILURE):
+                    drive_led2(True)
+            else:
+                # Turn off additional LEDs
+                for led_name in additional_pwms:
                     if gpio_output_enabled:
-                        if duty_cycle > current_duty['TCS'] and not fading['TCS']:
-                            threading.Thread(target=fade_in, args=(TCS_PWM, 'TCS', duty_cycle)).start()
-                        elif duty_cycle < current_duty['TCS'] and not fading['TCS']:
-                            threading.Thread(target=fade_out, args=(TCS_PWM, 'TCS')).start()
-
-        # LED2 Actual Fault Detection
-        # Only proceed if not in simulation fault mode for LED2 and not already in a fault state
-        with faults_lock:
-            if not faults.get("LED2_Failure", False) and current_mode != '11':
-                # Check if manual override is active; if so, skip actual fault detection
-                if not manual_override['LED2']:
-                    # Read GPIO6 (control pin) and GPIO21 (detection pin)
-                    led2_control_state = GPIO.input(ADDITIONAL_LED_PINS["LED2"]["gpio"])
-                    led2_detection_state = GPIO.input(ADDITIONAL_LED_PINS["LED2"]["detection_gpio"])
-
-                    # Define expected behavior
-                    if led2_control_state and not led2_detection_state:
-                        # LED2 should be ON (GPIO6 HIGH), but GPIO21 is LOW -> Fault
-                        with led2_fault_lock:
-                            if not led2_fault_flag:
-                                faults["LED2_Failure"] = True
-                                led2_fault_flag = True
-                                logging.error("Actual Fault Detected: LED2 is not responding as expected.")
-                                print("Actual Fault Detected: LED2 is not responding as expected.")
-                    elif not led2_control_state and led2_detection_state:
-                        # LED2 should be OFF (GPIO6 LOW), but GPIO21 is HIGH -> Fault
-                        with led2_fault_lock:
-                            if not led2_fault_flag:
-                                faults["LED2_Failure"] = True
-                                led2_fault_flag = True
-                                logging.error("Actual Fault Detected: LED2 is not responding as expected.")
-                                print("Actual Fault Detected: LED2 is not responding as expected.")
-                    else:
-                        # No fault detected; ensure LED2_Failure flag is cleared
-                        with led2_fault_lock:
-                            if led2_fault_flag:
-                                faults["LED2_Failure"] = False
-                                led2_fault_flag = False
-                                manual_override['LED2'] = False  # Reset manual override
-                                logging.info("Actual Fault Resolved: LED2 is responding correctly.")
-                                print("Actual Fault Resolved: LED2 is responding correctly.")
-
-        # Sleep briefly before next loop iteration
-        time.sleep(1)  # Adjust as needed
+                        fade_out(led_name)
+                # Turn off LED2 if not in manual override and not faulty
+                if not fleet.override[LED2_ROW] and not fleet.has_fault(LED2_ROW, FAULT_LED_FAILURE):
+                    drive_led2(False)
+            # Adjust TCS LED to mapped duty cycle
+            if gpio_output_enabled:
+                fade_to_duty_cycle('TCS', duty_cycle)
+
+        # With no motion or object, only an edge (which wakes the loop
+        # anyway) or a change of ambient light can change the outputs. The
+        # armed interrupt reports the latter; without it, slow drift outside
+        # the dimming band can wait a little longer than a reading inside it.
+        quiet = current_mode == NORMAL_MODE and not pir_detected and ir_detected
+        if quiet and tcs_interrupt_armed:
+            interval = TCS_WATCHDOG_INTERVAL
+        elif (quiet and not fade_engine.active_count()
+              and light != MODERATE):
+            interval = SETTLED_SAMPLE_INTERVAL
+        else:
+            interval = LOOP_INTERVAL
+        if sample_due or read_due:
+            next_sample_time = next_integration_end(now + interval)
+        else:
+            # Woken early: only ever bring the next poll forward
+            next_sample_time = min(next_sample_time, next_integration_end(now + interval))
+
+    # Actual fault detection: channels whose detection pin disagrees with
+    # what they are driven to (simulated failures are already faulted)
+    check_feedback()
+
+    # Keep this iteration's readings for /history
+    record_history(now, pir_detected, ir_detected)
+
+    # Publish this iteration's state to readers and streaming clients
+    commit_state()
+    record_trace(now, (TRACE_PIR if pir_level else 0) | (TRACE_IR if ir_level else 0)
+                 | (TRACE_SENSOR_READ if read_due and not rule.flicker else 0))
+    return True
+
+def record_trace(now, flags):
+    """Append the inputs of the iteration at clock() time now to the sensor trace, if recording."""
+    trace = sensor_trace
+    if trace is None:
+        return
+    if control_state.led2_state:
+        flags |= TRACE_LED2
+    trace.record(now, last_pir_detection_time, last_ir_detection_time, last_color_reading.clear,
+                 flags, int(fault_mode))
+
+def next_integration_end(t):
+    """First end of a TCS34725 integration cycle at or after clock() time t."""
+    if tcs_enabled_at is None or t <= tcs_enabled_at:
+        return t
+    cycles = math.ceil((t - tcs_enabled_at) / TCS_INTEGRATION_TIME)
+    return tcs_enabled_at + cycles * TCS_INTEGRATION_TIME
+
+def control_deadline():
+    """Earliest clock() time control_iteration() has to run without an outside event.
+
+    That is the next ambient light sample or a PIR/IR hold expiring
+    (LED_ON_TIME after the latest detection), or the end of a simulated delay.
+    """
+    if delayed_start_time is not None:
+        # Nothing but commands gets through until the delay is over
+        return delayed_start_time + DELAYED_RESPONSE_TIME
+    deadline = next_sample_time
+    for detected_at in (last_pir_detection_time, last_ir_detection_time):
+        expiry = detected_at + LED_ON_TIME
+        if expiry > last_iteration_time:
+            deadline = min(deadline, expiry)
+    return deadline
+
+def run_due(now, woken):
+    """Run whatever the monitoring loop owes at clock() time now.
+
+    woken says whether a motion edge or command ended the last wait; that
+    always runs the control logic. Returns the clock() time of the next
+    deadline.
+    """
+    global next_fade_tick
+    if woken or now >= control_deadline():
+        iteration_start = time.perf_counter()
+        if control_iteration():
+            loop_duration.observe(time.perf_counter() - iteration_start)
+    if fade_engine.active_count():
+        if now >= next_fade_tick:
+            fade_engine.tick()
+            next_fade_tick = now + DIM_DELAY
+        return min(control_deadline(), next_fade_tick)
+    return control_deadline()
+
+def sensor_monitoring_loop():
+    woken = True
+    while True:
+        # Any edge or command from here on wakes the next iteration early
+        loop_wakeup.clear()
+        deadline = run_due(clock(), woken)
+
+        # Sleep until the next deadline, or until a motion edge or command wakes us
+        timeout = min(max(0.0, deadline - clock()), MAX_LOOP_SLEEP)
+        woken = loop_wakeup.wait(timeout)
+        loop_wakeups.labels("event" if woken else "deadline").inc()
 
 @app.on_event("startup")
 def startup_event():
+    global sensor_trace
+    fault_store.start()
+    if SENSOR_TRACE_FILE:
+        sensor_trace = TraceRecorder(SENSOR_TRACE_FILE)
+        control_log.info(f"Recording sensor trace to {SENSOR_TRACE_FILE} ({sensor_trace.count} earlier records).")
     initialize_gpio()
     initialize_tcs34725()
-    # Start the sensor monitoring loop in a background thread
+    # Start the sensor monitoring loop (which also steps the fades) in a background thread
+    commit_state()
     threading.Thread(target=sensor_monitoring_loop, daemon=True).start()
-    logging.info("Backend server started and sensor monitoring loop initiated.")
+    control_log.info(f"Backend server started with '{HARDWARE_BACKEND}' hardware, '{PWM_BACKEND}' PWM "
+                     "and sensor monitoring loop initiated.")
 
 @app.on_event("shutdown")
 def shutdown_event():
+    global sensor_trace
     # Stop PWM and clean up GPIO settings
     PIR_PWM.stop()
     IR_PWM.stop()
@@ -569,154 +951,356 @@ def shutdown_event():
     # Turn off LED2
     GPIO.output(ADDITIONAL_LED_PINS["LED2"]["gpio"], GPIO.LOW)
     GPIO.cleanup()
-    logging.info("Backend server shutdown and GPIO cleaned up.")
-
-@app.get("/status")
-def get_status():
-    with fault_mode_lock:
-        current_mode = fault_mode
-
+    fault_store.stop()
+    trace, sensor_trace = sensor_trace, None
+    if trace is not None:
+        trace.close()
+    control_log.info("Backend server shutdown and GPIO cleaned up.")
+    async_logging.stop_logging()
+
+def commit_state():
+    """Publish a new control_state snapshot. Monitoring loop thread only."""
+    global control_state
     # Read LED2's detection pin (GPIO 21) to determine its state
     led2_state = False
     try:
         led2_state = GPIO.input(ADDITIONAL_LED_PINS["LED2"]["detection_gpio"]) == GPIO.HIGH
     except Exception as e:
-        logging.error(f"Error reading LED2's detection pin: {e}")
-        with faults_lock:
-            faults["LED2_Failure"] = True
+        hardware_log.error(f"Error reading LED2's detection pin: {e}")
+        fleet.set_fault(LED2_ROW, FAULT_LED_FAILURE)
+
+    faults_copy = faults.copy()
+    for channel, key in CHANNEL_FAULT_KEYS.items():
+        faults_copy[key] = fleet.has_fault(fleet.index(channel), FAULT_LED_FAILURE)
+
+    control_state = ControlState(fault_mode, MappingProxyType(faults_copy), led2_state)
+    record_fault_transitions(control_state)
+    publish_status()
+
+def apply_pending_commands():
+    """Run every queued API command, then publish the state they produced."""
+    completed = []
+    while True:
+        try:
+            function, args, future = command_queue.get_nowait()
+        except queue.Empty:
+            break
+        if not future.set_running_or_notify_cancel():
+            continue
+        try:
+            completed.append((future, function(*args), None))
+        except Exception as e:
+            completed.append((future, None, e))
+    if not completed:
+        return
+    commit_state()
+    # Answer the handlers only once readers can see the result
+    for future, result, error in completed:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
 
-    status = {
-        "fault_mode": FAULT_MODES.get(current_mode, "Unknown"),
-        "current_duty": current_duty,
+def submit_command(function, *args):
+    """Have the monitoring loop run function(*args) and return its result.
+
+    Answers 503 if the loop does not get to it within COMMAND_TIMEOUT.
+    """
+    future = concurrent.futures.Future()
+    command_queue.put((function, args, future))
+    loop_wakeup.set()
+    try:
+        return future.result(timeout=COMMAND_TIMEOUT)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        api_log.error(f"Monitoring loop did not run {function.__name__} within {COMMAND_TIMEOUT}s.")
+        return JSONResponse(status_code=503, content={"error": "Control loop is not responding."})
+
+def build_status():
+    state = control_state
+    return {
+        "fault_mode": FAULT_MODES.get(state.fault_mode, "Unknown"),
+        "current_duty": fade_engine.duties(),
         "last_pir_detection_time": last_pir_detection_time,
         "last_ir_detection_time": last_ir_detection_time,
-        "LED2_state": led2_state,  # Include LED2's ON/OFF state
-        "faults": faults.copy()
+        "LED2_state": state.led2_state,  # Include LED2's ON/OFF state
+        "ambient_light": last_color_reading._asdict(),
+        "faults": dict(state.faults)
     }
 
-    return JSONResponse(status)
+def record_fault_transitions(state):
+    """Queue a fault_store event for every fault flag that changed since the last call."""
+    for fault, active in state.faults.items():
+        if reported_faults.get(fault, False) != active:
+            fault_store.record(fault, active, mode=state.fault_mode)
+            fault_transitions.labels(fault, "raised" if active else "cleared").inc()
+            reported_faults[fault] = active
+
+def publish_status():
+    """Publish the current status to /status/stream clients if anything changed.
+
+    Safe from any thread: it only reads control_state and the fade engine.
+    """
+    status_stream.publish(build_status())
+
+def publish_fade_status():
+    """FadeEngine on_change: publish_status(), at most every STATUS_FADE_PUBLISH_INTERVAL while fading.
+
+    The status carries a duty cycle per channel, so rebuilding and encoding
+    it on every DIM_DELAY tick dominates the fade ticks of a large fleet.
+    """
+    global next_fade_publish
+    now = clock()
+    if now < next_fade_publish and fade_engine.active_count():
+        return
+    next_fade_publish = now + STATUS_FADE_PUBLISH_INTERVAL
+    publish_status()
 
-@app.post("/set_fault_mode")
-def set_fault_mode(request: FaultModeRequest):
-    mode = request.mode
-    if mode not in FAULT_MODES:
-        logging.error(f"Invalid fault mode attempted: {mode}")
-        return JSONResponse(status_code=400, content={"error": "Invalid fault mode."})
-    
-    with fault_mode_lock:
-        global fault_mode
-        fault_mode = mode
-
-        # Reset all fault states if switching to Normal Operation
-        if mode == '1':
-            with faults_lock:
-                for key in faults:
-                    faults[key] = False
-            logging.info("Switched to Normal Operation. All faults cleared.")
-            print("Switched to Normal Operation. All faults cleared.")
-        else:
-            # Simulate faults based on the selected mode
-            with faults_lock:
-                # First, clear all faults
-                for key in faults:
-                    faults[key] = False
-                
-                # Then, set the specific fault
-                if mode == '2':
-                    faults["PIR_Sensor_Failure"] = True
-                elif mode == '3':
-                    faults["IR_Sensor_Failure"] = True
-                elif mode == '4':
-                    faults["TCS_Sensor_Failure"] = True
-                elif mode == '5':
-                    faults["I2C_Communication_Failure"] = True
-                elif mode == '6':
-                    # Simulate GPIO Output Failure by disabling PWM control
-                    faults["GPIO_Output_Failure"] = True
-                elif mode == '7':
-                    # Simulate Power Issues (handled in sensor loop)
-                    faults["Power_Issues"] = True
-                elif mode == '8':
-                    # Simulate Delayed Response
-                    faults["Delayed_Response"] = True
-                elif mode == '9':
-                    # Simulate Sensor Cross-Talk
-                    faults["Sensor_CrossTalk"] = True
-                elif mode == '10':
-                    faults["LED1_Failure"] = True
-                elif mode == '11':
-                    faults["LED2_Failure"] = True
-                elif mode == '12':
-                    faults["LED3_Failure"] = True
-                # Add more fault simulations as needed
-
-            logging.info(f"Simulated Fault Mode: {FAULT_MODES[mode]}")
-            print(f"Simulated Fault Mode: {FAULT_MODES[mode]}")
+@app.get("/status")
+async def get_status(request: Request):
+    """The last published status. Conditional requests for an unchanged status get 304."""
+    version, body = status_stream.encoded()
+    headers = {"ETag": f'"{STATUS_ETAG_BOOT_ID}-{version}"', "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/status/stream")
+async def stream_status(request: Request, since: Optional[str] = None):
+    """Server-sent events: a snapshot, then a delta per state change.
+
+    Clients resume with the Last-Event-ID header (sent automatically by
+    EventSource on reconnect) or the since query parameter, both a
+    "<boot>-<seq>" event id. An id from another boot gets a snapshot.
+    """
+    resume_from = request.headers.get("last-event-id", since)
+    return StreamingResponse(
+        status_events(status_stream, request, resume_from, STATUS_STREAM_KEEPALIVE),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/history")
+def get_history(signal: Optional[str] = None, start: Optional[float] = None, end: Optional[float] = None,
+                resolution: str = "auto"):
+    """Time range of one signal's history; without a signal, list the signals.
+
+    start/end are Unix timestamps (default: the last hour). Raw rows are
+    [time, value]; minute/hour rows are [bucket start, min, max, mean].
+    """
+    if signal is None:
+        return {"signals": history.signals()}
+    end = time.time() if end is None else end
+    start = end - 3600 if start is None else start
+    try:
+        used, rows = history.query(signal, start, end, resolution)
+    except KeyError:
+        return JSONResponse(status_code=404, content={"error": f"Unknown signal: {signal}"})
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return {"signal": signal, "resolution": used, "start": start, "end": end, "points": rows}
+
+@app.get("/faults/history")
+def get_fault_history(fault: Optional[str] = None, start: Optional[float] = None, end: Optional[float] = None,
+                      limit: int = 100, before: Optional[int] = None):
+    """Fault transitions, newest first. Pass next_before back as before for the next page."""
+    limit = max(1, min(limit, FAULT_HISTORY_MAX_LIMIT))
+    events, next_before = fault_store.query(fault=fault, start=start, end=end, limit=limit, before_id=before)
+    return {"events": events, "next_before": next_before}
+
+def apply_fault_mode(mode):
+    """Command: switch to fault mode and reset the fault flags to match it."""
+    global fault_mode
+    fault_mode = mode
+
+    # Reset all fault states, then raise the ones the mode's rule simulates
+    rule = FAULT_TABLES.rules[mode]
+    for key in faults:
+        faults[key] = False
+    fleet.clear_faults()
+    if rule.fault is not None:
+        faults[rule.fault] = True
+    if rule.failed_channel is not None:
+        fleet.set_fault(fleet.index(rule.failed_channel), FAULT_LED_FAILURE)
+
+    if mode == NORMAL_MODE:
+        api_log.info("Switched to Normal Operation. All faults cleared.")
+    else:
+        api_log.info(f"Simulated Fault Mode: {FAULT_MODES[mode]}", extra=fields(mode=mode))
 
     return {"message": FAULT_MODES[mode]}
 
-@app.post("/set_led")
-def set_led(request: dict = Body(...)):
-    led = request.get('led', '').upper()
-    state = request.get('state', False)
-    
-    if led not in ADDITIONAL_LED_PINS and led not in current_duty and led != "TCS":
-        logging.error(f"Invalid LED name attempted: {led}")
-        return JSONResponse(status_code=400, content={"error": "Invalid LED name"})
-
+def apply_set_led(led, state):
+    """Command: switch an LED on or off by hand, unless its fault mode forbids it."""
     # Prevent controlling LEDs that are in fault mode
-    fault_prevent = False
-    with fault_mode_lock:
-        if led == "LED1" and fault_mode == '10':
-            fault_prevent = True
-        elif led == "LED2" and fault_mode == '11':
-            fault_prevent = True
-        elif led == "LED3" and fault_mode == '12':
-            fault_prevent = True
-        elif led == "PIR" and fault_mode == '2':
-            fault_prevent = True
-        elif led == "IR" and fault_mode == '3':
-            fault_prevent = True
-        elif led == "TCS" and fault_mode == '4':
-            fault_prevent = True
-        elif fault_mode in ['6', '7', '8', '9'] and led in ['LED1', 'LED2', 'LED3']:
-            fault_prevent = True
+    fault_prevent = led in FAULT_TABLES.locked[fault_mode]
 
     if fault_prevent:
-        logging.warning(f"Attempted to control {led} while in fault mode.")
+        api_log.warning(f"Attempted to control {led} while in fault mode.")
         return JSONResponse(status_code=400, content={"error": f"Cannot control {led} in current fault mode."})
 
     if led == "LED2":
         # Control LED2 directly via GPIO6
-        GPIO.output(ADDITIONAL_LED_PINS["LED2"]["gpio"], GPIO.HIGH if state else GPIO.LOW)
-        with faults_lock:
-            manual_override['LED2'] = True  # Activate manual override
-            # Reset LED2 Fault Flag if manual control is restored
-            if faults.get("LED2_Failure", False):
-                faults["LED2_Failure"] = False
-                logging.info("Manual control restored for LED2. Fault flag cleared.")
-                print("Manual control restored for LED2. Fault flag cleared.")
-        logging.info(f"{led} LED set to {'on' if state else 'off'} via manual control.")
+        drive_led2(state)
+        fleet.override[LED2_ROW] = 1  # Activate manual override
+        # Reset LED2 Fault Flag if manual control is restored
+        if fleet.has_fault(LED2_ROW, FAULT_LED_FAILURE):
+            fleet.set_fault(LED2_ROW, FEEDBACK_FAULT_BITS, False)
+            api_log.info("Manual control restored for LED2. Fault flag cleared.")
+        api_log.info(f"{led} LED set to {'on' if state else 'off'} via manual control.")
         return {"message": f"{led} LED turned {'on' if state else 'off'} via manual control"}
     else:
         # For PWM-controlled LEDs
         duty_cycle = 100 if state else 0
-        pwm_instance = {
-            "PIR": PIR_PWM,
-            "IR": IR_PWM,
-            "TCS": TCS_PWM,
-            "LED1": additional_pwms.get("LED1"),
-            "LED3": additional_pwms.get("LED3"),
-        }.get(led)
-
-        if pwm_instance:
-            threading.Thread(target=fade_to_duty_cycle, args=(pwm_instance, led, duty_cycle)).start()
-            logging.info(f"{led} LED set to {'on' if state else 'off'}.")
+        if fade_engine.has_channel(led):
+            fade_to_duty_cycle(led, duty_cycle, manual=True)
+            api_log.info(f"{led} LED set to {'on' if state else 'off'}.")
             return {"message": f"{led} LED turned {'on' if state else 'off'}"}
-    
-    logging.error(f"Failed to set LED: {led}")
+
+    api_log.error(f"Failed to set LED: {led}")
     return JSONResponse(status_code=500, content={"error": "Failed to set LED."})
 
+def apply_led_batch(commands):
+    """Command: apply (channel, duty, fade time) commands together, or none if any channel is refused.
+
+    Channels given a duty are put under manual override; a duty of None
+    releases the channel to the control loop.
+    """
+    locked = FAULT_TABLES.locked[fault_mode]
+    refused = sorted({channel for channel, duty, _ in commands
+                      if channel in locked or (duty is not None and channel != "LED2" and led_has_fault(channel))})
+    if refused:
+        api_log.warning(f"Bulk LED command refused for {', '.join(refused)} in the current fault state.")
+        return JSONResponse(status_code=400, content={
+            "error": "Cannot control some channels in the current fault state.", "channels": refused})
+
+    for channel, duty, fade_time in commands:
+        idx = fleet.index(channel)
+        if duty is None:
+            fleet.override[idx] = 0  # The control loop takes over on this iteration
+            continue
+        fleet.override[idx] = 1
+        if channel == "LED2":
+            drive_led2(duty > 0)
+            if fleet.has_fault(LED2_ROW, FAULT_LED_FAILURE):
+                fleet.set_fault(LED2_ROW, FEEDBACK_FAULT_BITS, False)
+                api_log.info("Manual control restored for LED2. Fault flag cleared.")
+        else:
+            fade_engine.fade_to(channel, duty, fade_time)
+    api_log.info(f"Bulk LED command applied to {len(commands)} channels.", extra=fields(channels=len(commands)))
+    return {"applied": len(commands)}
+
+def led_commands(commands):
+    """Validate LedCommands into (channel, duty, fade time) tuples.
+
+    Returns (tuples, None), or (None, 400 response) for unknown or repeated channels.
+    """
+    parsed = [(command.channel.upper(), command.duty, command.fade_time) for command in commands]
+    channels = [channel for channel, _, _ in parsed]
+    unknown = sorted({channel for channel in channels
+                      if channel not in ADDITIONAL_LED_PINS and not fade_engine.has_channel(channel)})
+    if unknown:
+        api_log.error(f"Invalid LED names in bulk command: {', '.join(unknown)}")
+        return None, JSONResponse(status_code=400, content={"error": "Invalid LED name", "channels": unknown})
+    repeated = sorted({channel for channel in channels if channels.count(channel) > 1})
+    if repeated:
+        return None, JSONResponse(status_code=400, content={"error": "Channel given more than once",
+                                                             "channels": repeated})
+    return parsed, None
+
+@app.post("/set_fault_mode")
+def set_fault_mode(request: FaultModeRequest):
+    mode = request.mode
+    if mode not in FAULT_MODES:
+        api_log.error(f"Invalid fault mode attempted: {mode}")
+        return JSONResponse(status_code=400, content={"error": "Invalid fault mode."})
+    return submit_command(apply_fault_mode, mode)
+
+@app.post("/set_led")
+def set_led(request: dict = Body(...)):
+    led = request.get('led', '').upper()
+    state = request.get('state', False)
+
+    if led not in ADDITIONAL_LED_PINS and not fade_engine.has_channel(led):
+        api_log.error(f"Invalid LED name attempted: {led}")
+        return JSONResponse(status_code=400, content={"error": "Invalid LED name"})
+    return submit_command(apply_set_led, led, state)
+
+@app.post("/leds")
+def set_leds(request: LedBatchRequest):
+    """Apply many LED commands in one monitoring loop pass, all or nothing."""
+    commands, error = led_commands(request.commands)
+    if error is not None:
+        return error
+    return submit_command(apply_led_batch, commands)
+
+@app.get("/scenes")
+def get_scenes():
+    return {"scenes": scene_store.all()}
+
+@app.put("/scenes/{name}")
+def put_scene(name: str, request: LedBatchRequest):
+    """Save the commands as scene name, replacing any scene of that name."""
+    commands, error = led_commands(request.commands)
+    if error is not None:
+        return error
+    scene = [{"channel": channel, "duty": duty, "fade_time": fade_time} for channel, duty, fade_time in commands]
+    replaced = scene_store.put(name, scene)
+    api_log.info(f"Scene {name} {'replaced' if replaced else 'saved'} with {len(scene)} commands.")
+    return {"name": name, "commands": scene}
+
+@app.delete("/scenes/{name}")
+def delete_scene(name: str):
+    try:
+        scene_store.delete(name)
+    except KeyError:
+        return JSONResponse(status_code=404, content={"error": f"Unknown scene: {name}"})
+    api_log.info(f"Scene {name} deleted.")
+    return {"message": f"Scene {name} deleted"}
+
+@app.post("/scenes/{name}/apply")
+def apply_scene(name: str):
+    """Apply a saved scene like a POST /leds of its commands."""
+    try:
+        scene = scene_store.get(name)
+    except KeyError:
+        return JSONResponse(status_code=404, content={"error": f"Unknown scene: {name}"})
+    # Validated again: scenes.json may have been edited, or name a channel
+    # that no longer exists, since the scene was saved
+    try:
+        stored = [LedCommand(**command) for command in scene]
+    except (TypeError, ValidationError) as e:
+        api_log.error(f"Scene {name} holds an invalid command: {e}")
+        return JSONResponse(status_code=400, content={"error": f"Scene {name} holds an invalid command."})
+    commands, error = led_commands(stored)
+    if error is not None:
+        return error
+    return submit_command(apply_led_batch, commands)
+
+@app.get("/feedback")
+def get_feedback():
+    """Per-channel feedback samples and definite mismatches (wrong level at 0% or 100%)."""
+    return {"channels": feedback_monitor.counters()}
+
+@app.get("/log_levels")
+def get_log_levels():
+    return {"levels": async_logging.get_levels(), "dropped_records": async_logging.dropped_records()}
+
+@app.post("/log_levels")
+def set_log_level(request: LogLevelRequest):
+    try:
+        async_logging.set_level(request.subsystem, request.level)
+    except ValueError as e:
+        api_log.error(f"Invalid log level change attempted: {e}")
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    api_log.info(f"Log level for {request.subsystem} set to {request.level.upper()}.")
+    return {"levels": async_logging.get_levels()}
+
+@app.get("/metrics")
+def get_metrics():
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/")
 def read_root():
     return {"message": "Backend server is running."}
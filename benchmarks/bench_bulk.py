@@ -0,0 +1,126 @@
+"""Setting many LEDs: one /set_led per LED vs one /leds or scene call.
+
+Starts the backend on simulated hardware (uvicorn backend:app) and times,
+over --rounds rounds, switching the PWM channels on and off:
+
+  set_led  one POST /set_led per channel, back to back on one connection
+  leds     one POST /leds carrying a command per channel
+  scene    one POST /scenes/{name}/apply of a saved scene
+
+The simulation has five PWM channels. --repeat N sends N /set_led calls
+per channel and round, to see how the per-request cost adds up for a
+street of N * 5 lights (a batch names each channel once, so /leds and the
+scene stay at five commands).
+
+    python benchmarks/bench_bulk.py --rounds 50 --repeat 4
+"""
+
+import argparse
+import http.client
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+CHANNELS = ("PIR", "IR", "TCS", "LED1", "LED3")
+
+
+def call(conn, method, path, body=None):
+    headers = {"Content-Type": "application/json"} if body is not None else {}
+    conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+    response = conn.getresponse()
+    payload = response.read()
+    if response.status != 200:
+        raise RuntimeError(f"{method} {path} answered {response.status}: {payload.decode()}")
+    return payload
+
+
+def start_server(port, workdir):
+    env = dict(os.environ, STREETLIGHT_HARDWARE="sim", PYTHONPATH=REPO_ROOT)
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "--port", str(port), "backend:app"],
+                               cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+            call(conn, "GET", "/status")
+            return process, conn
+        except OSError:
+            if time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError(f"backend did not come up on port {port}")
+            time.sleep(0.2)
+
+
+def time_rounds(rounds, send):
+    """Milliseconds per round of send(state), alternating on and off."""
+    samples = []
+    for idx in range(rounds):
+        start = time.perf_counter()
+        send(idx % 2 == 0)
+        samples.append((time.perf_counter() - start) * 1e3)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=50, help="on/off switches per method")
+    parser.add_argument("--repeat", type=int, default=1, help="/set_led calls per channel and round")
+    parser.add_argument("--port", type=int, default=8791)
+    parser.add_argument("--report", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_bulk_") as workdir:
+        process, conn = start_server(args.port, workdir)
+        try:
+            def set_led(state):
+                for _ in range(args.repeat):
+                    for channel in CHANNELS:
+                        call(conn, "POST", "/set_led", {"led": channel, "state": state})
+
+            def leds(state):
+                call(conn, "POST", "/leds", {"commands": [
+                    {"channel": channel, "duty": 100 if state else 0, "fade_time": 0} for channel in CHANNELS]})
+
+            for name, duty in (("on", 100), ("off", 0)):
+                call(conn, "PUT", f"/scenes/bench_{name}", {"commands": [
+                    {"channel": channel, "duty": duty, "fade_time": 0} for channel in CHANNELS]})
+
+            def scene(state):
+                call(conn, "POST", f"/scenes/bench_{'on' if state else 'off'}/apply")
+
+            results = {}
+            for method, send in (("set_led", set_led), ("leds", leds), ("scene", scene)):
+                samples = time_rounds(args.rounds, send)
+                requests = len(CHANNELS) * args.repeat if method == "set_led" else 1
+                results[method] = {
+                    "requests_per_round": requests,
+                    "round_ms_median": statistics.median(samples),
+                    "round_ms_max": max(samples),
+                    "per_request_ms": statistics.median(samples) / requests,
+                }
+        finally:
+            conn.close()
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    print(f"{'method':>8} {'requests':>9} {'round':>9} {'max':>9} {'per req':>9}")
+    for method, result in results.items():
+        print(f"{method:>8} {result['requests_per_round']:>9} {result['round_ms_median']:>7.2f}ms "
+              f"{result['round_ms_max']:>7.2f}ms {result['per_request_ms']:>7.2f}ms")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"parameters": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Compare scalar and batched dimming computation across many poles.
+
+For each fleet size, random ambient readings (spanning night, moderate and
+day) and motion flags are pushed through dimming.compute_targets() one pole
+at a time and through dimming.compute_targets_batch() in one call. Results
+are checked to agree before timing.
+
+    python benchmarks/bench_dimming.py --sizes 1000 10000 100000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import dimming  # noqa: E402
+
+
+def scalar_pass(clear_values, motion_flags):
+    compute = dimming.compute_targets
+    return [compute(clear, motion) for clear, motion in zip(clear_values, motion_flags)]
+
+
+def best_of(repeats, func, *args):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def check(scalar, batch):
+    light, tcs_duty, street_duty = batch
+    for idx, (s_light, s_tcs, s_street) in enumerate(scalar):
+        if (s_light != light[idx] or abs(s_tcs - tcs_duty[idx]) > 1e-9
+                or abs(s_street - street_duty[idx]) > 1e-9):
+            raise AssertionError(f"pole {idx}: scalar {scalar[idx]} != batch "
+                                 f"{(light[idx], tcs_duty[idx], street_duty[idx])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"batch implementation: {'numpy ' + dimming.np.__version__ if dimming.np is not None else 'array loops'}")
+    print(f"{'poles':>8} {'scalar ms':>10} {'batch ms':>10} {'speedup':>8} {'ns/pole':>8}")
+    for size in args.sizes:
+        clear_values = [rng.uniform(0, 1.5 * dimming.HIGH_LIGHT_THRESHOLD) for _ in range(size)]
+        motion_flags = [rng.random() < 0.3 for _ in range(size)]
+        if dimming.np is not None:
+            batch_inputs = (dimming.np.asarray(clear_values), dimming.np.asarray(motion_flags))
+        else:
+            batch_inputs = (clear_values, motion_flags)
+
+        check(scalar_pass(clear_values, motion_flags), dimming.compute_targets_batch(*batch_inputs))
+        scalar = best_of(args.repeats, scalar_pass, clear_values, motion_flags)
+        batch = best_of(args.repeats, dimming.compute_targets_batch, *batch_inputs)
+        print(f"{size:>8} {scalar * 1e3:>10.2f} {batch * 1e3:>10.2f} {scalar / batch:>7.1f}x {batch / size * 1e9:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
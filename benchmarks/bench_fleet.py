@@ -0,0 +1,284 @@
+"""Fleet load simulator: how many luminaires can one backend drive?
+
+Runs the real control logic from backend.py (control_iteration() plus the
+fade scheduler's ticks) on the simulated hardware, with N extra luminaire
+channels registered next to LED1 and LED3. One backend owns one sensor head,
+so every simulated pole follows the same motion and ambient-light trace.
+
+Time is virtual: the backend's clock is replaced, each loop iteration
+advances it by LOOP_INTERVAL and the fade ticks for that interval run
+straight after, so an hour of operation takes seconds. Each fleet size runs
+in a fresh process (the backend is a module-level singleton) and the results
+are written as JSON for comparison between releases:
+
+    python benchmarks/bench_fleet.py --poles 10 100 1000 --report fleet_report.json
+
+Traces are synthetic by default: ambient light follows a cosine day/night
+cycle of --day-length seconds and motion arrives as a Poisson process of
+--motion-rate events per minute, each holding the PIR output high for
+--motion-hold seconds; --light-noise adds Gaussian noise (a fraction of the
+reading) to every ambient sample. --trace replays a CSV file instead, with a header
+and rows of "time,clear,pir[,ir]" (seconds from the start, raw clear count,
+0/1 levels), each row holding until the next one.
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, REPO_ROOT)
+
+REPORT_SCHEMA = 1
+
+# Clear counts the synthetic ambient cycle swings between
+NIGHT_CLEAR = 200
+NOON_CLEAR = 20000
+
+# Loop iterations run before measuring, so every channel has settled history
+WARMUP_ITERATIONS = 5
+
+
+class SyntheticTrace:
+    """Cosine day/night ambient light and Poisson motion, reproducible from seed."""
+
+    def __init__(self, duration, day_length, motion_rate, motion_hold, seed, light_noise=0.0):
+        self.day_length = day_length
+        self.light_noise = light_noise
+        rng = random.Random(seed)
+        self._noise_rng = random.Random(seed + 1)
+        # Motion intervals as (start, end), generated up front
+        self.motion = []
+        t = 0.0
+        while motion_rate > 0:
+            t += rng.expovariate(motion_rate / 60.0)
+            if t >= duration:
+                break
+            self.motion.append((t, t + motion_hold))
+        self._next_motion = 0
+
+    def at(self, t):
+        """Return (clear, pir level, ir level) at time t. t must not decrease between calls."""
+        # Starts at midnight: 0.5 - 0.5 cos goes 0 -> 1 (noon) -> 0
+        phase = 0.5 - 0.5 * math.cos(2 * math.pi * t / self.day_length)
+        clear = NIGHT_CLEAR + (NOON_CLEAR - NIGHT_CLEAR) * phase
+        if self.light_noise:
+            clear *= 1 + self._noise_rng.gauss(0, self.light_noise)
+        clear = max(0, int(clear))
+        while self._next_motion < len(self.motion) and self.motion[self._next_motion][1] <= t:
+            self._next_motion += 1
+        pir = self._next_motion < len(self.motion) and self.motion[self._next_motion][0] <= t
+        return clear, 1 if pir else 0, 1  # IR idles HIGH (no object)
+
+
+class CsvTrace:
+    """Step-wise trace read from a time,clear,pir[,ir] CSV file."""
+
+    def __init__(self, path):
+        self.rows = []
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                self.rows.append((float(row["time"]), int(float(row["clear"])), int(row["pir"]),
+                                  int(row.get("ir") or 1)))
+        if not self.rows:
+            raise ValueError(f"{path} has no trace rows")
+        self.rows.sort()
+        self._idx = 0
+
+    def at(self, t):
+        rows = self.rows
+        while self._idx + 1 < len(rows) and rows[self._idx + 1][0] <= t:
+            self._idx += 1
+        return rows[self._idx][1:]
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_fleet(args, poles):
+    """Simulate one fleet size in this process and return its result dict."""
+    # backend.log and faults.db land in a scratch directory
+    os.chdir(tempfile.mkdtemp(prefix="bench_fleet_"))
+    os.environ["STREETLIGHT_HARDWARE"] = "sim"
+    import async_logging
+    import backend
+    from feedback import FEEDBACK_FAULT_BITS
+
+    for subsystem in async_logging.LOG_SUBSYSTEMS:
+        async_logging.set_level(subsystem, "WARNING")
+
+    virtual_now = [0.0]
+    backend.clock = lambda: virtual_now[0]
+
+    gpio, bus = backend.GPIO, backend.bus
+    backend.fault_store.start()
+    backend.initialize_gpio()
+    backend.initialize_tcs34725()
+    gpio.set_input(backend.IR_PIN, 1)
+
+    trace = CsvTrace(args.trace) if args.trace else SyntheticTrace(
+        args.duration, args.day_length, args.motion_rate, args.motion_hold, args.seed, args.light_noise)
+    ticks_per_iteration = max(1, round(backend.LOOP_INTERVAL / backend.DIM_DELAY))
+    # TCS34725 integration cycles completed per iteration, for its interrupt persistence filter
+    cycles_per_iteration = max(1, round(backend.LOOP_INTERVAL / backend.TCS_INTEGRATION_TIME))
+    iterations = int(args.duration / backend.LOOP_INTERVAL)
+
+    def step(t):
+        virtual_now[0] = t
+        clear, pir, ir = trace.at(t)
+        if backend.tcs_sim is not None:
+            backend.tcs_sim.set_clear(clear, cycles_per_iteration)
+        else:
+            bus.set_word(backend.TCS34725_ADDRESS, backend.CDATAL, clear)
+        gpio.set_input(backend.PIR_PIN, pir)
+        gpio.set_input(backend.IR_PIN, ir)
+        start = time.perf_counter()
+        backend.control_iteration()
+        loop_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for tick in range(ticks_per_iteration):
+            virtual_now[0] = t + tick * backend.DIM_DELAY
+            backend.fade_engine.tick()
+        return loop_time, time.perf_counter() - start
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for idx in range(poles):
+        name = f"POLE{idx:05d}"
+        pwm = gpio.PWM(1000 + idx, 1000)
+        pwm.start(0)
+        backend.additional_pwms[name] = pwm
+        backend.fade_engine.add_channel(name, pwm)
+        # Working LED: its detection pin follows the PWM output
+        detection_pin = 1000 + poles + idx
+        gpio.setup(detection_pin, gpio.IN)
+        gpio.connect(1000 + idx, detection_pin)
+        backend.feedback_monitor.add(name, detection_pin)
+    # Warm up so history buffers and status entries exist for every pole
+    t = 0.0
+    for _ in range(WARMUP_ITERATIONS):
+        step(t)
+        t += backend.LOOP_INTERVAL
+    memory_per_pole = (tracemalloc.get_traced_memory()[0] - baseline) / poles if poles else 0.0
+    tracemalloc.stop()
+
+    loop_times, fade_times = [], []
+    i2c_start = bus.transactions
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    for _ in range(iterations):
+        loop_time, fade_time = step(t)
+        loop_times.append(loop_time)
+        fade_times.append(fade_time)
+        t += backend.LOOP_INTERVAL
+    cpu = time.process_time() - cpu_start
+    i2c_transactions = bus.transactions - i2c_start
+    wall = time.perf_counter() - wall_start
+    backend.fault_store.stop()
+
+    loop_times.sort()
+    fade_times.sort()
+    simulated = iterations * backend.LOOP_INTERVAL
+    channels = len(backend.fade_engine.duties())
+    return {
+        "poles": poles,
+        "channels": channels,
+        "iterations": iterations,
+        "simulated_seconds": simulated,
+        "wall_seconds": wall,
+        "speedup": simulated / wall if wall else None,
+        "loop_p50_us": percentile(loop_times, 0.50) * 1e6,
+        "loop_p99_us": percentile(loop_times, 0.99) * 1e6,
+        "loop_max_us": loop_times[-1] * 1e6,
+        "fade_interval_p50_us": percentile(fade_times, 0.50) * 1e6,
+        "fade_interval_p99_us": percentile(fade_times, 0.99) * 1e6,
+        # CPU seconds per simulated second, i.e. the share of one core each pole needs
+        "cpu_per_pole_percent": cpu / simulated / poles * 100 if poles else None,
+        "cpu_total_percent": cpu / simulated * 100,
+        "memory_per_pole_bytes": memory_per_pole,
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "pwm_writes": sum(pwm.write_count for pwm in gpio.pwms.values()),
+        "pwm_writes_suppressed": backend.fade_engine.writes_suppressed,
+        "i2c_transactions": i2c_transactions,
+        "actuations_suppressed": {reason: child.value for (reason,), child
+                                  in backend.actuations_suppressed._children.items()},
+        # Working LEDs on loopback: anything but 0 is a false feedback fault
+        "feedback_faults": len(backend.fleet.faulted(FEEDBACK_FAULT_BITS)),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--poles", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--duration", type=float, default=3600, help="simulated seconds per run")
+    parser.add_argument("--day-length", type=float, default=3600, help="seconds per synthetic day/night cycle")
+    parser.add_argument("--motion-rate", type=float, default=2.0, help="synthetic motion events per minute")
+    parser.add_argument("--motion-hold", type=float, default=3.0, help="seconds each motion event lasts")
+    parser.add_argument("--light-noise", type=float, default=0.0,
+                        help="relative standard deviation of synthetic ambient light noise")
+    parser.add_argument("--trace", help="CSV trace (time,clear,pir[,ir]) to replay instead")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", default="fleet_report.json")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.trace:
+        args.trace = os.path.abspath(args.trace)
+
+    if args.child:
+        # One fleet size; the parent reads the result from the last stdout line
+        print(json.dumps(run_fleet(args, args.poles[0])))
+        return
+
+    parameters = {key: value for key, value in vars(args).items() if key not in ("poles", "report", "child")}
+    results = []
+    print(f"{'poles':>6} {'loop p50':>10} {'loop p99':>10} {'fade p99':>10} {'cpu/pole':>9} "
+          f"{'mem/pole':>9} {'speedup':>8}")
+    for poles in args.poles:
+        command = [sys.executable, os.path.abspath(__file__), "--child", "--poles", str(poles)]
+        for key, value in parameters.items():
+            if value is not None:
+                command += [f"--{key.replace('_', '-')}", str(value)]
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{poles:>6} {result['loop_p50_us']:>8.0f}us {result['loop_p99_us']:>8.0f}us "
+              f"{result['fade_interval_p99_us']:>8.0f}us {result['cpu_per_pole_percent']:>8.4f}% "
+              f"{result['memory_per_pole_bytes'] / 1024:>7.1f}KB {result['speedup']:>7.0f}x")
+
+    report = {
+        "schema": REPORT_SCHEMA,
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "parameters": parameters,
+        "results": results,
+    }
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Measure how much control-loop latency the queue-backed logger saves.
+
+Each simulated loop iteration emits the records a fault-mode tick produces
+(a handful of info/warning lines plus per-step debug lines) and the time
+spent inside the logging calls is recorded. The same workload runs against
+a synchronous FileHandler (the old logging.basicConfig setup) and against
+async_logging's queue pipeline.
+
+    python benchmarks/bench_logging.py --iterations 2000 --interval 0.005 --fsync
+
+--fsync flushes every synchronous write to disk, which approximates the
+stalls seen on an SD card.
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import async_logging  # noqa: E402
+
+# Records emitted per simulated loop iteration
+RECORDS_PER_ITERATION = 24
+
+
+class FsyncFileHandler(logging.FileHandler):
+    def emit(self, record):
+        super().emit(record)
+        self.flush()
+        os.fsync(self.stream.fileno())
+
+
+def run_iterations(logger, iterations, interval):
+    timings = []
+    for i in range(iterations):
+        # Idle between iterations like the monitoring loop does between ticks
+        time.sleep(interval)
+        start = time.perf_counter()
+        logger.warning("Simulating sensor cross-talk. Both PIR and IR sensors detected activity.",
+                       extra=async_logging.fields(mode='9'))
+        logger.info("RGBC values read from TCS34725: %s", (i, i + 1, i + 2, i + 3))
+        for step in range(RECORDS_PER_ITERATION - 2):
+            logger.debug("LED1 faded to %s%% duty cycle.", step * 5)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarize(name, timings):
+    ordered = sorted(timings)
+    p50 = ordered[len(ordered) // 2]
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(f"{name:>8}: mean {statistics.fmean(ordered) * 1e6:9.1f} us  "
+          f"p50 {p50 * 1e6:9.1f} us  p99 {p99 * 1e6:9.1f} us  max {ordered[-1] * 1e6:9.1f} us")
+    return p50, p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--interval", type=float, default=0.005, help="idle seconds between iterations")
+    parser.add_argument("--fsync", action="store_true", help="fsync every synchronous write")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Synchronous baseline: formatting and the disk write happen in the loop
+        sync_logger = logging.getLogger("bench.sync")
+        sync_logger.propagate = False
+        sync_logger.setLevel(logging.DEBUG)
+        handler_class = FsyncFileHandler if args.fsync else logging.FileHandler
+        sync_handler = handler_class(os.path.join(tmp, "sync.log"))
+        sync_handler.setFormatter(async_logging.StructuredFormatter(async_logging.LOG_FORMAT))
+        sync_logger.addHandler(sync_handler)
+        sync_timings = run_iterations(sync_logger, args.iterations, args.interval)
+        sync_handler.close()
+
+        # Queue pipeline: the loop only enqueues records
+        async_logging.setup_logging(filename=os.path.join(tmp, "async.log"), level=logging.DEBUG, console=False)
+        if args.fsync:
+            for handler in async_logging._listener.handlers:
+                handler.__class__ = FsyncFileHandler
+        async_timings = run_iterations(async_logging.get_logger("control"), args.iterations, args.interval)
+        dropped = async_logging.dropped_records()
+        drain_start = time.perf_counter()
+        async_logging.stop_logging()
+        drain = time.perf_counter() - drain_start
+
+    print(f"{args.iterations} iterations x {RECORDS_PER_ITERATION} records, fsync={'on' if args.fsync else 'off'}")
+    sync_p50, sync_p99 = summarize("sync", sync_timings)
+    async_p50, async_p99 = summarize("queued", async_timings)
+    print(f"loop latency saved: p50 {(sync_p50 - async_p50) * 1e6:.1f} us, p99 {(sync_p99 - async_p99) * 1e6:.1f} us "
+          f"per iteration (writer drained backlog in {drain * 1e3:.1f} ms, dropped {dropped})")
+
+
+if __name__ == "__main__":
+    main()
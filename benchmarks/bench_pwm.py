@@ -0,0 +1,215 @@
+"""Compare the CPU cost and timing jitter of the PWM output backends.
+
+For each output backend, the channels are started at distinct duty cycles
+between 20% and 80% (or at --duties) and left alone for --idle seconds. This measures the CPU
+the process spends while nothing changes, i.e. the software PWM timing
+threads. A fixed piece of pure-Python work is then timed against its time
+with no PWM running: the slowdown is what the timing threads cost the
+monitoring loop and API handlers, which share the GIL with them. Finally
+--writes duty cycle changes are issued round-robin across the channels, to
+measure CPU per ChangeDutyCycle call:
+
+    soft          RPi.GPIO's GPIO.PWM, a C thread per channel (only on a
+                  Raspberry Pi); the reference the engine has to beat
+    engine        soft_pwm.SoftPWMEngine, every pin from one thread
+    engine-each   one SoftPWMEngine per pin, i.e. a Python timing thread
+                  per channel
+    sysfs         hardware.SysfsPWM, period/duty_cycle/enable kept open
+    sysfs-reopen  the same writes, opening and closing duty_cycle each time
+
+When both ran, the engine's idle CPU and slowdown are also given relative to
+soft. The engine backends also report the 99th percentile edge lateness while idle,
+i.e. how long after its deadline a pin write landed. The sleep overshoot
+printed first is what SoftPWMEngine sizes its edge merge window from. Off a
+Pi they write the simulated GPIO's pin table; on a Pi they write the
+GPSET/GPCLR registers. Without --root the
+sysfs backends run against a fake /sys/class/pwm tree in a temporary
+directory, which measures the syscall overhead but not the kernel driver. On
+a Pi, pass --root /sys/class/pwm with the pwm-2chan overlay loaded and
+--channels matching it:
+
+    python benchmarks/bench_pwm.py --root /sys/class/pwm --channels 0:0 0:1
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import hardware  # noqa: E402
+from soft_pwm import EDGE_MERGE_MAX_FRACTION, EDGE_MERGE_WINDOW, SoftPWMEngine, sleep_overshoot  # noqa: E402
+
+FREQUENCY = 1000
+
+# Iterations of the foreground workload timed for the GIL slowdown
+FOREGROUND_ITERATIONS = 2000000
+
+
+class ReopeningSysfsPWM(hardware.SysfsPWM):
+    """SysfsPWM that opens duty_cycle for every write, as a write-through helper would."""
+
+    def ChangeDutyCycle(self, duty_cycle):
+        if not 0 <= duty_cycle <= 100:
+            raise ValueError("dutycycle must have a value from 0.0 to 100.0")
+        self.duty_cycle = duty_cycle
+        with open(os.path.join(self.path, "duty_cycle"), "w") as f:
+            f.write("%d\n" % round(self.period_ns * duty_cycle / 100))
+        self.write_count += 1
+
+
+def foreground():
+    """Wall seconds for a fixed pure-Python workload, best of three."""
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        total = 0
+        for i in range(FOREGROUND_ITERATIONS):
+            total += i * i % 7
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def measure(pwms, idle, writes, baseline, duties=None):
+    for idx, pwm in enumerate(pwms):
+        pwm.start(duties[idx % len(duties)] if duties else 20 + 60 * idx / len(pwms))
+    wall, cpu = time.perf_counter(), time.process_time()
+    time.sleep(idle)
+    idle_percent = 100 * (time.process_time() - cpu) / (time.perf_counter() - wall)
+    # Lateness while idle; the loops below hold the GIL and would dominate it
+    late = lateness_p99(pwms)
+    slowdown = foreground() / baseline
+
+    cpu = time.process_time()
+    for i in range(writes):
+        # Alternate between two values so no write is a repeat
+        pwms[i % len(pwms)].ChangeDutyCycle(25 if (i // len(pwms)) % 2 else 75)
+    write_us = (time.process_time() - cpu) / writes * 1e6
+    for pwm in pwms:
+        pwm.stop()
+    return idle_percent, write_us, late, slowdown
+
+
+def rpi_gpio():
+    try:
+        import RPi.GPIO as GPIO
+    except (ImportError, RuntimeError):
+        return None
+    return GPIO
+
+
+def setup_pins(gpio, pins):
+    gpio.setmode(gpio.BCM)
+    gpio.setwarnings(False)
+    for pin in pins:
+        gpio.setup(pin, gpio.OUT)
+
+
+def soft_pwms(pins):
+    GPIO = rpi_gpio()
+    if GPIO is None:
+        return None, None
+    setup_pins(GPIO, pins)
+    return [GPIO.PWM(pin, FREQUENCY) for pin in pins], GPIO.cleanup
+
+
+def engine_pwms(pins, engines):
+    """PWM channels for pins on one shared SoftPWMEngine, or on one engine each."""
+    GPIO = rpi_gpio()
+    if GPIO is None:
+        gpio, name = hardware.SimulatedGPIO(), "sim"
+    else:
+        gpio, name = GPIO, "pi"
+    setup_pins(gpio, pins)
+    write_pins = hardware.load_pin_writer(gpio, name)
+    shared = SoftPWMEngine(write_pins, FREQUENCY)
+    pwms = [(SoftPWMEngine(write_pins, FREQUENCY) if engines == "each" else shared).channel(pin)
+            for pin in pins]
+
+    def close():
+        for engine in {pwm.engine for pwm in pwms}:
+            engine.stop()
+        gpio.cleanup()
+    return pwms, close
+
+
+def lateness_p99(pwms):
+    engines = {pwm.engine for pwm in pwms if hasattr(pwm, "engine")}
+    if not engines:
+        return None
+    ordered = sorted(sample for engine in engines for sample in engine.lateness.copy())
+    return ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))] * 1e6 if ordered else 0.0
+
+
+def sysfs_pwms(cls, channels, root):
+    pwms = [cls(chip, channel, FREQUENCY, root) for chip, channel in channels]
+
+    def close():
+        for pwm in pwms:
+            pwm.close()
+    return pwms, close
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--channels", nargs="+", default=["0:0", "0:1"],
+                        help="kernel PWM channels as chip:channel")
+    parser.add_argument("--soft-pins", type=int, nargs="+", default=[18, 22, 26, 5, 13],
+                        help="BCM pins for the software PWM and engine runs")
+    parser.add_argument("--root", help="kernel PWM class directory (default: a fake tree)")
+    parser.add_argument("--duties", type=float, nargs="+",
+                        help="idle duty cycles, one per channel (default: spread over 20-80%%)")
+    parser.add_argument("--idle", type=float, default=5.0, help="idle seconds per backend")
+    parser.add_argument("--writes", type=int, default=20000)
+    args = parser.parse_args()
+
+    channels = [tuple(int(part) for part in spec.split(":")) for spec in args.channels]
+    root = args.root
+    if root is None:
+        root = hardware.create_fake_sysfs_pwm(tempfile.mkdtemp(prefix="sysfs_pwm_"), channels)
+    try:
+        backends = (
+            ("soft", lambda: soft_pwms(args.soft_pins)),
+            ("engine", lambda: engine_pwms(args.soft_pins, "shared")),
+            ("engine-each", lambda: engine_pwms(args.soft_pins, "each")),
+            ("sysfs", lambda: sysfs_pwms(hardware.SysfsPWM, channels, root)),
+            ("sysfs-reopen", lambda: sysfs_pwms(ReopeningSysfsPWM, channels, root)),
+        )
+        print(f"sysfs root: {root}{'' if args.root else ' (fake)'}")
+        overshoot = sleep_overshoot()
+        window = min(max(EDGE_MERGE_WINDOW, overshoot), EDGE_MERGE_MAX_FRACTION / FREQUENCY)
+        print(f"sleep overshoot p90: {overshoot * 1e6:.0f}us (engine merge window {window * 1e6:.0f}us at {FREQUENCY} Hz)")
+        baseline = foreground()
+        print(f"{'backend':>13} {'channels':>9} {'idle CPU':>9} {'us/write':>9} {'p99 late':>9} {'slowdown':>9}")
+        results = {}
+        for name, create in backends:
+            pwms, close = create()
+            if pwms is None:
+                print(f"{name:>13} {'skipped (RPi.GPIO not available)':>30}")
+                continue
+            try:
+                idle_percent, write_us, late, slowdown = measure(pwms, args.idle, args.writes, baseline,
+                                                                 args.duties)
+            finally:
+                close()
+            results[name] = (idle_percent, slowdown)
+            late = "n/a" if late is None else f"{late:.0f}us"
+            print(f"{name:>13} {len(pwms):>9} {idle_percent:>8.2f}% {write_us:>9.2f} {late:>9} "
+                  f"{slowdown:>8.2f}x")
+        if "soft" in results:
+            (soft_cpu, soft_slowdown), (engine_cpu, engine_slowdown) = results["soft"], results["engine"]
+            print(f"engine vs GPIO.PWM: {engine_cpu / soft_cpu if soft_cpu else float('inf'):.2f}x idle CPU, "
+                  f"{engine_slowdown / soft_slowdown:.2f}x foreground slowdown")
+        else:
+            print("engine vs GPIO.PWM: not measured (needs RPi.GPIO on a Pi)")
+    finally:
+        if args.root is None:
+            shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
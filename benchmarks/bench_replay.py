@@ -0,0 +1,275 @@
+"""Replay a sensor trace through the control logic, up to 1000x real time.
+
+A trace (sensor_trace.py, recorded with STREETLIGHT_TRACE=<file>) holds
+every input the monitoring loop acted on. This script feeds one back through
+control_iteration() on simulated hardware. Time is virtual, as in
+bench_fleet.py: each record sets the clock to its time, the PIR/IR/LED2
+detection pins and the simulated TCS34725 to its readings, and the fault
+mode to its mode; the fade ticks due before the next record run straight
+after. --speed caps the replay at that multiple of real time (0: as fast as
+it goes).
+
+Every iteration's decisions (fade targets, duty cycles, LED2, light class,
+fault flags) are hashed into a digest. The same trace replays to the same
+digest, so it is a regression check for dimming and fault handling:
+
+    python benchmarks/bench_replay.py field.trace --expect 3f2a...
+
+--record makes a trace instead: it runs the control logic on bench_fleet.py's
+synthetic day/night and motion trace (optionally switching fault modes at
+the times given with --fault-modes), with the recorder on, and reports the
+cost of a record next to that of an iteration. Replaying the result gives
+the digest the recording run printed; --verify checks that straight away.
+Field traces are noisy, so check with --light-noise too:
+
+    python benchmarks/bench_replay.py run.trace --record --duration 86400 --fault-modes 3600:7 7200:1
+    python benchmarks/bench_replay.py run.trace --speed 1000
+    python benchmarks/bench_replay.py noisy.trace --record --duration 7200 --light-noise 0.05 --verify
+
+The sensor is only read, and the simulated TCS34725 only set, on records
+flagged TRACE_SENSOR_READ, as in the recording.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, REPO_ROOT)
+
+from bench_fleet import SyntheticTrace, percentile  # noqa: E402
+
+# Records appended when timing the recorder on its own
+RECORD_TIMING_RECORDS = 100000
+
+
+def load_backend(seed):
+    """Import the backend on simulated hardware with a virtual clock. Returns (backend, clock cell)."""
+    # backend.log, faults.db and scenes.json land in a scratch directory
+    os.chdir(tempfile.mkdtemp(prefix="bench_replay_"))
+    os.environ["STREETLIGHT_HARDWARE"] = "sim"
+    os.environ.pop("STREETLIGHT_TRACE", None)
+    import async_logging
+    import backend
+
+    for subsystem in async_logging.LOG_SUBSYSTEMS:
+        async_logging.set_level(subsystem, "WARNING")
+    virtual_now = [0.0]
+    backend.clock = lambda: virtual_now[0]
+    # The power issues fault flickers at random
+    random.seed(seed)
+    backend.fault_store.start()
+    backend.initialize_gpio()
+    backend.initialize_tcs34725()
+    return backend, virtual_now
+
+
+class DecisionDigest:
+    """SHA-256 over the control decisions of every iteration, plus iteration timings."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hash = hashlib.sha256()
+        self.loop_times = []
+
+    def iterate(self):
+        backend = self.backend
+        start = time.perf_counter()
+        backend.control_iteration()
+        self.loop_times.append(time.perf_counter() - start)
+        fleet = backend.fleet
+        self.hash.update(fleet.target.tobytes())
+        self.hash.update(fleet.duty.tobytes())
+        self.hash.update(repr((backend.fault_mode, backend.light_class,
+                               sorted(key for key, active in backend.control_state.faults.items() if active))
+                              ).encode())
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+
+def set_clear(backend, clear, cycles):
+    """Have the simulated TCS34725 read clear, through its interrupt model if INT is wired."""
+    if backend.tcs_sim is not None:
+        backend.tcs_sim.set_clear(clear, cycles)
+    else:
+        backend.bus.set_word(backend.TCS34725_ADDRESS, backend.CDATAL, clear)
+
+
+def fade_until(backend, virtual_now, t, until):
+    """Run the fade ticks the monitoring loop would between clock() times t and until."""
+    while backend.fade_engine.active_count() and t < until:
+        virtual_now[0] = t
+        backend.fade_engine.tick()
+        t += backend.DIM_DELAY
+
+
+def record(args):
+    """Run the control logic on a synthetic trace with the recorder on."""
+    from sensor_trace import TraceRecorder
+
+    if os.path.exists(args.trace):
+        os.unlink(args.trace)
+    backend, virtual_now = load_backend(args.seed)
+    gpio = backend.GPIO
+    backend.sensor_trace = TraceRecorder(args.trace)
+    synthetic = SyntheticTrace(args.duration, args.day_length, args.motion_rate, args.motion_hold, args.seed,
+                               args.light_noise)
+    fault_modes = sorted((float(at), mode) for at, mode in (entry.split(":") for entry in args.fault_modes))
+    cycles_per_iteration = max(1, round(backend.LOOP_INTERVAL / backend.TCS_INTEGRATION_TIME))
+    digest = DecisionDigest(backend)
+
+    wall_start = time.perf_counter()
+    t = 0.0
+    while t < args.duration:
+        virtual_now[0] = t
+        while fault_modes and fault_modes[0][0] <= t:
+            # As POST /set_fault_mode would, ahead of the iteration
+            backend.apply_fault_mode(fault_modes.pop(0)[1])
+        clear, pir, ir = synthetic.at(t)
+        set_clear(backend, clear, cycles_per_iteration)
+        gpio.set_input(backend.PIR_PIN, pir)
+        gpio.set_input(backend.IR_PIN, ir)
+        digest.iterate()
+        fade_until(backend, virtual_now, t, t + backend.LOOP_INTERVAL)
+        t += backend.LOOP_INTERVAL
+    wall = time.perf_counter() - wall_start
+    records = backend.sensor_trace.count
+    backend.sensor_trace.close()
+    backend.fault_store.stop()
+
+    # The recorder on its own, appending to a scratch trace
+    scratch = TraceRecorder(os.path.join(os.getcwd(), "timing.trace"))
+    record_seconds = timeit.timeit(lambda: scratch.record(1.0, 2.0, 3.0, 400, 5, 1), number=RECORD_TIMING_RECORDS)
+    scratch.close()
+    loop_times = sorted(digest.loop_times)
+    return {
+        "mode": "record",
+        "records": records,
+        "trace_bytes": os.path.getsize(args.trace),
+        "simulated_seconds": args.duration,
+        "wall_seconds": wall,
+        "speed": args.duration / wall,
+        "loop_p50_us": percentile(loop_times, 0.50) * 1e6,
+        "loop_p99_us": percentile(loop_times, 0.99) * 1e6,
+        "record_us": record_seconds / RECORD_TIMING_RECORDS * 1e6,
+        "digest": digest.hexdigest(),
+    }
+
+
+def replay(args):
+    """Feed a recorded trace back through the control logic."""
+    from sensor_trace import TRACE_IR, TRACE_LED2, TRACE_PIR, TRACE_SENSOR_READ, read_trace
+
+    records = read_trace(args.trace)
+    if not records:
+        raise SystemExit(f"{args.trace} holds no records")
+    backend, virtual_now = load_backend(args.seed)
+    gpio = backend.GPIO
+    led2_detection = backend.ADDITIONAL_LED_PINS["LED2"]["detection_gpio"]
+    # LED2's detection pin reads the recorded level instead of following the output
+    gpio.disconnect(led2_detection)
+    digest = DecisionDigest(backend)
+
+    start, wall_start = records[0].time, time.perf_counter()
+    previous = start - backend.LOOP_INTERVAL
+    for idx, rec in enumerate(records):
+        if args.speed:
+            delay = wall_start + (rec.time - start) / args.speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        virtual_now[0] = rec.time
+        mode = str(rec.mode)
+        if mode != backend.fault_mode:
+            backend.apply_fault_mode(mode)
+        sensor_read = bool(rec.flags & TRACE_SENSOR_READ)
+        if sensor_read:
+            cycles = max(1, round((rec.time - previous) / backend.TCS_INTEGRATION_TIME))
+            set_clear(backend, rec.clear, cycles)
+        gpio.set_input(backend.PIR_PIN, rec.flags & TRACE_PIR)
+        gpio.set_input(backend.IR_PIN, rec.flags & TRACE_IR)
+        gpio.set_input(led2_detection, rec.flags & TRACE_LED2)
+        # The edge callbacks above ran on this clock; the trace has the real edge times
+        backend.last_pir_detection_time = rec.pir_time
+        backend.last_ir_detection_time = rec.ir_time
+        # The sensor is read exactly when it was in the recording, whatever
+        # the simulated interrupt made of the value above
+        backend.tcs_interrupt_pending = sensor_read
+        digest.iterate()
+        until = records[idx + 1].time if idx + 1 < len(records) else rec.time + backend.LOOP_INTERVAL
+        fade_until(backend, virtual_now, rec.time, until)
+        if sensor_read:
+            previous = rec.time
+    wall = time.perf_counter() - wall_start
+    backend.fault_store.stop()
+
+    simulated = records[-1].time - start + backend.LOOP_INTERVAL
+    loop_times = sorted(digest.loop_times)
+    return {
+        "mode": "replay",
+        "records": len(records),
+        "simulated_seconds": simulated,
+        "wall_seconds": wall,
+        "speed": simulated / wall,
+        "loop_p50_us": percentile(loop_times, 0.50) * 1e6,
+        "loop_p99_us": percentile(loop_times, 0.99) * 1e6,
+        "digest": digest.hexdigest(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace", help="sensor trace file to replay (or write, with --record)")
+    parser.add_argument("--speed", type=float, default=1000, help="replay at most this many times real time (0: no cap)")
+    parser.add_argument("--expect", help="exit with status 1 unless the replay gives this digest")
+    parser.add_argument("--record", action="store_true", help="record a synthetic trace instead of replaying")
+    parser.add_argument("--duration", type=float, default=3600, help="simulated seconds to record")
+    parser.add_argument("--day-length", type=float, default=3600, help="seconds per synthetic day/night cycle")
+    parser.add_argument("--motion-rate", type=float, default=2.0, help="synthetic motion events per minute")
+    parser.add_argument("--motion-hold", type=float, default=3.0, help="seconds each motion event lasts")
+    parser.add_argument("--light-noise", type=float, default=0.0,
+                        help="relative standard deviation of synthetic ambient light noise")
+    parser.add_argument("--fault-modes", nargs="*", default=[], metavar="TIME:MODE",
+                        help="switch to fault mode MODE at simulated second TIME while recording")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verify", action="store_true",
+                        help="after --record, replay the trace in a fresh process and check the digest")
+    parser.add_argument("--report", help="also write the result to this JSON file")
+    args = parser.parse_args()
+    args.trace = os.path.abspath(args.trace)
+    if args.report:
+        args.report = os.path.abspath(args.report)
+
+    result = record(args) if args.record else replay(args)
+    print(f"{result['mode']}: {result['records']} records, {result['simulated_seconds']:.0f}s simulated "
+          f"in {result['wall_seconds']:.2f}s ({result['speed']:.0f}x), "
+          f"loop p50 {result['loop_p50_us']:.0f}us p99 {result['loop_p99_us']:.0f}us")
+    if "record_us" in result:
+        print(f"recorder: {result['record_us']:.2f}us per record, {result['trace_bytes']} bytes")
+    print(f"digest: {result['digest']}")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"parameters": vars(args), "result": result}, f, indent=2)
+    if args.expect and args.expect != result["digest"]:
+        print(f"digest mismatch: expected {args.expect}")
+        sys.exit(1)
+    if args.record and args.verify:
+        # The backend is a module-level singleton, so the replay needs its own process
+        command = [sys.executable, os.path.abspath(__file__), args.trace, "--speed", "0",
+                   "--seed", str(args.seed), "--expect", result["digest"]]
+        replayed = subprocess.run(command, capture_output=True, text=True)
+        print(replayed.stdout.strip().splitlines()[-1] if replayed.stdout.strip() else replayed.stderr.strip())
+        if replayed.returncode:
+            sys.exit(1)
+        print("verify: replay gave the recorded digest")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Light timing jitter under HTTP load: single process vs split mode.
+
+Starts the backend on simulated hardware with the software PWM engine
+(STREETLIGHT_PWM=engine), either as one process (uvicorn backend:app) or
+split (control_process.py plus --workers uvicorn api_worker:app processes
+on consecutive ports, as behind a reverse proxy; the clients are spread
+over them). Fault mode 7 is switched on so the street LEDs flicker through
+50% duty and the engine always has edges to time. The script then:
+
+  1. waits --settle seconds and reads the PWM engine's p99 edge lateness
+     from /metrics (idle baseline);
+  2. runs --clients load processes polling /status over keep-alive
+     connections for --duration seconds, and reads the lateness again just
+     before the load stops.
+
+    python benchmarks/bench_split.py --clients 4 --workers 2 --duration 10
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+LATENESS_METRIC = "streetlight_soft_pwm_edge_lateness_p99_seconds"
+OVERRUNS_METRIC = "streetlight_soft_pwm_overruns"
+
+
+def request(port, method, path, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def read_metrics(port):
+    _, body = request(port, "GET", "/metrics")
+    values = {}
+    for line in body.decode().splitlines():
+        if line.startswith((LATENESS_METRIC, OVERRUNS_METRIC)):
+            name, value = line.rsplit(" ", 1)
+            values[name] = float(value)
+    return values.get(LATENESS_METRIC, 0.0) * 1e6, values.get(OVERRUNS_METRIC, 0.0)
+
+
+def poll_status(port, duration, results):
+    """Load process: GET /status back to back on one connection, then report the count."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    count = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        conn.request("GET", "/status")
+        conn.getresponse().read()
+        count += 1
+    conn.close()
+    results.put(count)
+
+
+def start_servers(mode, port, workers, workdir):
+    env = dict(os.environ, STREETLIGHT_HARDWARE="sim", STREETLIGHT_PWM="engine",
+               STREETLIGHT_CONTROL_SOCKET=os.path.join(workdir, "control.sock"),
+               STREETLIGHT_STATUS_SEGMENT=f"streetlight_bench_{os.getpid()}",
+               PYTHONPATH=REPO_ROOT)
+    quiet = {"cwd": workdir, "env": env, "stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
+
+    def uvicorn(app, port):
+        return subprocess.Popen([sys.executable, "-m", "uvicorn", "--port", str(port), app], **quiet)
+
+    if mode == "single":
+        processes, ports = [uvicorn("backend:app", port)], [port]
+    else:
+        processes = [subprocess.Popen([sys.executable, os.path.join(REPO_ROOT, "control_process.py")], **quiet)]
+        ports = [port + idx for idx in range(workers)]
+        processes += [uvicorn("api_worker:app", worker_port) for worker_port in ports]
+    deadline = time.monotonic() + 30
+    for worker_port in ports:
+        while True:
+            try:
+                if request(worker_port, "GET", "/status")[0] == 200:
+                    break
+            except OSError:
+                pass
+            if time.monotonic() > deadline:
+                stop_servers(processes)
+                raise RuntimeError(f"{mode} backend did not come up on port {worker_port}")
+            time.sleep(0.2)
+    return processes, ports
+
+
+def stop_servers(processes):
+    # API workers first, the control process last
+    for process in reversed(processes):
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def run_mode(mode, args):
+    with tempfile.TemporaryDirectory(prefix=f"bench_split_{mode}_") as workdir:
+        processes, ports = start_servers(mode, args.port, args.workers, workdir)
+        try:
+            request(args.port, "POST", "/set_fault_mode", {"mode": "7"})
+            time.sleep(args.settle)
+            idle_p99, overruns_before = read_metrics(args.port)
+
+            results = multiprocessing.Queue()
+            clients = [multiprocessing.Process(target=poll_status,
+                                               args=(ports[idx % len(ports)], args.duration, results))
+                       for idx in range(args.clients)]
+            start = time.monotonic()
+            for client in clients:
+                client.start()
+            time.sleep(max(0.0, args.duration - 1.0))
+            loaded_p99, overruns_after = read_metrics(args.port)
+            requests = sum(results.get() for _ in clients)
+            elapsed = time.monotonic() - start
+            for client in clients:
+                client.join()
+        finally:
+            stop_servers(processes)
+    return {
+        "mode": mode,
+        "workers": 1 if mode == "single" else args.workers,
+        "status_per_second": requests / elapsed,
+        "idle_lateness_p99_us": idle_p99,
+        "loaded_lateness_p99_us": loaded_p99,
+        "overruns_under_load": overruns_after - overruns_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=("single", "split"), default=["single", "split"])
+    parser.add_argument("--workers", type=int, default=2, help="API worker processes in split mode")
+    parser.add_argument("--clients", type=int, default=4, help="load generating processes")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per mode")
+    parser.add_argument("--settle", type=float, default=3.0, help="idle seconds before the load starts")
+    parser.add_argument("--port", type=int, default=8790, help="first port to serve on")
+    parser.add_argument("--report", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'mode':>6} {'workers':>8} {'status/s':>9} {'idle p99':>9} {'load p99':>9} {'overruns':>9}")
+    for mode in args.modes:
+        result = run_mode(mode, args)
+        results.append(result)
+        print(f"{mode:>6} {result['workers']:>8} {result['status_per_second']:>9.0f} "
+              f"{result['idle_lateness_p99_us']:>7.0f}us {result['loaded_lateness_p99_us']:>7.0f}us "
+              f"{result['overruns_under_load']:>9.0f}")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"parameters": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
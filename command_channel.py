@@ -0,0 +1,173 @@
+"""Commands from API worker processes to the control process.
+
+API workers cannot touch the hardware or the control loop's state, so
+everything except reading the status is forwarded to the control process.
+A worker sends a named command over a Unix stream socket. The control
+process runs the matching handler and sends back the HTTP response it
+produced:
+
+    request   {"command": "set_led", "args": {...}}
+    response  {"status": 200, "media_type": "application/json", "body": "..."}
+
+Each command uses its own connection. Workers share no lock with each other
+or with the control process, and a slow or dead worker cannot hold up the
+control loop. Handlers run on a small thread pool in the control process.
+Commands that change state still go through submit_command() and the
+monitoring loop's queue, as they do in single-process mode.
+
+Anyone who can connect can switch the lights and fault modes, so the socket
+lives in a private directory: $XDG_RUNTIME_DIR/streetlight, or
+streetlight-<uid> in the temporary directory without one. The control
+process creates the directory with mode 0700, refuses one that belongs to
+another user or that others can write to, and makes the socket 0600. API
+workers therefore have to run as the same user as the control process. A
+socket that still accepts connections belongs to a running control
+process and is never replaced.
+"""
+
+import concurrent.futures
+import json
+import os
+import socket
+import stat
+import tempfile
+import threading
+
+# Private directory the control socket is created in by default
+if os.environ.get("XDG_RUNTIME_DIR"):
+    CONTROL_SOCKET_DIR = os.path.join(os.environ["XDG_RUNTIME_DIR"], "streetlight")
+else:
+    CONTROL_SOCKET_DIR = os.path.join(tempfile.gettempdir(), f"streetlight-{os.getuid()}")
+CONTROL_SOCKET = os.environ.get("STREETLIGHT_CONTROL_SOCKET") or os.path.join(CONTROL_SOCKET_DIR, "control.sock")
+
+# Handler threads in the control process
+COMMAND_WORKERS = 8
+
+# Seconds a worker waits for a reply; longer than backend.COMMAND_TIMEOUT so
+# a loop that does not answer still produces the handler's own 503
+COMMAND_REPLY_TIMEOUT = 10
+
+_RECV_SIZE = 65536
+
+
+def _recv_all(sock):
+    chunks = []
+    while True:
+        chunk = sock.recv(_RECV_SIZE)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+
+def ensure_private_directory(path):
+    """Create directory path with mode 0700 if needed. Raises PermissionError unless only we can write to it."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o022:
+        raise PermissionError(f"{path} must be a directory owned by uid {os.getuid()} that others cannot write to")
+
+
+class CommandError(Exception):
+    """The control process could not be reached or did not answer."""
+
+
+def send_command(command, path=CONTROL_SOCKET, timeout=COMMAND_REPLY_TIMEOUT, **args):
+    """Run command in the control process and return (status, media type, body text)."""
+    request = json.dumps({"command": command, "args": args}, separators=(',', ':')).encode()
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            sock.sendall(request)
+            sock.shutdown(socket.SHUT_WR)
+            reply = json.loads(_recv_all(sock))
+    except (OSError, ValueError) as e:
+        raise CommandError(f"Control process did not answer {command}: {e}") from e
+    return reply["status"], reply["media_type"], reply["body"]
+
+
+class CommandServer:
+    """Control process side: accepts commands and answers them with handlers[name](**args).
+
+    A handler returns (status, media type, body text). Unknown commands get
+    404, and a handler that raises gets 500.
+    """
+
+    def __init__(self, handlers, path=CONTROL_SOCKET, workers=COMMAND_WORKERS, log=None):
+        self.handlers = handlers
+        self.path = path
+        self.log = log
+        self.commands = 0
+        self._executor = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix="command")
+        self._sock = None
+        self._bound = None  # (device, inode) of the socket file we created
+        self._thread = None
+
+    def start(self):
+        """Listen on path. Raises FileExistsError if another control process is listening there."""
+        ensure_private_directory(os.path.dirname(os.path.abspath(self.path)))
+        if os.path.exists(self.path):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(self.path)
+                except OSError:
+                    # Left behind by a control process that did not shut down cleanly
+                    os.unlink(self.path)
+                else:
+                    raise FileExistsError(f"{self.path} is in use by a running control process")
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.path)
+        os.chmod(self.path, 0o600)
+        info = os.stat(self.path)
+        self._bound = (info.st_dev, info.st_ino)
+        self._sock.listen(64)
+        self._thread = threading.Thread(target=self._accept_loop, name="command-server", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            # Unblocks accept() in the server thread
+            sock.shutdown(socket.SHUT_RDWR)
+            sock.close()
+            self._thread.join()
+            try:
+                info = os.stat(self.path)
+            except FileNotFoundError:
+                info = None
+            # Only remove the socket we bound, not one that has replaced it since
+            if info is not None and (info.st_dev, info.st_ino) == self._bound:
+                os.unlink(self.path)
+        self._executor.shutdown(wait=True)
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            self._executor.submit(self._serve, conn)
+
+    def _serve(self, conn):
+        with conn:
+            try:
+                conn.settimeout(COMMAND_REPLY_TIMEOUT)
+                request = json.loads(_recv_all(conn))
+                status, media_type, body = self._dispatch(request["command"], request.get("args") or {})
+                conn.sendall(json.dumps({"status": status, "media_type": media_type, "body": body},
+                                        separators=(',', ':')).encode())
+            except (OSError, ValueError, KeyError) as e:
+                if self.log is not None:
+                    self.log.error(f"Dropped malformed or abandoned command: {e}")
+
+    def _dispatch(self, command, args):
+        self.commands += 1
+        handler = self.handlers.get(command)
+        if handler is None:
+            return 404, "application/json", json.dumps({"error": f"Unknown command: {command}"})
+        try:
+            return handler(**args)
+        except Exception as e:
+            if self.log is not None:
+                self.log.exception(f"Command {command} failed: {e}")
+            return 500, "application/json", json.dumps({"error": "Command failed."})
@@ -0,0 +1,109 @@
+"""Control process for split mode: owns the hardware, serves API worker processes.
+
+By default backend.py runs the monitoring loop and the HTTP API in one
+interpreter, so a burst of requests competes with the loop, the fades and
+the software PWM for the GIL. In split mode this process runs only the
+control side. API workers (api_worker.py, as many uvicorn workers as
+wanted) handle HTTP:
+
+    STREETLIGHT_HARDWARE=sim python control_process.py
+    uvicorn api_worker:app --workers 4 --port 8000
+
+Every status the loop publishes is copied into the shared status segment
+(shared_status.py), and workers answer /status and /status/stream from it.
+All other endpoints are forwarded over the command socket
+(command_channel.py) and run here by the same handler functions backend.py
+serves in single-process mode. SIGINT or SIGTERM shuts down as backend.py's
+shutdown event does.
+"""
+
+import json
+import signal
+import threading
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from pydantic import ValidationError
+
+import backend
+import metrics
+from command_channel import CommandServer
+from shared_status import SharedStatusWriter
+
+worker_commands = metrics.REGISTRY.gauge(
+    "worker_commands", "Commands received from API worker processes.")
+
+
+def http_reply(result):
+    """(status, media type, body text) for a handler's return value."""
+    if isinstance(result, Response):
+        return result.status_code, result.media_type, result.body.decode()
+    return 200, "application/json", json.dumps(jsonable_encoder(result), separators=(',', ':'))
+
+
+def with_model(model, handler):
+    """Wrap a handler taking a pydantic model so it takes the raw JSON body, answering 422 like FastAPI.
+
+    Other arguments (path parameters) are passed through by name.
+    """
+    def handle(body, **args):
+        try:
+            request = model(**body)
+        except (TypeError, ValidationError) as e:
+            errors = e.errors() if isinstance(e, ValidationError) else str(e)
+            return 422, "application/json", json.dumps(jsonable_encoder({"detail": errors}), separators=(',', ':'))
+        return http_reply(handler(request=request, **args))
+    return handle
+
+
+COMMAND_HANDLERS = {
+    "set_led": lambda body: http_reply(backend.set_led(body)),
+    "set_fault_mode": with_model(backend.FaultModeRequest, backend.set_fault_mode),
+    "set_log_level": with_model(backend.LogLevelRequest, backend.set_log_level),
+    "set_leds": with_model(backend.LedBatchRequest, backend.set_leds),
+    "scenes": lambda: http_reply(backend.get_scenes()),
+    "put_scene": with_model(backend.LedBatchRequest, backend.put_scene),
+    "delete_scene": lambda name: http_reply(backend.delete_scene(name)),
+    "apply_scene": lambda name: http_reply(backend.apply_scene(name)),
+    "history": lambda **query: http_reply(backend.get_history(**query)),
+    "fault_history": lambda **query: http_reply(backend.get_fault_history(**query)),
+    "feedback": lambda: http_reply(backend.get_feedback()),
+    "log_levels": lambda: http_reply(backend.get_log_levels()),
+    "metrics": lambda: http_reply(backend.get_metrics()),
+}
+
+
+def share_status(writer):
+    """StatusStream listener copying each published status into the shared segment."""
+    def listener(seq, encoded):
+        try:
+            writer.write(seq, encoded)
+        except ValueError as e:
+            backend.control_log.error(f"Status not shared with API workers: {e}")
+    return listener
+
+
+def main():
+    writer = SharedStatusWriter(boot_id=int(backend.STATUS_ETAG_BOOT_ID, 16))
+    backend.status_stream.add_listener(share_status(writer))
+    server = CommandServer(COMMAND_HANDLERS, log=backend.api_log)
+    worker_commands.set_function(lambda: server.commands)
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+
+    backend.startup_event()
+    try:
+        server.start()
+        backend.control_log.info(f"Control process serving API workers on {server.path}, "
+                                 f"status in shared memory segment {writer.name}.")
+        stop.wait()
+    finally:
+        server.stop()
+        backend.shutdown_event()
+        writer.close()
+
+
+if __name__ == "__main__":
+    main()
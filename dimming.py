@@ -0,0 +1,150 @@
+"""Ambient-light dimming rules, for one pole or many at once.
+
+The monitoring loop classifies each TCS34725 clear reading as night,
+moderate or day and derives two duty cycles from it: the TCS LED's, and the
+street LEDs' (which only light while motion is detected):
+
+    night    (clear < LOW_LIGHT_THRESHOLD)   TCS 100%, street 100% on motion
+    day      (clear > HIGH_LIGHT_THRESHOLD)  everything off
+    moderate (in between)                    TCS and street (on motion) at
+                                             map_clear_to_duty_cycle(clear)
+
+compute_targets() applies these rules to one pole; compute_targets_batch()
+applies them to arrays of readings for a whole fleet in one pass, using
+numpy when it is installed and plain array loops otherwise.
+
+Given the current class, classify_light() can apply hysteresis: leaving
+a class takes a reading LIGHT_HYSTERESIS (a fraction of the threshold)
+beyond the boundary, so noise around a threshold cannot flip the class back
+and forth. interrupt_band() gives the range of clear readings that would not
+change any of this, for the TCS34725's ambient light interrupt thresholds.
+"""
+
+import math
+from array import array
+
+from async_logging import get_logger
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; the batch path falls back to array loops
+    np = None
+
+control_log = get_logger("control")
+
+# Light intensity thresholds
+LOW_LIGHT_THRESHOLD = 1000    # Threshold below which LED brightness is adjusted
+HIGH_LIGHT_THRESHOLD = 10000  # Threshold above which LED stays off
+
+# Light classes returned by classify_light() and compute_targets_batch()
+NIGHT = 0
+MODERATE = 1
+DAY = 2
+
+# Hysteresis around each threshold, as a fraction of it: night ends above
+# LOW * (1 + h) and starts again below LOW * (1 - h); likewise for day
+LIGHT_HYSTERESIS = 0.1
+
+# Half-width of the interrupt band in the moderate class, in duty cycle percent
+INTERRUPT_DUTY_BAND = 2.5
+
+# Largest clear count the TCS34725 reports
+CLEAR_MAX = 0xFFFF
+
+
+def map_clear_to_duty_cycle(clear_value, clear_min=LOW_LIGHT_THRESHOLD, clear_max=HIGH_LIGHT_THRESHOLD):
+    """Map the clear sensor value to a PWM duty cycle percentage."""
+    clear_value = max(clear_min, min(clear_value, clear_max))
+    duty_cycle = (clear_max - clear_value) * 100 / (clear_max - clear_min)
+    duty_cycle = max(0, min(100, duty_cycle))  # Ensure duty cycle is within [0, 100]
+    control_log.debug("Mapped clear value %s to duty cycle %s%%", clear_value, duty_cycle)
+    return duty_cycle
+
+
+def classify_light(clear_value, low=LOW_LIGHT_THRESHOLD, high=HIGH_LIGHT_THRESHOLD, previous=None, hysteresis=0.0):
+    """Return NIGHT, MODERATE or DAY, staying in previous until clear_value is clearly outside it."""
+    night_below = low * (1 + hysteresis) if previous == NIGHT else low * (1 - hysteresis)
+    day_above = high * (1 - hysteresis) if previous == DAY else high * (1 + hysteresis)
+    if clear_value < night_below:
+        return NIGHT
+    if clear_value > day_above:
+        return DAY
+    return MODERATE
+
+
+def interrupt_band(clear_value, light=None, duty_band=INTERRUPT_DUTY_BAND, low=LOW_LIGHT_THRESHOLD,
+                   high=HIGH_LIGHT_THRESHOLD, hysteresis=0.0):
+    """Return (AILT, AIHT): the clear readings that leave the outputs as they are.
+
+    The TCS34725 interrupts once a reading falls below AILT or rises above
+    AIHT. light is the current class (classified from clear_value if None).
+    At night and in daylight the outputs only change when the reading
+    leaves the class; in between the band spans duty_band percent of duty
+    cycle either side of clear_value, and never reaches past the class
+    boundaries.
+    """
+    if light is None:
+        light = classify_light(clear_value, low, high)
+    if light == NIGHT:
+        return 0, math.ceil(low * (1 + hysteresis)) - 1
+    if light == DAY:
+        return math.floor(high * (1 - hysteresis)) + 1, CLEAR_MAX
+    half_width = int((high - low) * duty_band / 100)
+    clear_value = int(clear_value)
+    return (max(math.ceil(low * (1 - hysteresis)), clear_value - half_width),
+            min(math.floor(high * (1 + hysteresis)), clear_value + half_width))
+
+
+def compute_targets(clear_value, motion, low=LOW_LIGHT_THRESHOLD, high=HIGH_LIGHT_THRESHOLD):
+    """Return (light class, TCS duty cycle, street LED duty cycle) for one pole."""
+    light = classify_light(clear_value, low, high)
+    if light == NIGHT:
+        tcs_duty = 100
+    elif light == DAY:
+        tcs_duty = 0
+    else:
+        tcs_duty = map_clear_to_duty_cycle(clear_value, low, high)
+    street_duty = tcs_duty if motion else 0
+    return light, tcs_duty, street_duty
+
+
+def compute_targets_batch(clear_values, motion_flags, low=LOW_LIGHT_THRESHOLD, high=HIGH_LIGHT_THRESHOLD):
+    """Vectorized compute_targets() over many poles.
+
+    clear_values and motion_flags are equal-length sequences (lists, arrays
+    or numpy arrays). Returns (light classes, TCS duty cycles, street LED duty
+    cycles) as numpy arrays when numpy is available, otherwise as
+    array.array('b'/'d').
+    """
+    if np is not None:
+        clear = np.asarray(clear_values, dtype=np.float64)
+        motion = np.asarray(motion_flags, dtype=bool)
+        night = clear < low
+        day = clear > high
+        light = np.full(clear.shape, MODERATE, dtype=np.int8)
+        light[night] = NIGHT
+        light[day] = DAY
+        # (high - clamp(clear)) * 100 / (high - low) is already within [0, 100]
+        tcs_duty = (high - np.clip(clear, low, high)) * (100.0 / (high - low))
+        tcs_duty[night] = 100.0
+        tcs_duty[day] = 0.0
+        street_duty = np.where(motion, tcs_duty, 0.0)
+        return light, tcs_duty, street_duty
+
+    scale = 100.0 / (high - low)
+    light = array('b', bytes(len(clear_values)))
+    tcs_duty = array('d', bytes(8 * len(clear_values)))
+    street_duty = array('d', bytes(8 * len(clear_values)))
+    for idx, (clear, motion) in enumerate(zip(clear_values, motion_flags)):
+        if clear < low:
+            duty = 100.0
+        elif clear > high:
+            light[idx] = DAY
+            continue
+        else:
+            light[idx] = MODERATE
+            duty = (high - clear) * scale
+        tcs_duty[idx] = duty
+        if motion:
+            street_duty[idx] = duty
+    return light, tcs_duty, street_duty
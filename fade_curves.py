@@ -0,0 +1,81 @@
+"""Precomputed fade curves mapping fade position to PWM duty cycle.
+
+The eye does not see duty cycle linearly: stepping 0 -> 5% looks like a
+jump, 95 -> 100% like nothing. A FadeCurve therefore spreads a fade evenly
+over *perceived* brightness instead. Position 0..CURVE_STEPS runs evenly in
+time, and the curve's table gives the duty cycle that looks that bright:
+
+    linear   duty = p (the old behaviour)
+    gamma    duty = p ** GAMMA
+    cie1931  duty = CIE 1931 luminance for lightness L* = 100 p
+
+Tables are built once per curve kind (get_curve() caches them) so a fade
+step is a table lookup, and position() inverts a table by binary search
+when a fade starts from, or heads for, an arbitrary duty cycle.
+"""
+
+import bisect
+from array import array
+
+# Fade positions per curve (table entries minus one)
+CURVE_STEPS = 1000
+
+# Exponent of the gamma curve
+GAMMA = 2.2
+
+LINEAR = "linear"
+GAMMA_CURVE = "gamma"
+CIE1931 = "cie1931"
+
+
+def _cie1931(p):
+    """Relative luminance (0-1) for lightness L* = 100 p."""
+    lightness = 100.0 * p
+    if lightness <= 8.0:
+        return lightness / 903.3
+    return ((lightness + 16.0) / 116.0) ** 3
+
+
+_CURVE_FUNCTIONS = {
+    LINEAR: lambda p: p,
+    GAMMA_CURVE: lambda p: p ** GAMMA,
+    CIE1931: _cie1931,
+}
+
+
+class FadeCurve:
+    def __init__(self, kind, steps=CURVE_STEPS):
+        function = _CURVE_FUNCTIONS.get(kind)
+        if function is None:
+            raise ValueError(f"Unknown fade curve {kind!r} (expected one of {sorted(_CURVE_FUNCTIONS)})")
+        self.kind = kind
+        self.steps = steps
+        # Duty cycle (0-100) at each position, non-decreasing
+        self.table = array('d', (100.0 * function(i / steps) for i in range(steps + 1)))
+        self.table[0], self.table[steps] = 0.0, 100.0
+
+    def duty(self, position):
+        """Duty cycle at a (fractional) position, from the nearest table entry."""
+        return self.table[min(self.steps, max(0, int(position + 0.5)))]
+
+    def position(self, duty):
+        """Fractional position at which the curve reaches duty."""
+        table = self.table
+        idx = bisect.bisect_left(table, duty)
+        if idx <= 0:
+            return 0.0
+        if idx > self.steps:
+            return float(self.steps)
+        below, above = table[idx - 1], table[idx]
+        return idx - 1 + (duty - below) / (above - below)
+
+
+_curves = {}
+
+
+def get_curve(kind):
+    """Return the shared FadeCurve for kind, building its table on first use."""
+    curve = _curves.get(kind)
+    if curve is None:
+        curve = _curves[kind] = FadeCurve(kind)
+    return curve
@@ -0,0 +1,250 @@
+"""Single-threaded fade scheduler for the PWM-driven LEDs.
+
+Every PWM channel is registered with one FadeEngine. Callers set a target
+duty cycle with fade_to() and return immediately; the engine's thread moves
+every active channel one step closer to its target on a shared tick and
+sleeps while nothing is fading. Retargeting a channel mid-fade simply
+changes where the next steps head, so no fade ever has to be cancelled.
+An owner with its own scheduler can skip start() and call tick() every
+interval seconds while active_count() is non-zero instead.
+
+Fades run along a FadeCurve (see fade_curves.py): each tick moves a
+channel's position on its curve, evenly in perceived brightness, and the
+curve's lookup table gives the duty cycle. Each channel has its own curve
+and duration (the time a full 0-100% fade takes; shorter fades take
+proportionally less). fade_to() can instead give one fade its own length,
+however far it goes.
+
+The output stage quantizes duty cycles to DUTY_RESOLUTION and drops any
+write that repeats the last value sent to that PWM channel, which is
+common where a perceptual curve is flat and when set_duty() repeats itself.
+With levels set, a fade also only writes at that many evenly spaced points
+of the curve per full 0-100% fade (plus the target itself), rounding towards
+the target so the first tick of a fade writes straight away. The position
+still moves every tick, so fades keep their duration, but a tick that stays
+on the same level skips the curve lookup and the write altogether.
+
+Duty cycles and targets live in a FleetState, so a tick only visits the
+channels that are actually fading however many rows the fleet holds.
+"""
+
+import math
+import threading
+import time
+
+from async_logging import get_logger
+from fade_curves import LINEAR, get_curve
+from fleet import FleetState
+
+# Smallest duty cycle change worth a PWM write, in percent
+DUTY_RESOLUTION = 0.1
+
+fade_log = get_logger("fade")
+
+
+class FadeEngine:
+    def __init__(self, interval, duration=1.0, curve=LINEAR, fleet=None, on_change=None, levels=None):
+        self.interval = interval    # Seconds between ticks
+        self.duration = duration    # Default seconds for a full 0-100% fade
+        self.curve = curve          # Default fade curve kind
+        self.levels = levels        # Output levels per full fade (None: write every tick)
+        self.on_change = on_change  # Called after a tick that moved any channel
+        self.fleet = fleet if fleet is not None else FleetState()
+        self.writes = 0             # PWM writes sent
+        self.writes_suppressed = 0  # PWM writes dropped as repeats
+        # Per fleet row index
+        self._pwms = {}             # PWM instance
+        self._curves = {}           # FadeCurve
+        self._quanta = {}           # Curve positions per output level (None: every tick)
+        self._rates = {}            # Curve positions moved per tick
+        self._fade_rates = {}       # Rate of the current fade, if fade_to() gave it a duration
+        self._positions = {}        # Current curve position
+        self._goals = {}            # Curve position of the target
+        self._levels = {}           # Output level last taken from the curve (with levels set)
+        self._written = {}          # Last duty cycle written to the PWM (None: unknown)
+        self._active = set()        # Row indices whose duty != target
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def add_channel(self, name, pwm, duration=None, curve=None):
+        """Register a PWM channel, optionally with its own fade duration and curve kind."""
+        with self._lock:
+            idx = self.fleet.add(name)
+            self._pwms[idx] = pwm
+            self._written[idx] = None
+            self._configure(idx, duration, curve)
+
+    def configure_channel(self, name, duration=None, curve=None):
+        """Change a channel's fade duration and/or curve kind; None keeps the current one."""
+        with self._lock:
+            idx = self.fleet.index(name)
+            self._configure(idx, duration, curve)
+
+    def _configure(self, idx, duration, curve):
+        # Caller holds _lock
+        if curve is not None or idx not in self._curves:
+            fade_curve = get_curve(curve or self.curve)
+            self._curves[idx] = fade_curve
+            self._quanta[idx] = fade_curve.steps / self.levels if self.levels else None
+            self._levels.pop(idx, None)
+            self._positions[idx] = fade_curve.position(self.fleet.duty[idx])
+            self._goals[idx] = fade_curve.position(self.fleet.target[idx])
+        if duration is not None or idx not in self._rates:
+            duration = self.duration if duration is None else duration
+            steps = self._curves[idx].steps
+            self._rates[idx] = steps if duration <= 0 else steps * self.interval / duration
+
+    def _write(self, idx, duty):
+        # Caller holds _lock
+        duty = round(round(duty / DUTY_RESOLUTION) * DUTY_RESOLUTION, 6)
+        if self._written[idx] == duty:
+            self.writes_suppressed += 1
+            return
+        self._written[idx] = duty
+        self.writes += 1
+        self._pwms[idx].ChangeDutyCycle(duty)
+
+    def has_channel(self, name):
+        return name in self.fleet and self.fleet.index(name) in self._pwms
+
+    def fade_to(self, name, target, duration=None):
+        """Start (or retarget) a fade of channel name towards target.
+
+        With a duration (seconds, 0 for the next tick) the fade takes that
+        long from the current duty cycle instead of following the channel's
+        rate.
+        """
+        target = max(0, min(100, target))
+        fleet = self.fleet
+        with self._lock:
+            idx = fleet.index(name)
+            if fleet.target[idx] == target and duration is None:
+                return
+            if idx not in self._active:
+                fade_log.debug("Starting fade for %s from %s%% to %s%% duty cycle.", name, fleet.duty[idx], target)
+            fleet.target[idx] = target
+            goal = self._goals[idx] = self._curves[idx].position(target)
+            if duration is None:
+                self._fade_rates.pop(idx, None)
+            else:
+                distance = abs(goal - self._positions[idx])
+                self._fade_rates[idx] = distance if duration <= 0 else distance * self.interval / duration
+            if fleet.duty[idx] == target:
+                self._active.discard(idx)
+                self._fade_rates.pop(idx, None)
+                self._levels.pop(idx, None)
+                return
+            self._active.add(idx)
+        self._wakeup.set()
+
+    def set_duty(self, name, duty):
+        """Write duty to channel name immediately, cancelling any fade."""
+        duty = max(0, min(100, duty))
+        fleet = self.fleet
+        with self._lock:
+            idx = fleet.index(name)
+            fleet.duty[idx] = fleet.target[idx] = duty
+            fleet.changed_at[idx] = time.monotonic()
+            self._positions[idx] = self._goals[idx] = self._curves[idx].position(duty)
+            self._active.discard(idx)
+            self._fade_rates.pop(idx, None)
+            self._levels.pop(idx, None)
+            self._write(idx, duty)
+
+    def duty(self, name):
+        with self._lock:
+            return self.fleet.duty[self.fleet.index(name)]
+
+    def target(self, name):
+        with self._lock:
+            return self.fleet.target[self.fleet.index(name)]
+
+    def duties(self):
+        """Return a consistent {name: duty cycle} copy of every PWM channel."""
+        with self._lock:
+            return self.fleet.duties(self._pwms)
+
+    def is_fading(self, name):
+        with self._lock:
+            return self.fleet.index(name) in self._active
+
+    def active_count(self):
+        """Number of channels currently fading."""
+        return len(self._active)
+
+    def tick(self):
+        """Advance every fading channel one step. Returns the channels still active."""
+        fleet = self.fleet
+        duty, target = fleet.duty, fleet.target
+        positions, goals = self._positions, self._goals
+        rates, fade_rates = self._rates, self._fade_rates
+        stepped = False
+        with self._lock:
+            now = time.monotonic()
+            for idx in list(self._active):
+                stepped = True
+                position, goal = positions[idx], goals[idx]
+                rate = fade_rates.get(idx) or rates[idx]
+                if goal > position:
+                    position = min(position + rate, goal)
+                else:
+                    position = max(position - rate, goal)
+                positions[idx] = position
+                # Land exactly on the target, which need not be a table entry
+                if position == goal:
+                    duty[idx] = target[idx]
+                else:
+                    quantum = self._quanta[idx]
+                    if quantum is None:
+                        duty[idx] = self._curves[idx].duty(position)
+                    else:
+                        # Round towards the goal, so the first tick of a fade
+                        # already writes the next level
+                        if goal > position:
+                            level = math.ceil(position / quantum)
+                            level_position = min(level * quantum, goal)
+                        else:
+                            level = math.floor(position / quantum)
+                            level_position = max(level * quantum, goal)
+                        if self._levels.get(idx) == level:
+                            # Same output level as the last tick: nothing to write
+                            self.writes_suppressed += 1
+                            continue
+                        self._levels[idx] = level
+                        duty[idx] = self._curves[idx].duty(level_position)
+                fleet.changed_at[idx] = now
+                self._write(idx, duty[idx])
+                if position == goal:
+                    self._levels.pop(idx, None)
+                    self._active.discard(idx)
+                    fade_rates.pop(idx, None)
+                    fade_log.debug("%s faded to %s%% duty cycle.", fleet.names[idx], duty[idx])
+            active = len(self._active)
+        if stepped and self.on_change is not None:
+            self.on_change()
+        return active
+
+    def _run(self):
+        while self._running:
+            if self.tick() == 0:
+                # Nothing left to fade; sleep until fade_to() wakes us
+                self._wakeup.wait()
+                self._wakeup.clear()
+            else:
+                time.sleep(self.interval)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="fade-engine", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
@@ -0,0 +1,113 @@
+"""Declarative registry of the simulated fault modes.
+
+Each FaultRule says what one fault mode does: which system fault flag it
+raises, which LED channel it fails, which channels /set_led refuses to
+switch, how it overrides the PIR/IR/TCS readings and which special
+behaviour (outputs disabled, flickering, delayed response) the monitoring
+loop applies. Fields left at their defaults mean "behave normally".
+
+compile_fault_rules() validates the registry once at start-up and turns it
+into FaultTables: plain dicts and frozensets keyed by mode, so the loop and
+the API handlers resolve everything with a single lookup per tick or
+request. Adding a fault type means adding one FaultRule here.
+"""
+
+import logging
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional, Tuple
+
+NORMAL_MODE = '1'
+
+# How the TCS34725 behaves under a rule
+TCS_OK = "ok"
+TCS_STUCK = "stuck"          # Not initialized; reads return STUCK_CLEAR_VALUE
+TCS_I2C_ERROR = "i2c_error"  # Every read raises IOError
+
+# Clear value a stuck TCS sensor keeps returning
+STUCK_CLEAR_VALUE = 5000
+
+# The street LEDs
+STREET_LEDS = ("LED1", "LED2", "LED3")
+
+
+class FaultRule(NamedTuple):
+    mode: str
+    description: str
+    fault: Optional[str] = None              # System fault flag raised while active
+    failed_channel: Optional[str] = None     # LED channel forced into FAULT_LED_FAILURE
+    locked_channels: Tuple[str, ...] = ()    # Channels /set_led refuses (plus failed_channel)
+    pir: Optional[bool] = None               # Forced PIR detection result
+    ir: Optional[bool] = None                # Forced IR reading (True means no object)
+    tcs: str = TCS_OK
+    outputs_enabled: bool = True             # False: the loop leaves the LEDs alone
+    flicker: bool = False                    # Random 0/50/100% duty each tick
+    delayed: bool = False                    # Loop stops reacting for 5 s at a time
+    tick_log: Optional[Tuple[int, str]] = None  # (level, message) logged every tick
+
+
+FAULT_RULES = (
+    FaultRule('1', 'Normal Operation'),
+    FaultRule('2', 'Simulate PIR Sensor Failure', fault="PIR_Sensor_Failure",
+              locked_channels=("PIR",), pir=False),
+    FaultRule('3', 'Simulate IR Sensor Failure', fault="IR_Sensor_Failure",
+              locked_channels=("IR",), ir=True),
+    FaultRule('4', 'Simulate TCS Sensor Failure', fault="TCS_Sensor_Failure",
+              locked_channels=("TCS",), tcs=TCS_STUCK),
+    FaultRule('5', 'Simulate I2C Communication Failure', fault="I2C_Communication_Failure",
+              tcs=TCS_I2C_ERROR),
+    FaultRule('6', 'Simulate GPIO Output Failure', fault="GPIO_Output_Failure",
+              locked_channels=STREET_LEDS, outputs_enabled=False,
+              tick_log=(logging.ERROR, "Simulating GPIO output failure. LEDs will not update.")),
+    FaultRule('7', 'Simulate Power Issues', fault="Power_Issues",
+              locked_channels=STREET_LEDS, flicker=True),
+    FaultRule('8', 'Simulate Delayed Response', fault="Delayed_Response",
+              locked_channels=STREET_LEDS, delayed=True),
+    FaultRule('9', 'Simulate Sensor Cross-Talk', fault="Sensor_CrossTalk",
+              locked_channels=STREET_LEDS, pir=True, ir=True,
+              tick_log=(logging.WARNING, "Simulating sensor cross-talk. Both PIR and IR sensors detected activity.")),
+    FaultRule('10', 'Simulate LED1 Failure', failed_channel="LED1",
+              tick_log=(logging.ERROR, "Simulating fault in LED1. It will not light up.")),
+    FaultRule('11', 'Simulate LED2 Failure', failed_channel="LED2",
+              tick_log=(logging.ERROR, "Simulating fault in LED2. It will not light up.")),
+    FaultRule('12', 'Simulate LED3 Failure', failed_channel="LED3",
+              tick_log=(logging.ERROR, "Simulating fault in LED3. It will not light up.")),
+    # Add more fault modes as needed
+)
+
+
+class FaultTables(NamedTuple):
+    rules: Mapping[str, FaultRule]             # mode -> rule
+    descriptions: Mapping[str, str]            # mode -> description
+    locked: Mapping[str, frozenset]            # mode -> channels /set_led refuses
+    system_faults: Tuple[str, ...]             # Every system fault flag, in registry order
+
+
+def compile_fault_rules(rules, channels):
+    """Validate rules against the known channel names and build the lookup tables.
+
+    Raises ValueError for duplicate modes, unknown channels or TCS behaviours,
+    or a registry without a normal mode.
+    """
+    channels = set(channels)
+    by_mode, descriptions, locked = {}, {}, {}
+    system_faults = []
+    for rule in rules:
+        if rule.mode in by_mode:
+            raise ValueError(f"Duplicate fault mode: {rule.mode}")
+        if rule.tcs not in (TCS_OK, TCS_STUCK, TCS_I2C_ERROR):
+            raise ValueError(f"Fault mode {rule.mode}: unknown TCS behaviour {rule.tcs!r}")
+        rule_channels = set(rule.locked_channels)
+        if rule.failed_channel is not None:
+            rule_channels.add(rule.failed_channel)
+        unknown = rule_channels - channels
+        if unknown:
+            raise ValueError(f"Fault mode {rule.mode}: unknown channels {sorted(unknown)}")
+        by_mode[rule.mode] = rule
+        descriptions[rule.mode] = rule.description
+        locked[rule.mode] = frozenset(rule_channels)
+        if rule.fault is not None and rule.fault not in system_faults:
+            system_faults.append(rule.fault)
+    if NORMAL_MODE not in by_mode:
+        raise ValueError(f"No rule for normal operation (mode {NORMAL_MODE})")
+    return FaultTables(MappingProxyType(by_mode), MappingProxyType(descriptions),
+                       MappingProxyType(locked), tuple(system_faults))
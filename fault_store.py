@@ -0,0 +1,149 @@
+"""Persistent fault event log backed by SQLite.
+
+Every fault transition (a fault flag turning on or off) becomes one row in
+the fault_events table. The monitoring loop only calls record(), which puts
+the event on an in-memory queue; a writer thread drains the queue and
+inserts whole batches in a single transaction, so a slow SD card never
+stalls the loop. The database runs in WAL mode so API reads proceed while a
+batch is being written.
+
+Queries are served newest first with keyset pagination: each page returns
+the id to pass as before_id for the next (older) page, which keeps a query
+over a month of events an index range scan regardless of page depth.
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+
+from async_logging import get_logger
+
+fault_log = get_logger("faults")
+
+FAULT_DB_FILE = "faults.db"
+
+# Events inserted per transaction, and how long the writer waits to fill one
+FAULT_BATCH_SIZE = 200
+FAULT_FLUSH_INTERVAL = 1.0
+
+# Events queued beyond this are dropped rather than blocking the caller
+FAULT_QUEUE_SIZE = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fault_events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    fault TEXT NOT NULL,
+    active INTEGER NOT NULL,
+    mode TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_fault_events_ts ON fault_events (ts);
+CREATE INDEX IF NOT EXISTS idx_fault_events_fault_ts ON fault_events (fault, ts);
+"""
+
+
+class FaultEventStore:
+    def __init__(self, path=FAULT_DB_FILE, batch_size=FAULT_BATCH_SIZE, flush_interval=FAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=FAULT_QUEUE_SIZE)
+        self._thread = None
+        self._read_conn = None
+        self._read_lock = threading.Lock()
+        self._stop = object()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def start(self):
+        if self._thread is not None:
+            return
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+        self._read_conn = self._connect()
+        self._thread = threading.Thread(target=self._run, name="fault-store", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Write out everything queued so far and close the database."""
+        if self._thread is None:
+            return
+        self._queue.put(self._stop)
+        self._thread.join(timeout=5)
+        self._thread = None
+        with self._read_lock:
+            self._read_conn.close()
+            self._read_conn = None
+
+    def record(self, fault, active, mode=None, ts=None):
+        """Queue one fault transition. Never blocks."""
+        event = (time.time() if ts is None else ts, fault, 1 if active else 0, mode)
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            if first is self._stop:
+                stopping = True
+            else:
+                batch.append(first)
+            # Drain whatever else is already waiting, up to one batch
+            while len(batch) < self.batch_size:
+                try:
+                    event = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if event is self._stop:
+                    stopping = True
+                    continue
+                batch.append(event)
+            if batch:
+                try:
+                    with conn:
+                        conn.executemany(
+                            "INSERT INTO fault_events (ts, fault, active, mode) VALUES (?, ?, ?, ?)", batch)
+                except sqlite3.Error as e:
+                    fault_log.error(f"Failed to store {len(batch)} fault events: {e}")
+        conn.close()
+
+    def query(self, fault=None, start=None, end=None, limit=100, before_id=None):
+        """Return (events, next before_id or None), newest first."""
+        clauses, params = [], []
+        if fault is not None:
+            clauses.append("fault = ?")
+            params.append(fault)
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("ts <= ?")
+            params.append(end)
+        if before_id is not None:
+            # Strictly older than the last event of the previous page
+            clauses.append("(ts, id) < ((SELECT ts FROM fault_events WHERE id = ?), ?)")
+            params.extend((before_id, before_id))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT id, ts, fault, active, mode FROM fault_events {where} ORDER BY ts DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+        with self._read_lock:
+            rows = self._read_conn.execute(sql, params).fetchall()
+        events = [{"id": row[0], "ts": row[1], "fault": row[2], "active": bool(row[3]), "mode": row[4]}
+                  for row in rows[:limit]]
+        next_before = events[-1]["id"] if len(rows) > limit else None
+        return events, next_before
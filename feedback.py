@@ -0,0 +1,187 @@
+"""Closed-loop fault detection from LED feedback (detection) pins.
+
+Any channel wired to a detection pin is watched. Once per monitoring loop
+tick, all detection pins are read in one batch (a single GPLEV register
+read on a Pi) and each sample is compared with what the channel is driven
+to:
+
+  * A channel at 0% must read LOW and one at 100% must read HIGH. Any other
+    reading counts as a definite mismatch.
+  * A PWM channel in between reads HIGH with probability duty / 100,
+    depending on where in the PWM period the sample lands, so one sample
+    proves nothing. Instead the monitor keeps the probability of the
+    current run of identical readings under "the LED works". A run of LOWs
+    at 80% duty (0.2 per sample) or of HIGHs at 10% duty quickly becomes
+    too unlikely to be chance.
+
+A channel is flagged FAULT_LED_FAILURE | FAULT_FEEDBACK_MISMATCH once a run
+of at least FEEDBACK_MIN_SAMPLES readings has a probability below
+FEEDBACK_FAULT_PROBABILITY.
+
+A channel flagged that way is still sampled, and recovers by the same test
+turned around: under "the LED is still stuck" it can only read the level it
+was stuck at, so once a run of at least FEEDBACK_MIN_SAMPLES readings that
+do not fault it again is that unlikely on a stuck LED (in practice: it
+includes the other level), both bits are cleared. A channel at 0% that was
+stuck LOW, or at 100% that was stuck HIGH, gives no such evidence and stays
+faulted. Channels failed for any other reason (a simulated fault mode) are
+skipped until their fault is cleared. Samples taken within FEEDBACK_SETTLE_TIME of a duty change are
+ignored. Per-channel sample and mismatch counters are published as an
+immutable snapshot for readers.
+"""
+
+import math
+import time
+from array import array
+from types import MappingProxyType
+
+from fleet import FAULT_FEEDBACK_MISMATCH, FAULT_LED_FAILURE
+
+# Fault when a run of identical readings is at least this long...
+FEEDBACK_MIN_SAMPLES = 3
+# ...and would happen with this probability or less on a working LED
+FEEDBACK_FAULT_PROBABILITY = 1e-9
+
+# Ignore samples this soon after a duty change (seconds)
+FEEDBACK_SETTLE_TIME = 0.02
+
+# Probability floor for readings that a working LED should never produce
+IMPOSSIBLE_READING = 1e-12
+
+# Fault bits set on a channel whose feedback disagrees with its drive
+FEEDBACK_FAULT_BITS = FAULT_LED_FAILURE | FAULT_FEEDBACK_MISMATCH
+
+STUCK_LOW = "stuck_low"
+STUCK_HIGH = "stuck_high"
+RECOVERED = "recovered"
+
+
+def _log_probability(p):
+    return math.log(max(p, IMPOSSIBLE_READING))
+
+
+class FeedbackMonitor:
+    def __init__(self, fleet, min_samples=FEEDBACK_MIN_SAMPLES, fault_probability=FEEDBACK_FAULT_PROBABILITY,
+                 settle_time=FEEDBACK_SETTLE_TIME):
+        self.fleet = fleet
+        self.min_samples = min_samples
+        self.log_threshold = math.log(fault_probability)
+        self.settle_time = settle_time
+        # One entry per watched channel, parallel arrays
+        self.rows = array('I')        # Fleet row index
+        self.pins = array('I')        # Detection pin
+        self.low_run = array('I')     # Length of the current run of LOW readings
+        self.high_run = array('I')    # Length of the current run of HIGH readings
+        self.low_log_p = array('d')   # log P(current LOW run | working LED)
+        self.high_log_p = array('d')  # log P(current HIGH run | working LED)
+        self.stuck = array('b')       # Level a feedback fault was detected at (-1: none)
+        self.recover_run = array('I')   # Readings since the fault that did not fault it again
+        self.recover_log_p = array('d')  # log P(those readings | LED still stuck)
+        self.samples = array('I')     # Samples judged
+        self.mismatches = array('I')  # Definite mismatches (wrong level at 0% or 100%)
+        self._counters = MappingProxyType({})
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, name, pin):
+        """Watch channel name (a fleet row) through detection pin."""
+        self.rows.append(self.fleet.index(name))
+        self.pins.append(pin)
+        for column in (self.low_run, self.high_run, self.recover_run, self.samples, self.mismatches):
+            column.append(0)
+        self.low_log_p.append(0.0)
+        self.high_log_p.append(0.0)
+        self.recover_log_p.append(0.0)
+        self.stuck.append(-1)
+
+    def watched_pins(self):
+        return list(self.pins)
+
+    def scan(self, levels, now=None):
+        """Judge one batch of pin levels (bitmask, bit n = GPIO n).
+
+        Returns [(channel name, STUCK_LOW, STUCK_HIGH or RECOVERED)] for
+        channels that became faulted, or recovered from a feedback fault, in
+        this scan.
+        """
+        now = time.monotonic() if now is None else now
+        fleet = self.fleet
+        duty, faults, changed_at = fleet.duty, fleet.faults, fleet.changed_at
+        low_run, high_run = self.low_run, self.high_run
+        low_log_p, high_log_p = self.low_log_p, self.high_log_p
+        samples, mismatches = self.samples, self.mismatches
+        stuck_level, recover_run, recover_log_p = self.stuck, self.recover_run, self.recover_log_p
+        min_samples, threshold = self.min_samples, self.log_threshold
+        # Bit n of levels is character n of the reversed binary string
+        bits = format(levels, "b")[::-1]
+        width = len(bits)
+        detected = []
+        counted = False
+        for i, (row, pin) in enumerate(zip(self.rows, self.pins)):
+            if stuck_level[i] >= 0 and not faults[row] & FAULT_FEEDBACK_MISMATCH:
+                # Cleared from outside (a fault mode change or manual command)
+                stuck_level[i] = -1
+            if faults[row] & FAULT_LED_FAILURE and stuck_level[i] < 0:
+                # Out of service for another reason; start from scratch once the fault is cleared
+                low_run[i] = high_run[i] = recover_run[i] = 0
+                low_log_p[i] = high_log_p[i] = recover_log_p[i] = 0.0
+                stuck_level[i] = -1
+                continue
+            if now - changed_at[row] < self.settle_time:
+                continue
+            p_high = duty[row] / 100.0
+            high = pin < width and bits[pin] == "1"
+            samples[i] += 1
+            counted = True
+            if high:
+                low_run[i] = 0
+                low_log_p[i] = 0.0
+                high_run[i] += 1
+                high_log_p[i] += _log_probability(p_high)
+                if p_high <= 0.0:
+                    mismatches[i] += 1
+                stuck = high_run[i] >= min_samples and high_log_p[i] <= threshold
+            else:
+                high_run[i] = 0
+                high_log_p[i] = 0.0
+                low_run[i] += 1
+                low_log_p[i] += _log_probability(1.0 - p_high)
+                if p_high >= 1.0:
+                    mismatches[i] += 1
+                stuck = low_run[i] >= min_samples and low_log_p[i] <= threshold
+            if stuck_level[i] < 0:
+                if stuck:
+                    fleet.set_fault(row, FEEDBACK_FAULT_BITS)
+                    detected.append((fleet.names[row], STUCK_HIGH if high else STUCK_LOW))
+                    stuck_level[i] = high
+                    low_run[i] = high_run[i] = recover_run[i] = 0
+                    low_log_p[i] = high_log_p[i] = recover_log_p[i] = 0.0
+            elif stuck:
+                # Still (or again) stuck: the recovery run starts over
+                recover_run[i] = 0
+                recover_log_p[i] = 0.0
+            else:
+                recover_run[i] += 1
+                recover_log_p[i] += 0.0 if high == stuck_level[i] else _log_probability(0.0)
+                if recover_run[i] >= min_samples and recover_log_p[i] <= threshold:
+                    fleet.set_fault(row, FEEDBACK_FAULT_BITS, False)
+                    detected.append((fleet.names[row], RECOVERED))
+                    stuck_level[i] = -1
+                    recover_run[i] = 0
+                    recover_log_p[i] = 0.0
+        if counted:
+            self._publish()
+        return detected
+
+    def _publish(self):
+        names = self.fleet.names
+        self._counters = MappingProxyType({
+            names[row]: (samples, mismatches)
+            for row, samples, mismatches in zip(self.rows, self.samples, self.mismatches)
+        })
+
+    def counters(self):
+        """{channel: {"samples": n, "mismatches": n}} as of the last scan; safe from any thread."""
+        return {name: {"samples": samples, "mismatches": mismatches}
+                for name, (samples, mismatches) in self._counters.items()}
@@ -0,0 +1,125 @@
+"""Array-backed state for every light channel the backend drives.
+
+One row per pole/channel. Each per-channel attribute lives in its own
+contiguous array (duty cycle, fade target, fault bitmask, manual override
+flag, time of last duty change) and rows are addressed by integer index,
+with a name -> index map for the API boundary. A single pole uses six rows
+("PIR", "IR", "TCS", "LED1", "LED2", "LED3"); a fleet uses names such as
+"pole-0042/LED1" and holds tens of thousands of rows without a dict per
+channel. Driving that many is another matter: each fading channel still
+costs Python work on every fade tick (benchmarks/bench_fleet.py puts a
+second of fading across 5000 poles at roughly half a second of CPU).
+
+FleetState does no locking of its own; the owner (the fade scheduler for
+duty/target, the monitoring loop for faults) serializes writes.
+"""
+
+from array import array
+
+# Fault bits stored in FleetState.faults
+FAULT_LED_FAILURE = 0x01        # Channel is out of service (simulated or detected failure)
+FAULT_FEEDBACK_MISMATCH = 0x02  # Detection pin disagrees with what the channel is driven to
+
+FAULT_BIT_NAMES = {
+    FAULT_LED_FAILURE: "led_failure",
+    FAULT_FEEDBACK_MISMATCH: "feedback_mismatch",
+}
+
+
+class FleetState:
+    def __init__(self, names=()):
+        self.names = []
+        self._index = {}
+        self.duty = array('d')        # Current duty cycle (0-100)
+        self.target = array('d')      # Duty cycle the channel is fading towards
+        self.faults = array('I')      # FAULT_* bitmask
+        self.override = array('B')    # 1 while the channel is under manual control
+        self.changed_at = array('d')  # time.monotonic() of the last duty change
+        self.add_many(names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def add(self, name):
+        """Append a row for name (or return its existing index)."""
+        idx = self._index.get(name)
+        if idx is not None:
+            return idx
+        idx = len(self.names)
+        self.names.append(name)
+        self._index[name] = idx
+        self.duty.append(0.0)
+        self.target.append(0.0)
+        self.faults.append(0)
+        self.override.append(0)
+        self.changed_at.append(0.0)
+        return idx
+
+    def add_many(self, names):
+        """Append rows for names in bulk; returns the index of the first one added."""
+        start = len(self.names)
+        new = [name for name in names if name not in self._index]
+        count = len(new)
+        self.names.extend(new)
+        self._index.update(zip(new, range(start, start + count)))
+        zeros = array('d', bytes(8 * count))
+        self.duty.extend(zeros)
+        self.target.extend(zeros)
+        self.changed_at.extend(zeros)
+        self.faults.extend(array('I', bytes(self.faults.itemsize * count)))
+        self.override.extend(bytes(count))
+        return start
+
+    def index(self, name):
+        """Row index for name. Raises KeyError for unknown channels."""
+        return self._index[name]
+
+    # Faults
+
+    def set_fault(self, idx, bit, active=True):
+        """Set or clear a fault bit. Returns True if the bit changed."""
+        before = self.faults[idx]
+        after = before | bit if active else before & ~bit
+        self.faults[idx] = after
+        return after != before
+
+    def has_fault(self, idx, bit=0xFFFFFFFF):
+        return bool(self.faults[idx] & bit)
+
+    def clear_faults(self, bit=0xFFFFFFFF):
+        """Clear bit on every row."""
+        keep = ~bit & 0xFFFFFFFF
+        faults = self.faults
+        for idx in range(len(faults)):
+            if faults[idx] & bit:
+                faults[idx] &= keep
+
+    def faulted(self, bit=0xFFFFFFFF):
+        """Names of every row with any of the given fault bits set."""
+        return [self.names[idx] for idx, mask in enumerate(self.faults) if mask & bit]
+
+    # Queries
+
+    def duties(self, indices=None):
+        """{name: duty cycle} for the given rows (all rows by default)."""
+        names, duty = self.names, self.duty
+        if indices is None:
+            return dict(zip(names, duty))
+        return {names[idx]: duty[idx] for idx in indices}
+
+    def row(self, idx):
+        return {
+            "name": self.names[idx],
+            "duty": self.duty[idx],
+            "target": self.target[idx],
+            "faults": [label for bit, label in FAULT_BIT_NAMES.items() if self.faults[idx] & bit],
+            "manual_override": bool(self.override[idx]),
+            "changed_at": self.changed_at[idx],
+        }
+
+    def memory_bytes(self):
+        """Bytes held by the per-row arrays (excluding the name index)."""
+        return sum(a.itemsize * len(a) for a in (self.duty, self.target, self.faults, self.override, self.changed_at))
@@ -0,0 +1,756 @@
+"""Hardware drivers for the street light backend.
+
+The backend talks to two pieces of hardware: the GPIO header (sensor inputs,
+LED outputs and software PWM) and the I2C bus the TCS34725 sits on. Both are
+loaded through load_hardware() so the same control code can run on a
+Raspberry Pi ("pi") or on any Linux box against an in-memory simulation
+("sim").
+
+The simulated driver mirrors the parts of the RPi.GPIO and smbus2 APIs the
+backend uses, so backend.py keeps calling GPIO.output(), GPIO.PWM() and
+bus.read_byte_data() exactly as it does on a pole.
+
+PWM output has its own backend, chosen by load_pwm_backend(): RPi.GPIO's
+software PWM ("soft", one timing thread per channel), soft_pwm.SoftPWMEngine
+("engine", every channel from one thread with batched pin writes) or kernel
+PWM channels under /sys/class/pwm ("sysfs") for the pins wired to one, with
+"sysfs+engine" putting the remaining pins on the engine. The sysfs driver
+works against any directory laid out like /sys/class/pwm, such as the fake
+tree create_fake_sysfs_pwm() builds for the simulation and benchmarks.
+"""
+
+import collections
+import mmap
+import os
+import random
+import struct
+import tempfile
+import threading
+import time
+
+from soft_pwm import SoftPWMEngine
+
+# Driver selected when the backend starts ("pi" or "sim")
+HARDWARE_BACKEND = os.environ.get("STREETLIGHT_HARDWARE", "pi").lower()
+
+# PWM output backend ("soft", "engine", "sysfs" or "sysfs+engine"), and the kernel PWM class directory
+# the sysfs backend drives (a fake tree is created for the simulation)
+PWM_BACKEND = os.environ.get("STREETLIGHT_PWM", "soft").lower()
+SYSFS_PWM_ROOT = os.environ.get("STREETLIGHT_SYSFS_PWM_ROOT", "/sys/class/pwm")
+
+# Seconds to wait for an exported PWM channel to appear (udev sets its permissions)
+SYSFS_EXPORT_TIMEOUT = 1.0
+
+# I2C bus number the TCS34725 is wired to (1 for Raspberry Pi)
+I2C_BUS_NUMBER = 1
+
+# Number of duty cycle changes each simulated PWM channel remembers
+PWM_HISTORY_LENGTH = 1000
+
+# BCM283x GPIO registers, as mapped by /dev/gpiomem: pin levels of GPIO 0-31
+# and 32-53, readable in one access each
+GPIOMEM_DEVICE = "/dev/gpiomem"
+GPIOMEM_SIZE = 4096
+GPLEV0 = 0x34
+GPSET0 = 0x1C
+GPCLR0 = 0x28
+GPLEV1 = 0x38
+
+
+class SimulatedPWM:
+    """In-memory stand-in for an RPi.GPIO software PWM channel."""
+
+    def __init__(self, gpio, pin, frequency):
+        self.gpio = gpio
+        self.pin = pin
+        self.frequency = frequency
+        self.duty_cycle = 0
+        self.running = False
+        self.write_count = 0
+        # (timestamp, duty cycle) pairs, oldest first
+        self.history = collections.deque(maxlen=PWM_HISTORY_LENGTH)
+
+    def _record(self, duty_cycle):
+        self.duty_cycle = duty_cycle
+        self.write_count += 1
+        self.history.append((time.monotonic(), duty_cycle))
+        self.gpio.call_counts["pwm"] += 1
+
+    def start(self, duty_cycle):
+        self.running = True
+        self._record(duty_cycle)
+
+    def ChangeDutyCycle(self, duty_cycle):
+        if not 0 <= duty_cycle <= 100:
+            raise ValueError("dutycycle must have a value from 0.0 to 100.0")
+        self._record(duty_cycle)
+
+    def ChangeFrequency(self, frequency):
+        self.frequency = frequency
+
+    def stop(self):
+        self.running = False
+        self.duty_cycle = 0
+
+
+class SimulatedGPIO:
+    """In-memory stand-in for the RPi.GPIO module.
+
+    Input levels are scripted with set_input(); output levels and PWM duty
+    cycles are recorded so benchmarks and replays can inspect them. An input
+    can be wired to an output with connect() to model an LED's feedback
+    sensor: it then reads the output's level, or for a running PWM channel
+    HIGH with probability duty cycle / 100, as sampling a real PWM signal at
+    a random instant would.
+    """
+
+    # Constants share their values with RPi.GPIO
+    BOARD = 10
+    BCM = 11
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self):
+        self.mode = None
+        self.levels = {}
+        self.directions = {}
+        self.pwms = {}
+        # pin -> [edge, bouncetime in seconds, callbacks, last event time]
+        self.event_detects = {}
+        # input pin -> output pin it is wired to
+        self.feedback = {}
+        self.call_counts = collections.Counter()
+        self._rng = random.Random()
+        self._lock = threading.Lock()
+
+    def setwarnings(self, flag):
+        pass
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setup(self, pin, direction, pull_up_down=PUD_OFF, initial=None):
+        with self._lock:
+            self.directions[pin] = direction
+            if direction == self.OUT:
+                self.levels[pin] = self.LOW if initial is None else initial
+            elif pin not in self.levels:
+                # Pull resistors decide the idle level of an unscripted input
+                self.levels[pin] = self.HIGH if pull_up_down == self.PUD_UP else self.LOW
+        self.call_counts["setup"] += 1
+
+    def input(self, pin):
+        self.call_counts["input"] += 1
+        with self._lock:
+            if pin not in self.directions:
+                raise RuntimeError(f"You must setup() the GPIO channel first (pin {pin})")
+            return self._level(pin)
+
+    def _level(self, pin):
+        # Caller holds _lock
+        source = self.feedback.get(pin)
+        if source is None:
+            return self.levels.get(pin, self.LOW)
+        pwm = self.pwms.get(source)
+        if pwm is not None and pwm.running:
+            return self.HIGH if self._rng.random() * 100 < pwm.duty_cycle else self.LOW
+        return self.levels.get(source, self.LOW)
+
+    def output(self, pin, value):
+        self.call_counts["output"] += 1
+        with self._lock:
+            if self.directions.get(pin) != self.OUT:
+                raise RuntimeError(f"The GPIO channel has not been set up as an OUTPUT (pin {pin})")
+            self.levels[pin] = self.HIGH if value else self.LOW
+
+    def PWM(self, pin, frequency):
+        pwm = SimulatedPWM(self, pin, frequency)
+        self.pwms[pin] = pwm
+        return pwm
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        with self._lock:
+            if self.directions.get(pin) != self.IN:
+                raise RuntimeError(f"You must setup() the GPIO channel as an input first (pin {pin})")
+            if pin in self.event_detects:
+                raise RuntimeError(f"Conflicting edge detection already enabled for this GPIO channel (pin {pin})")
+            callbacks = [callback] if callback is not None else []
+            bounce = (bouncetime or 0) / 1000.0
+            self.event_detects[pin] = [edge, bounce, callbacks, None]
+
+    def add_event_callback(self, pin, callback):
+        with self._lock:
+            if pin not in self.event_detects:
+                raise RuntimeError(f"Add event detection using add_event_detect first (pin {pin})")
+            self.event_detects[pin][2].append(callback)
+
+    def remove_event_detect(self, pin):
+        with self._lock:
+            self.event_detects.pop(pin, None)
+
+    def cleanup(self):
+        with self._lock:
+            self.levels.clear()
+            self.directions.clear()
+            self.pwms.clear()
+            self.event_detects.clear()
+            self.feedback.clear()
+
+    # Simulation helpers (not part of RPi.GPIO)
+
+    def set_input(self, pin, level):
+        """Drive a simulated input pin to the given level.
+
+        Edge callbacks registered with add_event_detect() run on the calling
+        thread, subject to the same bouncetime filtering as RPi.GPIO.
+        """
+        level = self.HIGH if level else self.LOW
+        callbacks = ()
+        with self._lock:
+            previous = self.levels.get(pin, self.LOW)
+            self.levels[pin] = level
+            detect = self.event_detects.get(pin)
+            if detect is not None and level != previous:
+                edge, bounce, registered, last_event = detect
+                rising = level == self.HIGH
+                if edge == self.BOTH or (edge == self.RISING) == rising:
+                    now = time.monotonic()
+                    if last_event is None or now - last_event >= bounce:
+                        detect[3] = now
+                        callbacks = tuple(registered)
+        for callback in callbacks:
+            callback(pin)
+
+    def connect(self, output_pin, input_pin):
+        """Wire input_pin to follow output_pin (a working LED and its sensor)."""
+        with self._lock:
+            self.feedback[input_pin] = output_pin
+
+    def disconnect(self, input_pin):
+        """Cut the wire to input_pin (a failed LED); it reads its set_input() level again."""
+        with self._lock:
+            self.feedback.pop(input_pin, None)
+
+    def read_levels(self, pins=None):
+        """Every pin level as one bitmask (bit n is GPIO n), like reading GPLEV."""
+        self.call_counts["read_levels"] += 1
+        with self._lock:
+            high = [pin for pin in self.directions if self._level(pin)]
+        if not high:
+            return 0
+        bits = bytearray((max(high) >> 3) + 1)
+        for pin in high:
+            bits[pin >> 3] |= 1 << (pin & 7)
+        return int.from_bytes(bits, "little")
+
+    def write_pins(self, set_mask, clear_mask):
+        """Drive output pins HIGH (set_mask) and LOW (clear_mask) at once, like GPSET/GPCLR."""
+        self.call_counts["write_pins"] += 1
+        with self._lock:
+            for mask, level in ((set_mask, self.HIGH), (clear_mask, self.LOW)):
+                while mask:
+                    bit = mask & -mask
+                    pin = bit.bit_length() - 1
+                    if self.directions.get(pin) == self.OUT:
+                        self.levels[pin] = level
+                    mask ^= bit
+
+    def duty_cycle(self, pin):
+        """Return the last duty cycle written to the PWM channel on pin."""
+        pwm = self.pwms.get(pin)
+        return pwm.duty_cycle if pwm else 0
+
+
+class SimulatedSMBus:
+    """In-memory stand-in for smbus2.SMBus backed by a register map.
+
+    Registers are addressed the way the TCS34725 expects: the command byte
+    carries the register address in its low five bits, so reads and writes
+    with COMMAND_BIT set land on the same register as the bare address.
+    """
+
+    COMMAND_BIT = 0x80
+    REGISTER_MASK = 0x1F
+
+    def __init__(self, bus=I2C_BUS_NUMBER):
+        self.bus = bus
+        # (device address, register) -> byte value
+        self.registers = {}
+        self.transactions = 0
+        # When set, every transfer raises it to simulate a bus fault
+        self.failure = None
+        # Device address -> simulated device notified of bare command bytes
+        self.devices = {}
+        self._lock = threading.Lock()
+
+    def _register(self, register):
+        if register & self.COMMAND_BIT:
+            return register & self.REGISTER_MASK
+        return register
+
+    def _check(self):
+        self.transactions += 1
+        if self.failure is not None:
+            raise self.failure
+
+    def read_byte_data(self, i2c_addr, register):
+        with self._lock:
+            self._check()
+            return self.registers.get((i2c_addr, self._register(register)), 0)
+
+    def write_byte_data(self, i2c_addr, register, value):
+        with self._lock:
+            self._check()
+            self.registers[(i2c_addr, self._register(register))] = value & 0xFF
+
+    def write_byte(self, i2c_addr, value):
+        """Send a bare command byte (e.g. a TCS34725 special function)."""
+        with self._lock:
+            self._check()
+            device = self.devices.get(i2c_addr)
+        if device is not None:
+            device.command(value & 0xFF)
+
+    def read_i2c_block_data(self, i2c_addr, register, length):
+        """Read length consecutive registers in a single transaction."""
+        with self._lock:
+            self._check()
+            start = self._register(register)
+            return [self.registers.get((i2c_addr, start + offset), 0) for offset in range(length)]
+
+    def write_i2c_block_data(self, i2c_addr, register, data):
+        with self._lock:
+            self._check()
+            start = self._register(register)
+            for offset, value in enumerate(data):
+                self.registers[(i2c_addr, start + offset)] = value & 0xFF
+
+    def close(self):
+        pass
+
+    # Simulation helpers (not part of smbus2)
+
+    def set_register(self, i2c_addr, register, value):
+        with self._lock:
+            self.registers[(i2c_addr, register)] = value & 0xFF
+
+    def set_word(self, i2c_addr, register, value):
+        """Store a 16-bit value low byte first, as the TCS34725 does."""
+        with self._lock:
+            self.registers[(i2c_addr, register)] = value & 0xFF
+            self.registers[(i2c_addr, register + 1)] = (value >> 8) & 0xFF
+
+    def get_word(self, i2c_addr, register):
+        with self._lock:
+            return (self.registers.get((i2c_addr, register), 0)
+                    | self.registers.get((i2c_addr, register + 1), 0) << 8)
+
+    def attach(self, i2c_addr, device):
+        """Route bare command bytes written to i2c_addr to device.command()."""
+        self.devices[i2c_addr] = device
+
+
+class SimulatedTCS34725:
+    """Ambient light interrupt of a TCS34725 on a SimulatedSMBus.
+
+    Register reads and writes go to the bus's register map as usual. On
+    top of that, set_clear() stands in for integration cycles completing:
+    with AIEN set, a clear value outside [AILT, AIHT] for as many
+    consecutive cycles as the persistence filter (APERS) asks for latches
+    AINT and pulls the INT pin LOW, until the clear-interrupt special
+    function is written.
+    """
+
+    ENABLE = 0x00
+    AILTL = 0x04
+    AIHTL = 0x06
+    PERS = 0x0C
+    STATUS = 0x13
+    CDATAL = 0x14
+    ENABLE_AIEN = 0x10
+    STATUS_AINT = 0x10
+    SPECIAL_FUNCTION = 0x60  # Command byte type bits of a special function
+    CLEAR_INTERRUPT = 0x06   # Special function: clear channel interrupt
+    # Consecutive out-of-band cycles needed for each APERS value (0: every cycle)
+    PERSISTENCE_CYCLES = (0, 1, 2, 3, 5, 10, 15, 20, 25, 30, 35, 40, 45, 50, 55, 60)
+
+    def __init__(self, bus, gpio, int_pin, address=0x29):
+        self.bus = bus
+        self.gpio = gpio
+        self.int_pin = int_pin
+        self.address = address
+        self.interrupts = 0
+        self._out_of_band = 0
+        self._lock = threading.Lock()
+        bus.attach(address, self)
+
+    def _register(self, register):
+        return self.bus.registers.get((self.address, register), 0)
+
+    def set_clear(self, value, cycles=1):
+        """Finish cycles integration cycles that all read clear value."""
+        bus = self.bus
+        bus.set_word(self.address, self.CDATAL, value)
+        with bus._lock:
+            enabled = self._register(self.ENABLE) & self.ENABLE_AIEN
+            low = self._register(self.AILTL) | self._register(self.AILTL + 1) << 8
+            high = self._register(self.AIHTL) | self._register(self.AIHTL + 1) << 8
+            required = self.PERSISTENCE_CYCLES[self._register(self.PERS) & 0x0F]
+            status = self._register(self.STATUS)
+        if not enabled or status & self.STATUS_AINT:
+            return
+        with self._lock:
+            if required and low <= value <= high:
+                self._out_of_band = 0
+                return
+            self._out_of_band += cycles
+            if self._out_of_band < required:
+                return
+            self._out_of_band = 0
+            self.interrupts += 1
+        bus.set_register(self.address, self.STATUS, status | self.STATUS_AINT)
+        self.gpio.set_input(self.int_pin, self.gpio.LOW)
+
+    def command(self, value):
+        if value & self.SPECIAL_FUNCTION == self.SPECIAL_FUNCTION and value & 0x1F == self.CLEAR_INTERRUPT:
+            with self._lock:
+                self._out_of_band = 0
+            with self.bus._lock:
+                status = self._register(self.STATUS)
+            self.bus.set_register(self.address, self.STATUS, status & ~self.STATUS_AINT)
+            self.gpio.set_input(self.int_pin, self.gpio.HIGH)
+
+
+class GpioMemLevels:
+    """Reads every GPIO level at once from the BCM283x GPLEV registers.
+
+    Needs read access to /dev/gpiomem (members of the gpio group on
+    Raspberry Pi OS). Two 32-bit reads cover all 54 pins, however many
+    detection pins are being watched.
+    """
+
+    def __init__(self, path=GPIOMEM_DEVICE):
+        fd = os.open(path, os.O_RDONLY | os.O_SYNC)
+        try:
+            self._mem = mmap.mmap(fd, GPIOMEM_SIZE, mmap.MAP_SHARED, mmap.PROT_READ)
+        finally:
+            os.close(fd)
+
+    def read_levels(self, pins=None):
+        low, high = struct.unpack_from("<II", self._mem, GPLEV0)
+        return low | (high & 0x3FFFFF) << 32
+
+
+class PinLevelReader:
+    """Fallback level reader calling gpio.input() once per requested pin."""
+
+    def __init__(self, gpio):
+        self.gpio = gpio
+
+    def read_levels(self, pins=()):
+        levels = 0
+        for pin in pins:
+            if self.gpio.input(pin):
+                levels |= 1 << pin
+        return levels
+
+
+class GpioMemWriter:
+    """Drives many output pins at once through the BCM283x GPSET/GPCLR registers.
+
+    Needs read-write access to /dev/gpiomem. Pins not set up as outputs are
+    unaffected, as with GPIO.output().
+    """
+
+    _word = struct.Struct("<I")
+
+    def __init__(self, path=GPIOMEM_DEVICE):
+        fd = os.open(path, os.O_RDWR | os.O_SYNC)
+        try:
+            self._mem = mmap.mmap(fd, GPIOMEM_SIZE, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+
+    def write_pins(self, set_mask, clear_mask):
+        # One 32-bit store per register bank touched
+        for register, mask in ((GPSET0, set_mask), (GPCLR0, clear_mask)):
+            if mask & 0xFFFFFFFF:
+                self._word.pack_into(self._mem, register, mask & 0xFFFFFFFF)
+            if mask >> 32:
+                self._word.pack_into(self._mem, register + 4, (mask >> 32) & 0x3FFFFF)
+
+
+class PinOutputWriter:
+    """Fallback pin writer calling gpio.output() once per pin in the masks."""
+
+    def __init__(self, gpio):
+        self.gpio = gpio
+
+    def write_pins(self, set_mask, clear_mask):
+        for mask, level in ((set_mask, self.gpio.HIGH), (clear_mask, self.gpio.LOW)):
+            while mask:
+                bit = mask & -mask
+                self.gpio.output(bit.bit_length() - 1, level)
+                mask ^= bit
+
+
+def load_pin_writer(gpio, name=None):
+    """Return write_pins(set_mask, clear_mask) for the named backend.
+
+    The counterpart of load_level_reader(): the simulation writes its own pin
+    table, a Pi writes the GPSET/GPCLR registers through /dev/gpiomem when it
+    can be opened and calls gpio.output() per pin otherwise.
+    """
+    name = (name or HARDWARE_BACKEND).lower()
+    if name == "sim":
+        return gpio.write_pins
+    try:
+        return GpioMemWriter().write_pins
+    except (OSError, ValueError):
+        return PinOutputWriter(gpio).write_pins
+
+
+def load_level_reader(gpio, name=None):
+    """Return read_levels(pins) -> bitmask of pin levels for the named backend.
+
+    The simulation reads its own pin table. On a Pi the GPLEV registers are
+    read through /dev/gpiomem when it can be opened, and pins are read one
+    by one through gpio.input() otherwise (e.g. on a Pi 5, whose GPIO sits
+    behind the RP1 chip).
+    """
+    name = (name or HARDWARE_BACKEND).lower()
+    if name == "sim":
+        return gpio.read_levels
+    try:
+        return GpioMemLevels().read_levels
+    except (OSError, ValueError):
+        return PinLevelReader(gpio).read_levels
+
+
+class SysfsPWM:
+    """Kernel PWM channel driven through /sys/class/pwm, with the RPi.GPIO PWM interface.
+
+    The PWM peripheral does the timing, so there is no thread and no jitter
+    under CPU load. The period, duty_cycle and enable files are opened once
+    and kept open: a duty cycle change is a single pwrite() of the new value
+    in nanoseconds, and is skipped when that value is already set.
+    """
+
+    def __init__(self, chip, channel, frequency, root=SYSFS_PWM_ROOT):
+        self.chip = chip
+        self.channel = channel
+        chip_dir = os.path.join(root, f"pwmchip{chip}")
+        self.path = os.path.join(chip_dir, f"pwm{channel}")
+        if not os.path.isdir(self.path):
+            with open(os.path.join(chip_dir, "export"), "w") as f:
+                f.write(str(channel))
+            deadline = time.monotonic() + SYSFS_EXPORT_TIMEOUT
+            while not os.access(os.path.join(self.path, "duty_cycle"), os.W_OK):
+                if time.monotonic() > deadline:
+                    raise OSError(f"{self.path} did not appear after exporting channel {channel}")
+                time.sleep(0.01)
+        self._fds = {}
+        try:
+            for attribute in ("period", "duty_cycle", "enable"):
+                self._fds[attribute] = os.open(os.path.join(self.path, attribute), os.O_WRONLY)
+        except OSError:
+            self.close()
+            raise
+        self.duty_cycle = 0
+        self.running = False
+        self.write_count = 0  # Attribute writes issued
+        self.period_ns = 0
+        self.duty_ns = None
+        self.ChangeFrequency(frequency)
+
+    def _set(self, attribute, value):
+        # sysfs attributes are rewritten from offset 0 without reopening
+        os.pwrite(self._fds[attribute], b"%d\n" % value, 0)
+        self.write_count += 1
+
+    def start(self, duty_cycle):
+        self.ChangeDutyCycle(duty_cycle)
+        self._set("enable", 1)
+        self.running = True
+
+    def ChangeDutyCycle(self, duty_cycle):
+        if not 0 <= duty_cycle <= 100:
+            raise ValueError("dutycycle must have a value from 0.0 to 100.0")
+        self.duty_cycle = duty_cycle
+        duty_ns = round(self.period_ns * duty_cycle / 100)
+        if duty_ns != self.duty_ns:
+            self._set("duty_cycle", duty_ns)
+            self.duty_ns = duty_ns
+
+    def ChangeFrequency(self, frequency):
+        period_ns = round(1e9 / frequency)
+        if self.duty_ns is None or self.duty_ns > period_ns:
+            # The kernel rejects a period shorter than the current duty cycle
+            self._set("duty_cycle", 0)
+            self.duty_ns = 0
+        self._set("period", period_ns)
+        self.period_ns = period_ns
+        self.frequency = frequency
+        self.ChangeDutyCycle(self.duty_cycle)
+
+    def stop(self):
+        if self.running:
+            self._set("enable", 0)
+            self.running = False
+
+    def close(self):
+        if self._fds.get("enable") is not None:
+            self.stop()
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds = {}
+
+
+class SysfsPWMGPIO:
+    """GPIO module wrapper putting PWM on kernel PWM channels where a pin has one.
+
+    channels maps BCM pin -> (pwmchip, channel), as routed by the pwm or
+    pwm-2chan overlay in config.txt. Those pins stay in their PWM alternate
+    function: setup() leaves them alone and PWM() returns a SysfsPWM. Every
+    other pin and call goes to the wrapped module (soft PWM).
+    """
+
+    def __init__(self, gpio, channels, root=SYSFS_PWM_ROOT):
+        self._gpio = gpio
+        self.channels = dict(channels)
+        self.root = root
+        self.sysfs_pwms = {}
+
+    def __getattr__(self, name):
+        return getattr(self._gpio, name)
+
+    def setup(self, pin, direction, **kwargs):
+        if pin in self.channels:
+            return
+        self._gpio.setup(pin, direction, **kwargs)
+
+    def PWM(self, pin, frequency):
+        if pin not in self.channels:
+            return self._gpio.PWM(pin, frequency)
+        chip, channel = self.channels[pin]
+        pwm = self.sysfs_pwms[pin] = SysfsPWM(chip, channel, frequency, self.root)
+        return pwm
+
+    def cleanup(self, *args):
+        for pwm in self.sysfs_pwms.values():
+            pwm.close()
+        self.sysfs_pwms.clear()
+        self._gpio.cleanup(*args)
+
+
+class EnginePWMGPIO:
+    """GPIO module wrapper whose PWM() returns channels of one SoftPWMEngine.
+
+    Everything else goes to the wrapped module. cleanup() stops the engine
+    first, so its thread drives the pins low before they are released.
+    """
+
+    def __init__(self, gpio, engine):
+        self._gpio = gpio
+        self.engine = engine
+
+    def __getattr__(self, name):
+        return getattr(self._gpio, name)
+
+    def PWM(self, pin, frequency):
+        return self.engine.channel(pin, frequency)
+
+    def cleanup(self, *args):
+        self.engine.stop()
+        self._gpio.cleanup(*args)
+
+
+def create_fake_sysfs_pwm(root, channels):
+    """Lay out a /sys/class/pwm lookalike under root for the given (chip, channel) pairs.
+
+    Channels are created already exported. Values are written one per line
+    from offset 0 like real attributes, so read_fake_sysfs_pwm() reads the
+    first line of each file.
+    """
+    chips = {}
+    for chip, channel in channels:
+        chips[chip] = max(chips.get(chip, 0), channel + 1)
+    for chip, count in chips.items():
+        chip_dir = os.path.join(root, f"pwmchip{chip}")
+        os.makedirs(chip_dir, exist_ok=True)
+        for name, value in (("npwm", count), ("export", ""), ("unexport", "")):
+            with open(os.path.join(chip_dir, name), "w") as f:
+                f.write(f"{value}\n")
+    for chip, channel in channels:
+        channel_dir = os.path.join(root, f"pwmchip{chip}", f"pwm{channel}")
+        os.makedirs(channel_dir, exist_ok=True)
+        for name in ("period", "duty_cycle", "enable"):
+            with open(os.path.join(channel_dir, name), "w") as f:
+                f.write("0\n")
+    return root
+
+
+def read_fake_sysfs_pwm(root, chip, channel):
+    """Return {"period", "duty_cycle", "enable"} as last written to a fake tree channel."""
+    values = {}
+    for name in ("period", "duty_cycle", "enable"):
+        with open(os.path.join(root, f"pwmchip{chip}", f"pwm{channel}", name)) as f:
+            values[name] = int(f.readline())
+    return values
+
+
+PWM_BACKENDS = ("soft", "engine", "sysfs", "sysfs+engine")
+
+
+def load_pwm_backend(gpio, name=None, channels=None, root=None):
+    """Return gpio with its PWM() on the named output backend.
+
+    "soft" returns gpio unchanged. "engine" puts every PWM pin on one
+    SoftPWMEngine writing pins in batches. "sysfs" drives the pins in
+    channels (BCM pin -> (pwmchip, channel)) through kernel PWM under root
+    and leaves the rest on soft PWM, "sysfs+engine" on the engine. With the
+    simulated GPIO and no root given, a fake tree in a temporary directory
+    stands in for /sys/class/pwm.
+    """
+    name = (name or PWM_BACKEND).lower()
+    if name not in PWM_BACKENDS:
+        raise ValueError(f"Unknown PWM backend: {name!r} (expected one of {', '.join(PWM_BACKENDS)})")
+    channels = channels or {}
+    simulated = isinstance(gpio, SimulatedGPIO)
+    wrapped = gpio
+    if name.endswith("engine"):
+        write_pins = load_pin_writer(gpio, "sim" if simulated else "pi")
+        wrapped = EnginePWMGPIO(gpio, SoftPWMEngine(write_pins))
+    if name.startswith("sysfs"):
+        if root is None:
+            if simulated and "STREETLIGHT_SYSFS_PWM_ROOT" not in os.environ:
+                root = create_fake_sysfs_pwm(tempfile.mkdtemp(prefix="sysfs_pwm_"), channels.values())
+            else:
+                root = SYSFS_PWM_ROOT
+        wrapped = SysfsPWMGPIO(wrapped, channels, root)
+    return wrapped
+
+
+def load_hardware(name=None):
+    """Return (gpio, bus) for the named hardware backend.
+
+    "pi" imports RPi.GPIO and smbus2 and opens the real I2C bus; "sim"
+    returns the in-memory drivers above. The import is deferred so the
+    simulated backend works on machines without the Pi libraries.
+    """
+    name = (name or HARDWARE_BACKEND).lower()
+    if name == "pi":
+        import RPi.GPIO as GPIO
+        import smbus2 as smbus
+        return GPIO, smbus.SMBus(I2C_BUS_NUMBER)
+    if name == "sim":
+        return SimulatedGPIO(), SimulatedSMBus(I2C_BUS_NUMBER)
+    raise ValueError(f"Unknown hardware backend: {name!r} (expected 'pi' or 'sim')")
@@ -0,0 +1,179 @@
+"""Bounded in-memory sensor history for the /history endpoint.
+
+Every monitoring loop iteration records one sample per signal (ambient
+light, motion flags, the duty cycles of the pole's own LEDs). Each signal
+keeps three preallocated ring buffers:
+
+    raw     the last RAW_CAPACITY samples as recorded
+    minute  1-minute min/max/mean rollups covering two days
+    hour    1-hour min/max/mean rollups covering a month
+
+Nothing grows after start-up, so memory stays fixed on the Pi (about 200 KB
+per signal, which is why luminaires added to a fleet get no duty history),
+while the dashboard can still chart the last day from the minute rollups.
+Queries binary-search the ring for the requested time range and only read
+the samples inside it.
+"""
+
+import threading
+from array import array
+
+# Samples kept per signal at each resolution
+RAW_CAPACITY = 3600          # At one sample per loop iteration, about an hour
+MINUTE_CAPACITY = 2 * 1440   # Two days of 1-minute rollups
+HOUR_CAPACITY = 31 * 24      # A month of 1-hour rollups
+
+RESOLUTIONS = ("raw", "minute", "hour")
+BUCKET_SECONDS = {"minute": 60, "hour": 3600}
+
+
+class RingBuffer:
+    """Fixed-capacity columns of float samples, oldest overwritten first.
+
+    Rows are ordered by their first column (a timestamp), which must be
+    appended in non-decreasing order.
+    """
+
+    def __init__(self, capacity, columns):
+        self.capacity = capacity
+        self.columns = [array('d', bytes(8 * capacity)) for _ in range(columns)]
+        self.start = 0   # Physical position of the oldest row
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _physical(self, logical):
+        return (self.start + logical) % self.capacity
+
+    def append(self, *values):
+        if self.count < self.capacity:
+            pos = self._physical(self.count)
+            self.count += 1
+        else:
+            pos = self.start
+            self.start = (self.start + 1) % self.capacity
+        for column, value in zip(self.columns, values):
+            column[pos] = value
+
+    def last(self):
+        """Physical position of the newest row, or None when empty."""
+        return self._physical(self.count - 1) if self.count else None
+
+    def bisect(self, t, right=False):
+        """Logical index of the first row with timestamp >= t (> t if right)."""
+        times = self.columns[0]
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = times[self._physical(mid)]
+            if value < t or (right and value == t):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def rows(self, start_time, end_time):
+        """Rows with start_time <= timestamp <= end_time, oldest first."""
+        first = self.bisect(start_time)
+        last = self.bisect(end_time, right=True)
+        columns = self.columns
+        result = []
+        for logical in range(first, last):
+            pos = self._physical(logical)
+            result.append([column[pos] for column in columns])
+        return result
+
+
+class Rollup:
+    """min/max/mean per fixed-width time bucket, kept in a RingBuffer."""
+
+    def __init__(self, bucket_seconds, capacity):
+        self.bucket_seconds = bucket_seconds
+        # Columns: bucket start, min, max, sum, count
+        self.buffer = RingBuffer(capacity, 5)
+
+    def add(self, t, value):
+        bucket = t - (t % self.bucket_seconds)
+        buffer = self.buffer
+        pos = buffer.last()
+        starts, mins, maxs, sums, counts = buffer.columns
+        if pos is not None and starts[pos] == bucket:
+            if value < mins[pos]:
+                mins[pos] = value
+            if value > maxs[pos]:
+                maxs[pos] = value
+            sums[pos] += value
+            counts[pos] += 1
+        else:
+            buffer.append(bucket, value, value, value, 1)
+
+    def rows(self, start_time, end_time):
+        """[bucket start, min, max, mean] for buckets overlapping the range."""
+        first_bucket = start_time - (start_time % self.bucket_seconds)
+        return [[start, low, high, total / count]
+                for start, low, high, total, count in self.buffer.rows(first_bucket, end_time)]
+
+
+class SignalHistory:
+    def __init__(self, raw_capacity=RAW_CAPACITY, minute_capacity=MINUTE_CAPACITY, hour_capacity=HOUR_CAPACITY):
+        self.raw = RingBuffer(raw_capacity, 2)
+        self.minute = Rollup(BUCKET_SECONDS["minute"], minute_capacity)
+        self.hour = Rollup(BUCKET_SECONDS["hour"], hour_capacity)
+
+    def add(self, t, value):
+        self.raw.append(t, value)
+        self.minute.add(t, value)
+        self.hour.add(t, value)
+
+    def oldest_raw(self):
+        if not self.raw.count:
+            return None
+        return self.raw.columns[0][self.raw.start]
+
+    def rows(self, resolution, start_time, end_time):
+        if resolution == "raw":
+            return self.raw.rows(start_time, end_time)
+        return getattr(self, resolution).rows(start_time, end_time)
+
+
+class History:
+    """Per-signal histories, created on first record of each signal."""
+
+    def __init__(self, **capacities):
+        self._capacities = capacities
+        self._signals = {}
+        self._lock = threading.Lock()
+
+    def signals(self):
+        with self._lock:
+            return sorted(self._signals)
+
+    def record(self, t, values):
+        """Record {signal: value} samples taken at time t."""
+        with self._lock:
+            for name, value in values.items():
+                signal = self._signals.get(name)
+                if signal is None:
+                    signal = self._signals[name] = SignalHistory(**self._capacities)
+                signal.add(t, float(value))
+
+    def query(self, name, start_time, end_time, resolution="auto"):
+        """Return (resolution used, rows) for one signal. Raises KeyError for unknown signals.
+
+        "auto" picks raw samples if they still cover start_time, then minute
+        rollups for spans up to two days, then hourly rollups.
+        """
+        with self._lock:
+            signal = self._signals[name]
+            if resolution == "auto":
+                oldest = signal.oldest_raw()
+                if oldest is not None and oldest <= start_time:
+                    resolution = "raw"
+                elif end_time - start_time <= 2 * 86400:
+                    resolution = "minute"
+                else:
+                    resolution = "hour"
+            elif resolution not in RESOLUTIONS:
+                raise ValueError(f"Unknown resolution: {resolution}")
+            return resolution, signal.rows(resolution, start_time, end_time)
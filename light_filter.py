@@ -0,0 +1,79 @@
+"""Filters applied to TCS34725 clear readings before they are classified.
+
+A single noisy reading near LOW_LIGHT_THRESHOLD or HIGH_LIGHT_THRESHOLD is
+enough to flip the dimming class and start a fade the next reading undoes.
+The monitoring loop therefore passes every successful reading through a
+filter chain first:
+
+    MedianFilter  median of the last N readings; drops isolated spikes
+                  (headlights, a bird on the sensor) entirely
+    EwmaFilter    exponentially weighted moving average; smooths the
+                  remaining jitter, with alpha the weight of the newest
+                  reading (1 disables smoothing)
+
+Both work per reading, not per second: a slower sampling rate makes them
+slower to follow a real change. FilterChain runs filters in order; with no
+filters it passes readings through unchanged.
+"""
+
+import bisect
+import collections
+
+
+class EwmaFilter:
+    def __init__(self, alpha):
+        if not 0 < alpha <= 1:
+            raise ValueError(f"EWMA alpha must be in (0, 1], got {alpha}")
+        self.alpha = alpha
+        self.value = None
+
+    def update(self, reading):
+        if self.value is None:
+            self.value = float(reading)
+        else:
+            self.value += self.alpha * (reading - self.value)
+        return self.value
+
+    def reset(self):
+        self.value = None
+
+
+class MedianFilter:
+    def __init__(self, window):
+        if window < 1:
+            raise ValueError(f"Median window must be at least 1, got {window}")
+        self.window = window
+        self._recent = collections.deque()  # Readings in arrival order
+        self._sorted = []                   # The same readings, sorted
+
+    def update(self, reading):
+        if len(self._recent) == self.window:
+            oldest = self._recent.popleft()
+            del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+        self._recent.append(reading)
+        bisect.insort(self._sorted, reading)
+        # Upper median, so an even window never invents a value between two readings
+        return self._sorted[len(self._sorted) // 2]
+
+    def reset(self):
+        self._recent.clear()
+        self._sorted.clear()
+
+
+class FilterChain:
+    def __init__(self, *filters):
+        self.filters = filters
+        self.value = None
+
+    def update(self, reading):
+        """Feed one reading through every filter and return the filtered value."""
+        for stage in self.filters:
+            reading = stage.update(reading)
+        self.value = reading
+        return reading
+
+    def reset(self):
+        """Forget past readings, e.g. after the sensor failed."""
+        for stage in self.filters:
+            stage.reset()
+        self.value = None
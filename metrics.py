@@ -0,0 +1,320 @@
+"""In-process metrics exported on /metrics in Prometheus text format.
+
+Three metric types are supported:
+
+    Counter    monotonically increasing count (GPIO calls, fault transitions)
+    Gauge      a value that goes up and down, optionally read from a callback
+               at scrape time (e.g. the number of fading channels)
+    Histogram  observations counted into fixed buckets, plus their sum and
+               count (loop duration, I2C latency, HTTP handler latency)
+
+Metrics may declare label names; labels() returns the child for one set of
+label values and caches it, so hot paths should look the child up once and
+keep it. Recording is a lock, a bisect and two additions, cheap enough to
+leave on in production. All formatting happens in render(), i.e. only when
+/metrics is scraped.
+"""
+
+import bisect
+import threading
+import time
+
+METRIC_PREFIX = "streetlight_"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Default histogram buckets in seconds, from 100us up to 10s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = METRIC_PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self
+
+    def labels(self, *values):
+        """Return the child metric for these label values (created on first use)."""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self, child):
+        """(suffix, extra label or None, value) triples for one child."""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for values, child in sorted(self._children.items()):
+            for suffix, extra, value in self._samples(child):
+                lines.append(f"{self.name}{suffix}{_label_text(self.labelnames, values, extra)} "
+                             f"{_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.value = 0
+        super().__init__(name + "_total", documentation, labelnames)
+
+    def _new_child(self):
+        child = Counter.__new__(Counter)
+        child.value = 0
+        child._lock = threading.Lock()
+        return child
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def _samples(self, child):
+        return (("", None, child.value),)
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.value = 0
+        self._function = None
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        child = Gauge.__new__(Gauge)
+        child.value = 0
+        child._function = None
+        return child
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set_function(self, function):
+        """Read the value from function() whenever metrics are rendered."""
+        self._function = function
+
+    def get(self):
+        return self._function() if self._function is not None else self.value
+
+    def _samples(self, child):
+        return (("", None, child.get()),)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._reset()
+        super().__init__(name, documentation, labelnames)
+
+    def _reset(self):
+        # One count per bucket plus the +Inf overflow; cumulated in render()
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def _new_child(self):
+        child = Histogram.__new__(Histogram)
+        child.buckets = self.buckets
+        child._lock = threading.Lock()
+        child._reset()
+        return child
+
+    def observe(self, value):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """Context manager observing the duration of its body in seconds."""
+        return _Timer(self)
+
+    def _samples(self, child):
+        with child._lock:
+            counts, total, count = list(child.counts), child.sum, child.count
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip(child.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            samples.append(("_bucket", ("le", _format_value(float(bound))), cumulative))
+        samples.append(("_sum", None, total))
+        samples.append(("_count", None, count))
+        return samples
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Every registered metric in Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class InstrumentedGPIO:
+    """Wraps a GPIO module so every input/output/PWM write is counted.
+
+    Counts go to counter, labelled by operation ("input", "output",
+    "pwm_duty"). Everything else is passed through to the wrapped module.
+    """
+
+    def __init__(self, gpio, counter):
+        self._gpio = gpio
+        self._counter = counter
+        self._input_calls = counter.labels("input")
+        self._output_calls = counter.labels("output")
+
+    def __getattr__(self, name):
+        return getattr(self._gpio, name)
+
+    def input(self, pin):
+        self._input_calls.inc()
+        return self._gpio.input(pin)
+
+    def output(self, pin, value):
+        self._output_calls.inc()
+        return self._gpio.output(pin, value)
+
+    def PWM(self, pin, frequency):
+        return InstrumentedPWM(self._gpio.PWM(pin, frequency), self._counter.labels("pwm_duty"))
+
+
+class InstrumentedPWM:
+    """Wraps a PWM channel so every duty cycle write is counted."""
+
+    def __init__(self, pwm, calls):
+        self._pwm = pwm
+        self._calls = calls
+
+    def __getattr__(self, name):
+        return getattr(self._pwm, name)
+
+    def ChangeDutyCycle(self, duty_cycle):
+        self._calls.inc()
+        return self._pwm.ChangeDutyCycle(duty_cycle)
+
+
+class MetricsMiddleware:
+    """ASGI middleware observing HTTP handler latency into histogram.
+
+    Latency runs until the response headers are sent, so long-lived streams
+    count their setup time only. Requests are labelled with the route
+    template (e.g. "/faults/history") rather than the raw path, keeping the
+    number of series bounded; unmatched paths share one "unmatched" label.
+    labels, if given, are label values put ahead of method, route and status.
+    """
+
+    def __init__(self, app, histogram, labels=()):
+        self.app = app
+        self.histogram = histogram
+        self.labels = tuple(labels)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        observed = False
+
+        def observe(status):
+            nonlocal observed
+            if observed:
+                return
+            observed = True
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            self.histogram.labels(*self.labels, scope["method"], path, status).observe(time.perf_counter() - start)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                observe(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            observe(500)
+            raise
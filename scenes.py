@@ -0,0 +1,77 @@
+"""Named lighting scenes, stored server-side in a JSON file.
+
+A scene is a list of LED commands ({"channel", "duty", "fade_time"}, as
+accepted by POST /leds) saved under a name, so a whole street can be
+switched with one call to POST /scenes/{name}/apply. The store only keeps
+the commands; backend.py validates them when a scene is saved and applies
+them through the monitoring loop like any other bulk command.
+
+Every change rewrites the whole file through a temporary file and
+os.replace(), so a crash never leaves a half-written file behind. Scenes are
+few and small; reads are served from memory.
+"""
+
+import json
+import os
+import threading
+
+from async_logging import get_logger
+
+api_log = get_logger("api")
+
+SCENES_FILE = "scenes.json"
+
+
+class SceneStore:
+    def __init__(self, path=SCENES_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._scenes = {}  # name -> list of command dicts
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                scenes = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            api_log.error(f"Could not read scenes from {self.path}: {e}")
+            return
+        if isinstance(scenes, dict):
+            self._scenes = scenes
+
+    def _save(self, scenes):
+        # Caller holds _lock; memory only changes once the file has
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(scenes, f, indent=2, sort_keys=True)
+        os.replace(temporary, self.path)
+        self._scenes = scenes
+
+    def names(self):
+        with self._lock:
+            return sorted(self._scenes)
+
+    def get(self, name):
+        """The commands of scene name. Raises KeyError for an unknown scene."""
+        with self._lock:
+            return [dict(command) for command in self._scenes[name]]
+
+    def all(self):
+        with self._lock:
+            return {name: [dict(command) for command in commands] for name, commands in self._scenes.items()}
+
+    def put(self, name, commands):
+        """Save (or replace) scene name. Returns True if it replaced an existing scene."""
+        with self._lock:
+            replaced = name in self._scenes
+            self._save({**self._scenes, name: [dict(command) for command in commands]})
+        return replaced
+
+    def delete(self, name):
+        """Remove scene name. Raises KeyError for an unknown scene."""
+        with self._lock:
+            scenes = dict(self._scenes)
+            del scenes[name]
+            self._save(scenes)
@@ -0,0 +1,120 @@
+"""Binary trace of the sensor readings the monitoring loop acts on.
+
+With STREETLIGHT_TRACE=<file> set, every control_iteration() appends one
+fixed-width record to a memory-mapped file, after the loop has acted on it:
+
+    time       f64  clock() of the iteration
+    pir_time   f64  latest PIR edge (last_pir_detection_time)
+    ir_time    f64  latest IR edge (last_ir_detection_time)
+    clear      u16  raw clear count of the latest TCS34725 reading
+    flags      u8   TRACE_* bits: PIR and IR levels as read, LED2's
+                    detection level, whether the sensor was read, whether
+                    the iteration was skipped (delayed response)
+    mode       u8   fault mode number
+
+That is everything the dimming and fault decisions depend on apart from
+manual LED commands, which are not recorded. Appending a record is two
+struct.pack_into() calls into the mapping, with no system call; the kernel
+writes the dirty pages back in the background. The file grows
+TRACE_GROW_RECORDS records at a time and is truncated to its records on
+close(). The record count in the header is updated after each record, so a
+trace cut short by a crash or power loss reads back up to its last whole
+record. Starting again with the same file appends to it; a file that is
+not a trace is refused with ValueError rather than overwritten.
+
+read_trace() returns the records. benchmarks/bench_replay.py feeds a trace
+back through the control logic on simulated hardware.
+"""
+
+import mmap
+import os
+import struct
+from typing import NamedTuple
+
+# Trace file, or None to record nothing
+SENSOR_TRACE_FILE = os.environ.get("STREETLIGHT_TRACE")
+
+# Records the file grows by when full (32 bytes each, so 2 MiB: 18 hours of
+# one iteration per second)
+TRACE_GROW_RECORDS = 65536
+
+TRACE_MAGIC = b"SLTRACE1"
+TRACE_VERSION = 1
+
+# Flag bits
+TRACE_PIR = 0x01            # PIR output HIGH (motion)
+TRACE_IR = 0x02             # IR output HIGH (no object)
+TRACE_LED2 = 0x04           # LED2's detection pin HIGH
+TRACE_SENSOR_READ = 0x08    # The TCS34725 was read this iteration
+TRACE_SKIPPED = 0x10        # Iteration skipped by the delayed response fault
+
+# magic, version, record size, record count
+_HEADER = struct.Struct("<8sIIQ8x")
+_COUNT = struct.Struct("<Q")
+_COUNT_OFFSET = 16
+_RECORD = struct.Struct("<dddHBB4x")
+
+
+class TraceRecord(NamedTuple):
+    time: float
+    pir_time: float
+    ir_time: float
+    clear: int
+    flags: int
+    mode: int
+
+
+class TraceRecorder:
+    """Appends TraceRecords to a memory-mapped file. Monitoring loop thread only."""
+
+    def __init__(self, path=SENSOR_TRACE_FILE, grow_records=TRACE_GROW_RECORDS):
+        self.path = path
+        self.grow_bytes = grow_records * _RECORD.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        size = os.fstat(self._fd).st_size
+        self.count = 0
+        if size:
+            header = os.pread(self._fd, _HEADER.size, 0)
+            if len(header) < _HEADER.size or _HEADER.unpack(header)[:3] != (TRACE_MAGIC, TRACE_VERSION,
+                                                                              _RECORD.size):
+                # Never truncate a file that is not ours (a mistyped STREETLIGHT_TRACE)
+                os.close(self._fd)
+                raise ValueError(f"{path} exists and is not a version {TRACE_VERSION} sensor trace")
+            # Continue an earlier trace, dropping a torn last record
+            count = _HEADER.unpack(header)[3]
+            self.count = min(count, (size - _HEADER.size) // _RECORD.size)
+        end = _HEADER.size + self.count * _RECORD.size
+        os.ftruncate(self._fd, end + self.grow_bytes)
+        self._mm = mmap.mmap(self._fd, end + self.grow_bytes)
+        _HEADER.pack_into(self._mm, 0, TRACE_MAGIC, TRACE_VERSION, _RECORD.size, self.count)
+
+    def record(self, time, pir_time, ir_time, clear, flags, mode):
+        offset = _HEADER.size + self.count * _RECORD.size
+        if offset + _RECORD.size > len(self._mm):
+            self._mm.resize(len(self._mm) + self.grow_bytes)
+        _RECORD.pack_into(self._mm, offset, time, pir_time, ir_time, clear, flags, mode)
+        self.count += 1
+        _COUNT.pack_into(self._mm, _COUNT_OFFSET, self.count)
+
+    def flush(self):
+        self._mm.flush()
+
+    def close(self):
+        self._mm.flush()
+        self._mm.close()
+        os.ftruncate(self._fd, _HEADER.size + self.count * _RECORD.size)
+        os.close(self._fd)
+
+
+def read_trace(path):
+    """Return the TraceRecords of a trace file. Raises ValueError if it is not one."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < _HEADER.size:
+        raise ValueError(f"{path} is too short for a sensor trace")
+    magic, version, record_size, count = _HEADER.unpack_from(data)
+    if magic != TRACE_MAGIC or version != TRACE_VERSION or record_size != _RECORD.size:
+        raise ValueError(f"{path} is not a version {TRACE_VERSION} sensor trace")
+    count = min(count, (len(data) - _HEADER.size) // _RECORD.size)
+    end = _HEADER.size + count * _RECORD.size
+    return [TraceRecord(*fields) for fields in _RECORD.iter_unpack(data[_HEADER.size:end])]
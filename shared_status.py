@@ -0,0 +1,168 @@
+"""Published status in a shared memory segment, for API worker processes.
+
+In split mode (control_process.py plus api_worker.py) the control process
+owns the hardware. Every status it publishes is copied into a
+multiprocessing.shared_memory segment, and any number of API workers read
+it from there without a round trip to the control process.
+
+The segment is a header followed by the status JSON:
+
+    seq      u64  seqlock sequence, odd while a write is in progress
+    boot_id  u64  identifies the control process run (part of the ETag)
+    version  u64  StatusStream sequence number of the status
+    length   u32  payload bytes
+    crc      u32  CRC-32 of the payload
+    pid      u32  the writing control process
+
+There is a single writer and it never waits for readers. A reader copies
+the header and payload, then checks that seq was even and unchanged and
+that the CRC matches; otherwise it retries. Python offers no memory
+barriers, so the CRC is what catches a torn copy on weakly ordered CPUs
+(the Pi's ARM cores).
+
+A writer only replaces an existing segment whose pid no longer runs, so a
+second control process cannot take over from a running one.
+"""
+
+import os
+import struct
+import time
+import zlib
+from multiprocessing import resource_tracker, shared_memory
+
+# Segment name under /dev/shm and its size; a status larger than
+# STATUS_SEGMENT_SIZE minus the header cannot be published
+STATUS_SEGMENT_NAME = os.environ.get("STREETLIGHT_STATUS_SEGMENT", "streetlight_status")
+STATUS_SEGMENT_SIZE = 256 * 1024
+
+# Reads retried this many times while the writer keeps overlapping them
+STATUS_READ_RETRIES = 1000
+
+_HEADER = struct.Struct("<QQQIII4x")
+_SEQ = struct.Struct("<Q")
+_VERSION_OFFSET = 16
+
+
+def _attach(name):
+    """Attach to an existing segment without letting this process unlink it on exit."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 every attaching process registers the segment
+        # with its resource tracker, which unlinks it when the process exits
+        segment = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+
+def _running(pid):
+    """True if pid is another live process."""
+    if not pid or pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedStatusWriter:
+    """Control process side: creates the segment and publishes into it."""
+
+    def __init__(self, name=STATUS_SEGMENT_NAME, size=STATUS_SEGMENT_SIZE, boot_id=0):
+        try:
+            self.segment = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            stale = _attach(name)
+            owner = _HEADER.unpack_from(stale.buf, 0)[5] if stale.size >= _HEADER.size else 0
+            if _running(owner):
+                stale.close()
+                raise FileExistsError(f"Status segment {name} is in use by control process {owner}") from None
+            # Left behind by a control process that did not shut down cleanly
+            stale.close()
+            stale.unlink()
+            self.segment = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = name
+        self.capacity = self.segment.size - _HEADER.size
+        self.boot_id = boot_id
+        self.pid = os.getpid()
+        self.seq = 0
+        self.writes = 0
+        self.write(0, b"{}")
+
+    def write(self, version, body):
+        """Publish body (status JSON bytes) as version. Raises ValueError if it does not fit."""
+        if len(body) > self.capacity:
+            raise ValueError(f"Status of {len(body)} bytes exceeds the {self.capacity} byte segment")
+        buf = self.segment.buf
+        self.seq += 1  # Odd: readers retry until the write is done
+        _HEADER.pack_into(buf, 0, self.seq, self.boot_id, version, len(body), zlib.crc32(body), self.pid)
+        buf[_HEADER.size:_HEADER.size + len(body)] = body
+        self.seq += 1
+        _SEQ.pack_into(buf, 0, self.seq)
+        self.writes += 1
+
+    def close(self):
+        # Only remove the segment we created, not one that has replaced it since
+        try:
+            ours = os.stat(os.path.join("/dev/shm", self.segment.name)).st_ino == os.fstat(self.segment._fd).st_ino
+        except FileNotFoundError:
+            ours = False
+        self.segment.close()
+        if ours:
+            self.segment.unlink()
+        else:
+            # Or the resource tracker would unlink the replacement when we exit
+            resource_tracker.unregister(self.segment._name, "shared_memory")
+
+
+class SharedStatusReader:
+    """API worker side: reads the latest published status."""
+
+    def __init__(self, name=STATUS_SEGMENT_NAME):
+        self.segment = _attach(name)
+        self.capacity = self.segment.size - _HEADER.size
+        self.retries = 0
+        self._cached = None  # (boot id, version, body) of the last read
+
+    def stale(self):
+        """True once the control process has been restarted (or stopped) and replaced the segment."""
+        try:
+            current = os.stat(os.path.join("/dev/shm", self.segment.name)).st_ino
+        except FileNotFoundError:
+            return True
+        # The descriptor stays open for as long as the mapping exists
+        return current != os.fstat(self.segment._fd).st_ino
+
+    def version(self):
+        """Version of the current status (one 8-byte read; may be mid-write)."""
+        return _SEQ.unpack_from(self.segment.buf, _VERSION_OFFSET)[0]
+
+    def read(self):
+        """Return (boot id, version, status JSON bytes).
+
+        Raises TimeoutError if every attempt overlapped a write.
+        """
+        buf = self.segment.buf
+        cached = self._cached
+        for _ in range(STATUS_READ_RETRIES):
+            seq, boot_id, version, length, crc, _ = _HEADER.unpack_from(buf, 0)
+            if seq & 1 or length > self.capacity:
+                self.retries += 1
+                time.sleep(0)
+                continue
+            if cached is not None and cached[:2] == (boot_id, version) and _SEQ.unpack_from(buf, 0)[0] == seq:
+                # Unchanged since the last read; skip the copy
+                return cached
+            body = bytes(buf[_HEADER.size:_HEADER.size + length])
+            if _SEQ.unpack_from(buf, 0)[0] == seq and zlib.crc32(body) == crc:
+                self._cached = (boot_id, version, body)
+                return self._cached
+            self.retries += 1
+            time.sleep(0)
+        raise TimeoutError("Status segment stayed busy")
+
+    def close(self):
+        self.segment.close()
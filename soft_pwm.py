@@ -0,0 +1,303 @@
+"""Software PWM for many pins from a single timing thread.
+
+RPi.GPIO's software PWM gives every channel its own thread, each sleeping
+to its own two edges every period. SoftPWMEngine drives all of its channels
+from one shared period instead, using a precomputed edge schedule:
+
+    period start   one batched write switches on every channel between 0
+                   and 100% duty
+    edges          channels switch off in duty order, one batched write per
+                   distinct off time
+
+The schedule is rebuilt only when a duty cycle changes. It takes effect at
+the next period boundary, so no period is cut short. Off times closer than
+the merge window share an edge at the earliest of them, because the thread
+cannot sleep more precisely than that. By default the engine measures how
+far time.sleep() overshoots when its thread starts and uses that, but never
+less than EDGE_MERGE_WINDOW. Merged channels all switch off at the earliest
+of their off times, so the window is also capped at EDGE_MERGE_MAX_FRACTION
+of the period; a measured overshoot above the cap is logged, and edges closer
+than it then land late rather than early. Channels at 0% or 100% need no edges. While no
+channel needs edges, the thread sleeps until a duty cycle changes.
+
+Unlike the C threads behind RPi.GPIO's software PWM, the engine's thread
+runs Python and takes the GIL for every edge, so it competes with the
+monitoring loop and the API handlers. benchmarks/bench_pwm.py measures
+that, next to RPi.GPIO's GPIO.PWM when run on a Pi.
+
+Pins are written through write_pins(set_mask, clear_mask), where bit n is
+GPIO n. On a Pi, hardware.load_pin_writer() returns a writer for the
+GPSET/GPCLR registers, so a batch costs one register write however many pins
+it touches.
+
+The engine records how late each write lands after its deadline. stats()
+reports lateness percentiles along with wakeup, write and overrun counts.
+"""
+
+import collections
+import threading
+import time
+
+from async_logging import get_logger
+
+DEFAULT_FREQUENCY = 1000
+
+# Least merge window (seconds): off times closer than the window share an
+# edge. time.sleep() overshoots by 50-100 us on a Pi and on desktop kernels
+EDGE_MERGE_WINDOW = 100e-6
+
+# Largest merge window, as a fraction of the period: this bounds the duty
+# cycle error of a merged channel (5% at most)
+EDGE_MERGE_MAX_FRACTION = 0.05
+
+# Sleeps timed to measure the overshoot, and the delay each asks for
+SLEEP_CALIBRATION_SAMPLES = 200
+SLEEP_CALIBRATION_DELAY = 50e-6
+
+# Most recent edge lateness samples kept for stats()
+LATENESS_SAMPLES = 4096
+
+hardware_log = get_logger("hardware")
+
+
+def sleep_overshoot(clock=time.perf_counter, sleep=time.sleep, samples=SLEEP_CALIBRATION_SAMPLES,
+                    delay=SLEEP_CALIBRATION_DELAY, fraction=0.9):
+    """Seconds by which sleep(delay) overshoots, at the given percentile of samples."""
+    overshoots = []
+    for _ in range(samples):
+        start = clock()
+        sleep(delay)
+        overshoots.append(clock() - start - delay)
+    overshoots.sort()
+    return max(0.0, overshoots[min(samples - 1, int(fraction * samples))])
+
+
+class SoftPWMChannel:
+    """One pin on a SoftPWMEngine, with the RPi.GPIO PWM interface."""
+
+    def __init__(self, engine, pin):
+        self.engine = engine
+        self.pin = pin
+        self.duty_cycle = 0
+        self.running = False
+        self.write_count = 0
+
+    @property
+    def frequency(self):
+        return self.engine.frequency
+
+    def start(self, duty_cycle):
+        self.running = True
+        self.ChangeDutyCycle(duty_cycle)
+
+    def ChangeDutyCycle(self, duty_cycle):
+        if not 0 <= duty_cycle <= 100:
+            raise ValueError("dutycycle must have a value from 0.0 to 100.0")
+        self.duty_cycle = duty_cycle
+        self.write_count += 1
+        if self.running:
+            self.engine._set_duty(self.pin, duty_cycle)
+
+    def ChangeFrequency(self, frequency):
+        """Change the period shared by every channel on the engine."""
+        self.engine.set_frequency(frequency)
+
+    def stop(self):
+        if self.running:
+            self.running = False
+            self.engine._set_duty(self.pin, None)
+
+
+class SoftPWMEngine:
+    def __init__(self, write_pins, frequency=DEFAULT_FREQUENCY, merge_window=None,
+                 clock=time.perf_counter, sleep=time.sleep):
+        self.write_pins = write_pins
+        self.frequency = frequency
+        # None: measured from sleep overshoot when the thread starts. Capped
+        # at EDGE_MERGE_MAX_FRACTION of the period when the schedule is built
+        self.merge_window = merge_window
+        self.sleep_overshoot = None   # Measured overshoot, if the window came from it
+        self._warned_period = None
+        self.clock = clock
+        self.sleep = sleep
+        self.channels = {}     # pin -> SoftPWMChannel
+        self._duties = {}      # pin -> duty cycle, for running channels
+        self._released = 0     # Pins of stopped channels still to be driven low
+        self._lock = threading.Lock()
+        self._changed = threading.Event()
+        self._stopping = False
+        self._thread = None
+        # Statistics, written by the timing thread only
+        self.periods = 0
+        self.wakeups = 0
+        self.writes = 0
+        self.rebuilds = 0
+        self.overruns = 0
+        self.lateness = collections.deque(maxlen=LATENESS_SAMPLES)
+
+    def channel(self, pin, frequency=None):
+        """Return the channel for pin, creating it on first use.
+
+        All channels share the engine's frequency; passing a different one
+        changes it for all of them.
+        """
+        if frequency is not None and frequency != self.frequency:
+            self.set_frequency(frequency)
+        channel = self.channels.get(pin)
+        if channel is None:
+            channel = self.channels[pin] = SoftPWMChannel(self, pin)
+        return channel
+
+    def set_frequency(self, frequency):
+        if frequency <= 0:
+            raise ValueError("frequency must be greater than 0.0")
+        with self._lock:
+            self.frequency = frequency
+        self._changed.set()
+
+    def _set_duty(self, pin, duty_cycle):
+        with self._lock:
+            if duty_cycle is None:
+                self._duties.pop(pin, None)
+                self._released |= 1 << pin
+            elif self._duties.get(pin) == duty_cycle:
+                return
+            else:
+                self._duties[pin] = duty_cycle
+            if self._thread is None and not self._stopping:
+                self._thread = threading.Thread(target=self._run, name="soft-pwm", daemon=True)
+                self._thread.start()
+        self._changed.set()
+
+    def stop(self):
+        """Stop the timing thread and drive every channel's pin low."""
+        with self._lock:
+            self._stopping = True
+            thread = self._thread
+        self._changed.set()
+        if thread is not None:
+            thread.join()
+        for channel in self.channels.values():
+            channel.running = False
+
+    def _build_schedule(self):
+        """Return (period, first_set, first_clear, edges). Caller holds _lock.
+
+        first_set and first_clear are written at the first period start only:
+        they also cover channels at 100% and 0% and stopped channels. edges
+        is [(offset, off mask)], sorted by offset.
+        """
+        period = 1.0 / self.frequency
+        window = self._merge_window(period)
+        first_set, first_clear = 0, self._released
+        offs = []
+        for pin, duty_cycle in self._duties.items():
+            bit = 1 << pin
+            if duty_cycle <= 0:
+                first_clear |= bit
+            else:
+                first_set |= bit
+                if duty_cycle < 100:
+                    offs.append((period * duty_cycle / 100, bit))
+        self._released = 0
+        offs.sort()
+        edges = []
+        for offset, bit in offs:
+            if edges and offset - edges[-1][0] < window:
+                edges[-1][1] |= bit
+            else:
+                edges.append([offset, bit])
+        return period, first_set, first_clear & ~first_set, [tuple(edge) for edge in edges]
+
+    def _merge_window(self, period):
+        """The merge window for period, capped. Caller holds _lock."""
+        cap = period * EDGE_MERGE_MAX_FRACTION
+        if self.sleep_overshoot is not None and self.sleep_overshoot > cap and self._warned_period != period:
+            self._warned_period = period
+            hardware_log.warning(f"Sleep overshoots by {self.sleep_overshoot * 1e6:.0f}us, more than the "
+                                 f"{cap * 1e6:.0f}us soft PWM edge merge window allows at {1 / period:g} Hz; "
+                                 "edges closer than that will land late.")
+        return min(self.merge_window, cap)
+
+    def _calibrate(self):
+        """Set the merge window from measured sleep overshoot, unless one was given."""
+        if self.merge_window is not None:
+            return
+        overshoot = sleep_overshoot(self.clock, self.sleep)
+        with self._lock:
+            self.sleep_overshoot = overshoot
+            self.merge_window = max(EDGE_MERGE_WINDOW, overshoot)
+
+    def _write_at(self, deadline, set_mask, clear_mask):
+        delay = deadline - self.clock()
+        if delay > 0:
+            self.sleep(delay)
+            self.wakeups += 1
+        self.lateness.append(self.clock() - deadline)
+        self.write_pins(set_mask, clear_mask)
+        self.writes += 1
+
+    def _run(self):
+        clock = self.clock
+        self._calibrate()
+        start = clock()
+        driven = 0  # Every pin the engine may have set
+        while True:
+            self._changed.clear()
+            with self._lock:
+                if self._stopping:
+                    break
+                period, set_mask, clear_mask, edges = self._build_schedule()
+            self.rebuilds += 1
+            driven |= set_mask
+            on_mask = 0
+            for _, mask in edges:
+                on_mask |= mask
+            if not edges:
+                # Nothing to toggle: set the levels once and wait for a change
+                if set_mask or clear_mask:
+                    self.write_pins(set_mask, clear_mask)
+                    self.writes += 1
+                self._changed.wait()
+                start = clock()
+                continue
+            # Apply the new schedule from the next period boundary on
+            self._write_at(start, set_mask, clear_mask)
+            while True:
+                for offset, mask in edges:
+                    self._write_at(start + offset, 0, mask)
+                self.periods += 1
+                start += period
+                now = clock()
+                if now - start > period:
+                    # More than a period behind: skip ahead instead of bursting to catch up
+                    self.overruns += 1
+                    start = now
+                if self._changed.is_set():
+                    break
+                self._write_at(start, on_mask, 0)
+        if driven:
+            self.write_pins(0, driven)
+
+    def stats(self):
+        """Channel, period, wakeup, write and overrun counts, plus merge window and edge lateness in us."""
+        ordered = sorted(self.lateness.copy())
+
+        def percentile(fraction):
+            if not ordered:
+                return 0.0
+            return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1e6
+
+        return {
+            "channels": sum(channel.running for channel in self.channels.values()),
+            "frequency": self.frequency,
+            "periods": self.periods,
+            "wakeups": self.wakeups,
+            "writes": self.writes,
+            "rebuilds": self.rebuilds,
+            "overruns": self.overruns,
+            "merge_window_us": min(self.merge_window or 0.0, EDGE_MERGE_MAX_FRACTION / self.frequency) * 1e6,
+            "lateness_p50_us": percentile(0.5),
+            "lateness_p99_us": percentile(0.99),
+            "lateness_max_us": ordered[-1] * 1e6 if ordered else 0.0,
+        }
@@ -25,11 +25,14 @@ import SystemStatus from "./components/SystemStatus";
 import LEDControls from "./components/LEDControls";
 import Notifications from "./components/Notifications";
 
+// Live status pushed by the backend
+import useStatus from "./hooks/useStatus";
+
 // Import BACKEND_URL from config
 import BACKEND_URL from "./config";
 
 function App() {
-  const [status, setStatus] = useState(null);
+  const { status, loading, error, isBackendDown, fetchStatus } = useStatus();
   const [responseMessage, setResponseMessage] = useState("");
   const [responseSeverity, setResponseSeverity] = useState("success");
   const [openSnackbar, setOpenSnackbar] = useState(false);
@@ -41,9 +44,7 @@ function App() {
     LED2: false,
     LED3: false,
   });
-  const [loading, setLoading] = useState(false);
   const [darkMode, setDarkMode] = useState(false);
-  const [isBackendDown, setIsBackendDown] = useState(false);
 
   const theme = createTheme({
     palette: {
@@ -57,46 +58,35 @@ function App() {
     },
   });
 
-  // Fetch status from the backend on initial load and periodically
+  // Keep the LED switches in sync with the streamed status
   useEffect(() => {
-    fetchStatus();
-    const interval = setInterval(fetchStatus, 5000); // Refresh every 5 seconds
-    return () => clearInterval(interval);
-  }, []);
-
-  const fetchStatus = async () => {
-    setLoading(true);
-    try {
-      const response = await axios.get(`${BACKEND_URL}/status`);
-      console.log("Backend response data:", response.data); // Log the response data
-      setStatus(response.data);
-      setIsBackendDown(false); // Backend is up
-
-      // Update LED controls based on status data
+    if (status) {
       setLedControls({
-        PIR: response.data.current_duty?.PIR > 0,
-        IR: response.data.current_duty?.IR > 0,
-        TCS: response.data.current_duty?.TCS > 0,
-        LED1: response.data.current_duty?.LED1 > 0,
-        LED2: response.data.LED2_state, // Use 'LED2_state' from backend response
-        LED3: response.data.current_duty?.LED3 > 0,
+        PIR: status.current_duty?.PIR > 0,
+        IR: status.current_duty?.IR > 0,
+        TCS: status.current_duty?.TCS > 0,
+        LED1: status.current_duty?.LED1 > 0,
+        LED2: status.LED2_state, // Use 'LED2_state' from backend response
+        LED3: status.current_duty?.LED3 > 0,
       });
-    } catch (error) {
-      console.error("Error fetching status:", error);
-      setResponseMessage("Failed to fetch status.");
+    }
+  }, [status]);
+
+  // Surface lost connections to the backend
+  useEffect(() => {
+    if (error) {
+      setResponseMessage(error);
       setResponseSeverity("error");
       setOpenSnackbar(true);
-      setIsBackendDown(true); // Backend is down
-      setStatus(null); // Clear previous status
+    }
+    if (isBackendDown) {
       // Set LED2 to off if backend is down
       setLedControls((prev) => ({
         ...prev,
         LED2: false,
       }));
-    } finally {
-      setLoading(false);
     }
-  };
+  }, [error, isBackendDown]);
 
   const toggleLed = async (ledName) => {
     const newState = !ledControls[ledName];
@@ -1,62 +1,52 @@
 // src/components/FaultsPage.js
 
-import React, { useEffect, useState, useRef } from "react";
+import React, { useEffect, useState, useCallback } from "react";
+import axios from "axios";
 import { Card, CardContent, Typography, Grid, Button, Chip, Divider } from "@mui/material";
 import { Error } from "@mui/icons-material";
+import BACKEND_URL from "../config";
+
+// Fault transitions fetched per page from /faults/history
+const HISTORY_PAGE_SIZE = 30;
 
 function FaultsPage({ status, isBackendDown }) {
   const [faultHistory, setFaultHistory] = useState([]);
-  const previousFaultsRef = useRef([]);
+  const [nextBefore, setNextBefore] = useState(null);
 
-  // Load fault history from localStorage on component mount
-  useEffect(() => {
-    const storedHistory = localStorage.getItem("faultHistory");
-    if (storedHistory) {
-      setFaultHistory(JSON.parse(storedHistory));
+  // Load the newest page of the persistent fault log
+  const loadFaultHistory = useCallback(async () => {
+    try {
+      const response = await axios.get(`${BACKEND_URL}/faults/history`, {
+        params: { limit: HISTORY_PAGE_SIZE },
+      });
+      setFaultHistory(response.data.events);
+      setNextBefore(response.data.next_before);
+    } catch (error) {
+      console.error("Error fetching fault history:", error);
     }
   }, []);
 
-  // Effect to detect and log new faults
-  useEffect(() => {
-    const currentFaults = getFaults(status, isBackendDown);
-    const previousFaults = previousFaultsRef.current;
-
-    // Identify new faults
-    const newFaults = currentFaults.filter(
-      (fault) =>
-        !previousFaults.some(
-          (pf) => pf.name === fault.name && pf.type === fault.type && pf.timestamp === fault.timestamp
-        )
-    );
-
-    if (newFaults.length > 0) {
-      const timestamp = new Date().toLocaleString();
-      const newEntries = newFaults.map((fault) => ({
-        name: fault.name,
-        description: fault.description,
-        type: fault.type,
-        timestamp,
-      }));
-
-      // Append new faults to the existing history
-      setFaultHistory((prevHistory) => {
-        const updatedHistory = [...prevHistory, ...newEntries];
-        // Persist to localStorage
-        localStorage.setItem("faultHistory", JSON.stringify(updatedHistory));
-        return updatedHistory;
+  // Append the next (older) page
+  const loadOlderFaults = async () => {
+    try {
+      const response = await axios.get(`${BACKEND_URL}/faults/history`, {
+        params: { limit: HISTORY_PAGE_SIZE, before: nextBefore },
       });
+      setFaultHistory((prevHistory) => [...prevHistory, ...response.data.events]);
+      setNextBefore(response.data.next_before);
+    } catch (error) {
+      console.error("Error fetching fault history:", error);
     }
-
-    // Update previous faults reference for next comparison
-    previousFaultsRef.current = currentFaults;
-  }, [status, isBackendDown]);
-
-  // Function to clear fault history
-  const clearFaultHistory = () => {
-    setFaultHistory([]);
-    localStorage.removeItem("faultHistory");
   };
 
+  // Refresh the log whenever the set of active faults changes
+  const faultsKey = JSON.stringify(status?.faults ?? null);
+  useEffect(() => {
+    if (!isBackendDown) {
+      loadFaultHistory();
+    }
+  }, [faultsKey, isBackendDown, loadFaultHistory]);
+
   return (
     <div style={{ padding: "20px" }}>
       <Typography variant="h4" gutterBottom>
@@ -110,23 +100,25 @@ function FaultsPage({ status, isBackendDown }) {
       {faultHistory.length > 0 ? (
         <>
           <Grid container spacing={3}>
-            {faultHistory
-              .slice()
-              .reverse()
-              .map((fault, index) => (
-                <Grid item xs={12} sm={6} md={4} key={`history-${index}`}>
-                  <Card variant="outlined" style={{ borderColor: "red" }}>
+            {faultHistory.map((event) => {
+              const fault = describeFault(event.fault);
+              return (
+                <Grid item xs={12} sm={6} md={4} key={`history-${event.id}`}>
+                  <Card
+                    variant="outlined"
+                    style={{ borderColor: event.active ? "red" : "green" }}
+                  >
                     <CardContent style={{ textAlign: "center" }}>
-                      <Error fontSize="large" color="error" />
+                      <Error fontSize="large" color={event.active ? "error" : "success"} />
                       <Typography variant="h6" style={{ marginTop: "10px" }}>
-                        {fault.name} Fault
+                        {fault.name} Fault {event.active ? "Raised" : "Cleared"}
                       </Typography>
                       <Typography variant="body2" color="text.secondary">
                         {fault.description}
                       </Typography>
                       <Chip
                         label={fault.type}
-                        color="error"
+                        color={event.active ? "error" : "success"}
                         size="small"
                         style={{ marginTop: "5px" }}
                       />
@@ -135,21 +127,24 @@ function FaultsPage({ status, isBackendDown }) {
                         color="text.secondary"
                         style={{ display: "block", marginTop: "10px" }}
                       >
-                        Occurred on: {fault.timestamp}
+                        Occurred on: {new Date(event.ts * 1000).toLocaleString()}
                       </Typography>
                     </CardContent>
                   </Card>
                 </Grid>
-              ))}
+              );
+            })}
           </Grid>
-          <Button
-            variant="contained"
-            color="secondary"
-            onClick={clearFaultHistory}
-            style={{ marginTop: "20px" }}
-          >
-            Clear Fault History
-          </Button>
+          {nextBefore !== null && (
+            <Button
+              variant="contained"
+              color="secondary"
+              onClick={loadOlderFaults}
+              style={{ marginTop: "20px" }}
+            >
+              Load Older Faults
+            </Button>
+          )}
         </>
       ) : (
         <Typography
@@ -180,59 +175,7 @@ function getFaults(status, isBackendDown) {
 
     Object.keys(faultEntries).forEach((key) => {
       if (faultEntries[key]) {
-        let faultName = "";
-        let faultDescription = "";
-        let faultType = "Actual"; // Default to Actual
-
-        switch (key) {
-          case "PIR_Sensor_Failure":
-            faultName = "PIR Sensor";
-            faultDescription = "PIR Sensor Failure Detected.";
-            break;
-          case "IR_Sensor_Failure":
-            faultName = "IR Sensor";
-            faultDescription = "IR Sensor Failure Detected.";
-            break;
-          case "TCS_Sensor_Failure":
-            faultName = "TCS Sensor";
-            faultDescription = "TCS Sensor Failure Detected.";
-            break;
-          case "I2C_Communication_Failure":
-            faultName = "I2C Communication";
-            faultDescription = "I2C Communication Failure Detected.";
-            break;
-          case "Sensor_CrossTalk":
-            faultName = "Sensor Cross-Talk";
-            faultDescription = "Sensor Cross-Talk Detected.";
-            break;
-          case "PIR_LED_Failure":
-            faultName = "PIR LED";
-            faultDescription = "PIR LED Failure Detected.";
-            break;
-          case "IR_LED_Failure":
-            faultName = "IR LED";
-            faultDescription = "IR LED Failure Detected.";
-            break;
-          case "TCS_LED_Failure":
-            faultName = "TCS LED";
-            faultDescription = "TCS LED Failure Detected.";
-            break;
-          case "LED1_Failure":
-          case "LED2_Failure":
-          case "LED3_Failure":
-            faultName = key.replace("_Failure", "");
-            faultDescription = `${faultName} Failure Detected.`;
-            break;
-          default:
-            faultName = key;
-            faultDescription = "Unknown Fault Detected.";
-        }
-
-        faults.push({
-          name: faultName,
-          description: faultDescription,
-          type: faultType,
-        });
+        faults.push(describeFault(key));
       }
     });
   }
@@ -240,4 +183,61 @@ function getFaults(status, isBackendDown) {
   return faults;
 }
 
+// Display name, description and type for a backend fault key
+function describeFault(key) {
+  let faultName = "";
+  let faultDescription = "";
+  let faultType = "Actual"; // Default to Actual
+
+  switch (key) {
+    case "PIR_Sensor_Failure":
+      faultName = "PIR Sensor";
+      faultDescription = "PIR Sensor Failure Detected.";
+      break;
+    case "IR_Sensor_Failure":
+      faultName = "IR Sensor";
+      faultDescription = "IR Sensor Failure Detected.";
+      break;
+    case "TCS_Sensor_Failure":
+      faultName = "TCS Sensor";
+      faultDescription = "TCS Sensor Failure Detected.";
+      break;
+    case "I2C_Communication_Failure":
+      faultName = "I2C Communication";
+      faultDescription = "I2C Communication Failure Detected.";
+      break;
+    case "Sensor_CrossTalk":
+      faultName = "Sensor Cross-Talk";
+      faultDescription = "Sensor Cross-Talk Detected.";
+      break;
+    case "PIR_LED_Failure":
+      faultName = "PIR LED";
+      faultDescription = "PIR LED Failure Detected.";
+      break;
+    case "IR_LED_Failure":
+      faultName = "IR LED";
+      faultDescription = "IR LED Failure Detected.";
+      break;
+    case "TCS_LED_Failure":
+      faultName = "TCS LED";
+      faultDescription = "TCS LED Failure Detected.";
+      break;
+    case "LED1_Failure":
+    case "LED2_Failure":
+    case "LED3_Failure":
+      faultName = key.replace("_Failure", "");
+      faultDescription = `${faultName} Failure Detected.`;
+      break;
+    default:
+      faultName = key;
+      faultDescription = "Unknown Fault Detected.";
+  }
+
+  return {
+    name: faultName,
+    description: faultDescription,
+    type: faultType,
+  };
+}
+
 export default FaultsPage;
@@ -1,9 +1,27 @@
 // src/hooks/useStatus.js
 
-import { useState, useEffect } from "react";
+import { useState, useEffect, useCallback } from "react";
 import axios from "axios";
+import BACKEND_URL from "../config";
 
-const BACKEND_URL = "http://192.168.177.178:8000"; // Replace with your backend URL
+// Apply a delta from /status/stream: nested objects (current_duty, faults, ...)
+// only carry the keys that changed.
+const applyDelta = (status, delta) => {
+  const next = { ...status };
+  Object.entries(delta).forEach(([key, value]) => {
+    if (
+      value !== null &&
+      typeof value === "object" &&
+      !Array.isArray(value) &&
+      typeof next[key] === "object"
+    ) {
+      next[key] = { ...next[key], ...value };
+    } else {
+      next[key] = value;
+    }
+  });
+  return next;
+};
 
 const useStatus = () => {
   const [status, setStatus] = useState(null);
@@ -11,7 +29,9 @@ const useStatus = () => {
   const [error, setError] = useState(null);
   const [isBackendDown, setIsBackendDown] = useState(false);
 
-  const fetchStatus = async () => {
+  // One-off fetch, used for manual refreshes
+  const fetchStatus = useCallback(async () => {
+    setLoading(true);
     try {
       const response = await axios.get(`${BACKEND_URL}/status`);
       setStatus(response.data);
@@ -25,12 +45,37 @@ const useStatus = () => {
     } finally {
       setLoading(false);
     }
-  };
+  }, []);
 
   useEffect(() => {
-    fetchStatus(); // Initial fetch
-    const interval = setInterval(fetchStatus, 5000); // Poll every 5 seconds
-    return () => clearInterval(interval); // Cleanup on unmount
+    // The backend pushes a snapshot, then only the fields that change.
+    // EventSource reconnects by itself and resumes from the last event id.
+    const source = new EventSource(`${BACKEND_URL}/status/stream`);
+
+    source.addEventListener("snapshot", (event) => {
+      setStatus(JSON.parse(event.data));
+      setError(null);
+      setIsBackendDown(false);
+      setLoading(false);
+    });
+
+    source.addEventListener("delta", (event) => {
+      const delta = JSON.parse(event.data);
+      setStatus((prev) => (prev ? applyDelta(prev, delta) : prev));
+    });
+
+    source.onopen = () => {
+      setIsBackendDown(false);
+    };
+
+    source.onerror = () => {
+      console.error("Status stream disconnected; reconnecting.");
+      setError("Failed to fetch status.");
+      setIsBackendDown(true);
+      setLoading(false);
+    };
+
+    return () => source.close(); // Cleanup on unmount
   }, []);
 
   return { status, loading, error, isBackendDown, fetchStatus };
@@ -0,0 +1,214 @@
+"""Change feed behind the /status/stream endpoint.
+
+Whoever changes backend state (the monitoring loop, the fade scheduler, the
+API handlers) calls StatusStream.publish() with the current status dict.
+publish() works out which fields differ from the last published status and,
+if anything changed, records the delta under the next sequence number and
+wakes every connected client.
+
+Deltas are one level deep: a top-level field that is itself a dict (e.g.
+"current_duty" or "faults") only carries the keys that changed. The most
+recent deltas are kept so a reconnecting client can resume from the last
+sequence number it saw; clients that fall further behind get a full
+snapshot instead.
+
+SSE event ids are "<boot>-<seq>". Sequence numbers restart at 0 with every
+backend or control process run, so the boot part (the same boot id as in
+the /status ETag) keeps a client from resuming a new run's sequence from
+an old run's state: a Last-Event-ID from another boot, or one that does not
+parse, gets a snapshot.
+
+Each published status is also serialized to JSON once, at publish time, so
+/status can hand out the same immutable bytes (tagged with the sequence
+number as its version) to every poller without rebuilding anything.
+
+API worker processes (api_worker.py) rebuild the stream from the shared
+status segment. They publish with the control process's boot id and
+sequence numbers, which can skip values when a worker misses an
+intermediate status, so a client can resume on any worker. A delta is only replayed onto the exact
+sequence number it was computed from.
+"""
+
+import asyncio
+import collections
+import copy
+import json
+import threading
+
+# Number of past deltas kept for clients resuming with Last-Event-ID
+STATUS_DELTA_HISTORY = 256
+
+
+def status_delta(previous, current):
+    """Return the fields of current that differ from previous."""
+    delta = {}
+    for key, value in current.items():
+        old = previous.get(key)
+        if isinstance(value, dict) and isinstance(old, dict):
+            changed = {k: v for k, v in value.items() if old.get(k) != v or k not in old}
+            if changed:
+                delta[key] = changed
+        elif key not in previous or old != value:
+            delta[key] = value
+    return delta
+
+
+class StatusStream:
+    def __init__(self, history=STATUS_DELTA_HISTORY, boot=""):
+        self.boot = boot
+        self.seq = 0
+        self._state = {}
+        self._encoded = b"{}"
+        self._deltas = collections.deque(maxlen=history)
+        self._lock = threading.Lock()
+        # Wakeup events of connected clients, with the event loop they live on
+        self._subscribers = set()
+
+        # Called with (seq, encoded status) after each publish
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """Call listener(seq, encoded) for every published status.
+
+        Listeners run under the stream's lock, so they see statuses in
+        publish order; they must be quick and must not publish.
+        """
+        self._listeners.append(listener)
+
+    def publish(self, status, seq=None, boot=None):
+        """Record status; returns the new sequence number, or None if nothing changed.
+
+        seq and boot, if given, are used instead of the next sequence number
+        and the current boot (API workers pass the control process's). A new
+        boot drops the deltas kept for resuming.
+        """
+        with self._lock:
+            if boot is not None and boot != self.boot:
+                self.boot = boot
+                self._deltas.clear()
+            delta = status_delta(self._state, status)
+            if not delta:
+                return None
+            previous = self.seq
+            self.seq = previous + 1 if seq is None else seq
+            # Statuses are at most two levels deep (see status_delta), so
+            # copying the nested dicts is enough and far cheaper than deepcopy
+            self._state = {key: dict(value) if isinstance(value, dict) else value
+                           for key, value in status.items()}
+            self._encoded = json.dumps(status, separators=(',', ':')).encode()
+            self._deltas.append((previous, self.seq, delta))
+            seq = self.seq
+            for listener in self._listeners:
+                listener(seq, self._encoded)
+            subscribers = list(self._subscribers)
+        for loop, event in subscribers:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The client's event loop has already closed
+                pass
+        return seq
+
+    def snapshot(self):
+        """Return (boot, sequence number, full status)."""
+        with self._lock:
+            return self.boot, self.seq, copy.deepcopy(self._state)
+
+    def encoded(self):
+        """Return (sequence number, full status as JSON bytes)."""
+        with self._lock:
+            return self.seq, self._encoded
+
+    def deltas_since(self, boot, seq):
+        """Return [(seq, delta), ...] newer than seq of boot, or None if that is not resumable."""
+        with self._lock:
+            if boot != self.boot:
+                return None
+            if seq == self.seq:
+                return []
+            deltas = []
+            for previous, s, delta in self._deltas:
+                if deltas or previous == seq:
+                    deltas.append((s, delta))
+            return deltas or None
+
+    def subscribe(self):
+        """Register the calling coroutine's event loop; returns a token for wait()/unsubscribe()."""
+        token = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._subscribers.add(token)
+        return token
+
+    def unsubscribe(self, token):
+        with self._lock:
+            self._subscribers.discard(token)
+
+    async def wait(self, token, timeout):
+        """Wait until something is published (or timeout elapses). Returns True if woken."""
+        _, event = token
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        event.clear()
+        return True
+
+
+def parse_event_id(event_id):
+    """Return (boot, seq) of an SSE event id, or None if it is not one."""
+    boot, separator, seq = (event_id or "").rpartition("-")
+    if not separator:
+        return None
+    try:
+        return boot, int(seq)
+    except ValueError:
+        return None
+
+
+def sse_message(boot, seq, event, data):
+    return f"id: {boot}-{seq}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+async def status_events(stream, request, resume_from, keepalive):
+    """Server-sent events for /status/stream: a snapshot (or the missed deltas), then deltas.
+
+    resume_from is the event id the client last saw, or None.
+    """
+    token = stream.subscribe()
+    try:
+        # Replay what a reconnecting client missed, or start with a full snapshot
+        resume = parse_event_id(resume_from)
+        deltas = stream.deltas_since(*resume) if resume is not None else None
+        if deltas is None:
+            boot, seq, state = stream.snapshot()
+            yield sse_message(boot, seq, "snapshot", state)
+        else:
+            boot, seq = resume
+            for seq, delta in deltas:
+                yield sse_message(boot, seq, "delta", delta)
+
+        while not await request.is_disconnected():
+            if not await stream.wait(token, keepalive):
+                yield ": keepalive\n\n"
+                continue
+            deltas = stream.deltas_since(boot, seq)
+            if deltas is None:
+                # Fell too far behind to catch up with deltas, or a new boot
+                boot, seq, state = stream.snapshot()
+                yield sse_message(boot, seq, "snapshot", state)
+                continue
+            for seq, delta in deltas:
+                yield sse_message(boot, seq, "delta", delta)
+    finally:
+        stream.unsubscribe(token)
+
+
+def etag_matches(if_none_match, etag):
+    """True if an If-None-Match header value names etag (or is "*")."""
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag or candidate == "*":
+            return True
+    return False
@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from command_channel import CommandServer, send_command
+from shared_status import SharedStatusReader, SharedStatusWriter
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def reply_ok():
+    return 200, "application/json", "{}"
+
+
+def test_second_server_refuses_running_socket(tmp_path):
+    path = str(tmp_path / "control.sock")
+    first = CommandServer({"ping": reply_ok}, path=path)
+    first.start()
+    try:
+        with pytest.raises(FileExistsError):
+            CommandServer({}, path=path).start()
+        assert send_command("ping", path=path) == (200, "application/json", "{}")
+    finally:
+        first.stop()
+    assert not os.path.exists(path)
+
+
+def test_stale_socket_is_replaced_and_stop_leaves_foreign_socket(tmp_path):
+    path = str(tmp_path / "control.sock")
+    stale = CommandServer({}, path=path)
+    stale.start()
+    stale._sock.close()  # Crashed: the file stays, nobody listens
+    server = CommandServer({"ping": reply_ok}, path=path)
+    server.start()
+    assert send_command("ping", path=path)[0] == 200
+    os.unlink(path)
+    open(path, "w").close()  # Something else now lives at the path
+    server.stop()
+    assert os.path.exists(path)
+
+
+def test_writer_refuses_segment_of_running_control_process():
+    name = f"streetlight_test_{os.getpid()}"
+    # The segment of a control process that is still running
+    owner = subprocess.Popen([sys.executable, "-c", (
+        "import sys, time\n"
+        "from shared_status import SharedStatusWriter\n"
+        f"w = SharedStatusWriter(name={name!r})\n"
+        "print('ready', flush=True)\n"
+        "sys.stdin.read()\n"
+        "w.close()\n")], cwd=REPO_ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    try:
+        assert owner.stdout.readline().strip() == "ready"
+        with pytest.raises(FileExistsError):
+            SharedStatusWriter(name=name)
+        reader = SharedStatusReader(name)
+        assert not reader.stale()
+        reader.close()
+    finally:
+        owner.communicate("")
+    # Its owner is gone now, so a new writer may take the name
+    writer = SharedStatusWriter(name=name)
+    writer.close()
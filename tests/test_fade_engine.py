@@ -0,0 +1,46 @@
+from fade_curves import CIE1931
+from fade_engine import FadeEngine
+
+
+class RecordingPWM:
+    def __init__(self):
+        self.writes = []
+
+    def ChangeDutyCycle(self, duty_cycle):
+        self.writes.append(duty_cycle)
+
+
+def make_engine(levels=10):
+    engine = FadeEngine(interval=0.05, duration=1.0, curve=CIE1931, levels=levels)
+    pwm = RecordingPWM()
+    engine.add_channel("LED1", pwm)
+    return engine, pwm
+
+
+def test_first_tick_from_zero_writes_non_zero_duty():
+    engine, pwm = make_engine()
+    engine.set_duty("LED1", 0)
+    engine.fade_to("LED1", 100)
+    engine.tick()
+    assert pwm.writes[-1] > 0
+
+
+def test_first_tick_towards_zero_lowers_duty():
+    engine, pwm = make_engine()
+    engine.set_duty("LED1", 100)
+    engine.fade_to("LED1", 0)
+    engine.tick()
+    assert pwm.writes[-1] < 100
+
+
+def test_quantized_fade_lands_on_target_with_fewer_writes():
+    engine, pwm = make_engine()
+    engine.set_duty("LED1", 0)
+    engine.fade_to("LED1", 73)
+    ticks = 0
+    while engine.tick():
+        ticks += 1
+    assert engine.duty("LED1") == 73
+    assert pwm.writes[-1] == 73
+    # One write for set_duty(), then fewer than one per tick
+    assert len(pwm.writes) - 1 < ticks
@@ -0,0 +1,65 @@
+from feedback import FEEDBACK_FAULT_BITS, RECOVERED, STUCK_LOW, FeedbackMonitor
+from fleet import FAULT_FEEDBACK_MISMATCH, FAULT_LED_FAILURE, FleetState
+
+PIN = 21
+
+
+def make_monitor(duty):
+    fleet = FleetState(["LED2"])
+    fleet.duty[0] = duty
+    fleet.changed_at[0] = 0.0
+    monitor = FeedbackMonitor(fleet)
+    monitor.add("LED2", PIN)
+    return fleet, monitor
+
+
+def scan(monitor, high, times):
+    events = []
+    for _ in range(times):
+        events += monitor.scan(1 << PIN if high else 0, now=10.0)
+    return events
+
+
+def test_stuck_channel_is_flagged():
+    fleet, monitor = make_monitor(100)
+    assert scan(monitor, False, 3) == [("LED2", STUCK_LOW)]
+    assert fleet.has_fault(0, FEEDBACK_FAULT_BITS)
+
+
+def test_channel_recovers_once_feedback_agrees_again():
+    fleet, monitor = make_monitor(100)
+    scan(monitor, False, 3)
+    assert scan(monitor, True, 3) == [("LED2", RECOVERED)]
+    assert not fleet.has_fault(0, FEEDBACK_FAULT_BITS)
+
+
+def test_still_stuck_channel_does_not_recover():
+    fleet, monitor = make_monitor(100)
+    scan(monitor, False, 3)
+    assert scan(monitor, False, 20) == []
+    assert fleet.has_fault(0, FEEDBACK_FAULT_BITS)
+
+
+def test_stuck_low_channel_at_zero_gives_no_evidence():
+    fleet, monitor = make_monitor(100)
+    scan(monitor, False, 3)
+    fleet.duty[0] = 0
+    assert scan(monitor, False, 20) == []
+    assert fleet.has_fault(0, FEEDBACK_FAULT_BITS)
+
+
+def test_other_failures_are_not_sampled():
+    fleet, monitor = make_monitor(100)
+    fleet.set_fault(0, FAULT_LED_FAILURE)
+    assert scan(monitor, True, 10) == []
+    assert fleet.has_fault(0, FAULT_LED_FAILURE)
+    assert not fleet.has_fault(0, FAULT_FEEDBACK_MISMATCH)
+
+
+def test_pwm_channel_recovers_on_mixed_readings():
+    fleet, monitor = make_monitor(50)
+    assert scan(monitor, False, 40)[0] == ("LED2", STUCK_LOW)
+    events = []
+    for high in (True, False, True, False):
+        events += scan(monitor, high, 1)
+    assert events == [("LED2", RECOVERED)]
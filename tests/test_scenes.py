@@ -0,0 +1,36 @@
+import importlib
+import json
+
+import pytest
+
+from scenes import SceneStore
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    # backend.log and faults.db land in tmp_path rather than the checkout
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("STREETLIGHT_HARDWARE", "sim")
+    return importlib.import_module("backend")
+
+
+@pytest.fixture
+def store_scenes(backend, tmp_path, monkeypatch):
+    def store(scenes):
+        path = tmp_path / "scenes.json"
+        path.write_text(json.dumps(scenes))
+        monkeypatch.setattr(backend, "scene_store", SceneStore(str(path)))
+    return store
+
+
+def test_apply_scene_naming_missing_channel_is_refused(backend, store_scenes):
+    store_scenes({"evening": [{"channel": "LED1", "duty": 40, "fade_time": 0},
+                              {"channel": "POLE0042", "duty": 40, "fade_time": 0}]})
+    response = backend.apply_scene("evening")
+    assert response.status_code == 400
+    assert json.loads(response.body)["channels"] == ["POLE0042"]
+
+
+def test_apply_scene_with_malformed_command_is_refused(backend, store_scenes):
+    store_scenes({"broken": [{"channel": "LED1", "duty": 250}]})
+    assert backend.apply_scene("broken").status_code == 400
@@ -0,0 +1,39 @@
+import time
+
+from soft_pwm import EDGE_MERGE_MAX_FRACTION, SoftPWMEngine
+
+FREQUENCY = 1000
+PINS = (5, 6, 7)
+
+
+class OvershootingClock:
+    """A clock whose sleep() overshoots by more than a whole PWM period."""
+
+    def __init__(self, overshoot):
+        self.now = 0.0
+        self.overshoot = overshoot
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.now += delay + self.overshoot
+
+
+def test_merge_window_is_capped_when_sleep_overshoots_a_period():
+    fake = OvershootingClock(overshoot=2.0 / FREQUENCY)
+    clears = []
+    engine = SoftPWMEngine(lambda set_mask, clear_mask: clears.append(clear_mask), FREQUENCY,
+                           clock=fake.clock, sleep=fake.sleep)
+    for pin, duty in zip(PINS, (20, 50, 80)):
+        engine.channel(pin).start(duty)
+    deadline = time.monotonic() + 5
+    while len(clears) < 50 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    engine.stop()
+
+    assert engine.merge_window > 1.0 / FREQUENCY
+    assert engine.stats()["merge_window_us"] == EDGE_MERGE_MAX_FRACTION / FREQUENCY * 1e6
+    # Every channel still switches off on its own edge
+    for pin in PINS:
+        assert 1 << pin in clears
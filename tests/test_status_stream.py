@@ -0,0 +1,56 @@
+import asyncio
+
+from status_stream import StatusStream, parse_event_id, status_events
+
+
+class ConnectedRequest:
+    async def is_disconnected(self):
+        return False
+
+
+def first_event(stream, resume_from):
+    async def read():
+        events = status_events(stream, ConnectedRequest(), resume_from, keepalive=0.01)
+        try:
+            return await events.__anext__()
+        finally:
+            await events.aclose()
+    return asyncio.run(read())
+
+
+def make_stream(boot):
+    stream = StatusStream(boot=boot)
+    stream.publish({"duty": 1})
+    stream.publish({"duty": 2})
+    return stream
+
+
+def test_parse_event_id():
+    assert parse_event_id("18f3a-42") == ("18f3a", 42)
+    assert parse_event_id("42") is None
+    assert parse_event_id("18f3a-x") is None
+    assert parse_event_id(None) is None
+
+
+def test_resume_within_boot_replays_deltas():
+    event = first_event(make_stream("b"), "b-1")
+    assert event.startswith("id: b-2\nevent: delta\n")
+
+
+def test_resume_from_other_boot_gets_snapshot():
+    # Same sequence number, but from before a restart
+    event = first_event(make_stream("b"), "a-1")
+    assert event.startswith("id: b-2\nevent: snapshot\n")
+
+
+def test_unparseable_event_id_gets_snapshot():
+    assert "event: snapshot\n" in first_event(make_stream("b"), "1")
+
+
+def test_new_boot_drops_resumable_deltas():
+    stream = StatusStream()
+    stream.publish({"duty": 1}, seq=7, boot="a")
+    stream.publish({"duty": 2}, seq=8, boot="a")
+    stream.publish({"duty": 3}, seq=1, boot="b")
+    assert stream.deltas_since("a", 7) is None
+    assert stream.deltas_since("b", 1) == []